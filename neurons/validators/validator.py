@@ -16,6 +16,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import os
 import copy
 import torch
 import asyncio
@@ -24,8 +25,13 @@ from traceback import print_exception
 
 import prompting
 
-from prompting.validators.dataset import Dataset, MockDataset
+from prompting.validators.dataset import Dataset, MockDataset, PrefetchDataset
+from prompting.validators.corpus import CorpusDataset
+from prompting.validators.loader import ModelLoader
+from prompting.validators.bundle import use_bundle
+from prompting.validators.quantize import maybe_quantize, set_cpu_threads
 from prompting.validators.gating import GatingModel, SentenceEmbedGatingModel
+from prompting.validators.gating_trainer import GatingTrainer
 from prompting.validators.mock import MockDendrite, MockRewardModel, MockGatingModel
 
 # Load local forward function.
@@ -34,28 +40,30 @@ from prompting.validators.forward import forward
 from prompting.validators.utils import (
     should_checkpoint,
     checkpoint,
+    resync_metagraph,
     should_reinit_wandb,
     reinit_wandb,
     load_state,
     save_state,
     init_wandb,
+    queue_collector,
 )
 from prompting.validators.weights import should_set_weights, set_weights
-from prompting.validators.misc import ttl_get_block
-
-# Load gating models
-from prompting.validators.reward import (
-    Blacklist,
-    NSFWRewardModel,
-    DirectPreferenceRewardModel,
-    OpenAssistantRewardModel,
-    ReciprocateRewardModel,
-    RelevanceRewardModel,
-    DahoasRewardModel,
-    DiversityRewardModel,
-    PromptRewardModel,
-    RewardModelType,
-)
+from prompting.validators.sampler import UidSampler
+from prompting.validators.scoreboard import Scoreboard
+from prompting.validators.timing import StageTimer
+from prompting.validators.residency import ResidencyManager
+from prompting.validators.units import parse_size
+from prompting.validators.checkpoint import Checkpointer, EmbeddingSegment
+from prompting.validators.metagraph_sync import MetagraphSyncer
+from prompting.metrics import MetricsRegistry, MetricsServer, process_collector
+from prompting.weight_setter import WeightSetter
+from prompting.block_clock import BlockClock
+from prompting.validators.wandb_logger import WandbLogger
+
+# Reward models are imported when first accessed, so only the selected ones are loaded.
+from prompting.validators import reward
+from prompting.validators.reward import RewardModelType
 
 from prompting.validators.penalty import (
     TaskValidationPenaltyModel,
@@ -81,6 +89,11 @@ class neuron:
     wallet: "bt.wallet"
     metagraph: "bt.metagraph"
 
+    @property
+    def moving_averaged_scores(self) -> torch.FloatTensor:
+        """Moving averaged scores of the scoreboard, updated in place."""
+        return self.scoreboard.scores
+
     def __init__(self):
         self.config = neuron.config()
         self.check_config(self.config)
@@ -98,6 +111,13 @@ class neuron:
         self.subtensor = bt.subtensor(config=self.config)
         bt.logging.debug(str(self.subtensor))
 
+        # Estimate the current block locally, resynced with the chain in the background.
+        self.block_clock = BlockClock(
+            subtensor_factory=lambda: bt.subtensor(config=self.config),
+            block=self.subtensor.get_current_block(),
+            resync_interval=self.config.neuron.block_resync_interval,
+        )
+
         # Init wallet.
         bt.logging.debug("loading", "wallet")
         self.wallet = bt.wallet(config=self.config)
@@ -121,15 +141,46 @@ class neuron:
         self.hotkeys = copy.deepcopy(self.metagraph.hotkeys)
         bt.logging.debug(str(self.metagraph))
 
-        # Init Weights.
-        bt.logging.debug("loading", "moving_averaged_scores")
-        self.moving_averaged_scores = torch.zeros((self.metagraph.n)).to(self.device)
+        # Sync the metagraph in the background, swapped in by `resync_metagraph` on the main loop.
+        self.metagraph_syncer = None
+        if self.config.neuron.metagraph_sync_interval > 0:
+            self.metagraph_syncer = MetagraphSyncer(
+                self.metagraph,
+                subtensor_factory=lambda: bt.subtensor(config=self.config),
+                interval=self.config.neuron.metagraph_sync_interval,
+            )
+
+        # Init Weights, the moving averaged scores and statistics of each uid.
+        bt.logging.debug("loading", "scoreboard")
+        self.scoreboard = Scoreboard(
+            n=self.metagraph.n.item(),
+            alpha=self.config.neuron.moving_average_alpha,
+            device=self.device,
+        )
         bt.logging.debug(str(self.moving_averaged_scores))
 
+        # Init the uid sampler which tracks the reliability of each miner.
+        bt.logging.debug("loading", "uid_sampler")
+        self.uid_sampler = UidSampler(
+            n=self.metagraph.n.item(),
+            exploration=self.config.neuron.uid_sampler_exploration,
+            decay=self.config.neuron.uid_sampler_decay,
+        )
+
         # Dataset: used to generate the base prompts ( initial randomness. )
         bt.logging.debug("loading", "dataset")
         if self.config.neuron.mock_dataset:
             self.dataset = MockDataset()
+        elif self.config.neuron.corpus_path:
+            self.dataset = CorpusDataset(
+                self.config.neuron.corpus_path, seed=self.config.neuron.corpus_seed
+            )
+        elif self.config.neuron.dataset_prefetch_size > 0:
+            self.dataset = PrefetchDataset(
+                max_size=self.config.neuron.dataset_prefetch_size,
+                cache_path=os.path.join(self.config.neuron.full_path, "dataset_cache"),
+                cache_size=self.config.neuron.dataset_cache_size,
+            )
         else:
             self.dataset = Dataset()
         bt.logging.debug(str(self.dataset))
@@ -139,17 +190,28 @@ class neuron:
         if not self.config.gating.num_uids:
             self.config.gating.num_uids = self.subtensor.max_n(self.config.netuid)
 
+        # Load the models from the local bundle when one is given.
+        if self.config.neuron.model_bundle:
+            use_bundle(self.config.neuron.model_bundle)
+
+        # Models are loaded concurrently, the gating model is waited for once the reward models are loading.
+        loader = ModelLoader(max_workers=self.config.neuron.model_loading_workers)
         if self.config.neuron.mock_gating_model:
-            self.gating_model = MockGatingModel(self.metagraph.n.item())
+            gating_model = MockGatingModel(self.metagraph.n.item())
         elif self.config.neuron.use_custom_gating_model:
-            self.gating_model = SentenceEmbedGatingModel(
-                metagraph=self.metagraph, config=self.config
-            ).to(self.device)
+            gating_model = loader.load(
+                "gating_model",
+                lambda: SentenceEmbedGatingModel(
+                    metagraph=self.metagraph, config=self.config
+                ).to(self.device),
+            )
         else:
-            self.gating_model = GatingModel(
-                metagraph=self.metagraph, config=self.config
-            ).to(self.device)
-        bt.logging.debug(str(self.gating_model))
+            gating_model = loader.load(
+                "gating_model",
+                lambda: GatingModel(metagraph=self.metagraph, config=self.config).to(
+                    self.device
+                ),
+            )
 
         if not self.config.neuron.axon_off:
             bt.logging.debug("serving ip to chain...")
@@ -185,6 +247,10 @@ class neuron:
 
         # Init Reward model
         bt.logging.debug("loading", "reward_functions")
+        if self.config.neuron.cpu_quantize:
+            bt.logging.info(
+                f"Using {set_cpu_threads(self.config.neuron.cpu_threads)} cpu threads"
+            )
         if self.config.neuron.mock_reward_models:
             self.reward_functions = []
             self.reward_weights = []
@@ -221,19 +287,38 @@ class neuron:
                 raise Exception(message)
 
             self.reward_functions = [
-                DirectPreferenceRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.dpo.value,
+                    lambda: reward.DirectPreferenceRewardModel(device=self.device),
+                )
                 if self.config.reward.dpo_weight > 0
                 else MockRewardModel(RewardModelType.dpo.value),
-                OpenAssistantRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.rlhf.value,
+                    lambda: maybe_quantize(
+                        self, reward.OpenAssistantRewardModel(device=self.device)
+                    ),
+                )
                 if self.config.reward.rlhf_weight > 0
                 else MockRewardModel(RewardModelType.rlhf.value),
-                ReciprocateRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.reciprocate.value,
+                    lambda: reward.ReciprocateRewardModel(device=self.device),
+                )
                 if self.config.reward.reciprocate_weight > 0
                 else MockRewardModel(RewardModelType.reciprocate.value),
-                DahoasRewardModel(path=self.config.neuron.full_path, device=self.device)
+                loader.load(
+                    RewardModelType.dahoas.value,
+                    lambda: reward.DahoasRewardModel(
+                        path=self.config.neuron.full_path, device=self.device
+                    ),
+                )
                 if self.config.reward.dahoas_weight > 0
                 else MockRewardModel(RewardModelType.dahoas.value),
-                PromptRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.prompt.value,
+                    lambda: reward.PromptRewardModel(device=self.device),
+                )
                 if self.config.reward.prompt_based_weight > 0
                 else MockRewardModel(RewardModelType.prompt.value),
             ]
@@ -249,22 +334,37 @@ class neuron:
 
             # Masking functions
             self.blacklist = (
-                Blacklist()
+                reward.Blacklist()
                 if not self.config.neuron.blacklist_off
                 else MockRewardModel(RewardModelType.blacklist.value)
             )
             relevance_model = (
-                RelevanceRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.relevance.value,
+                    lambda: maybe_quantize(
+                        self, reward.RelevanceRewardModel(device=self.device)
+                    ),
+                )
                 if not self.config.neuron.relevance_off
                 else MockRewardModel(RewardModelType.relevance.value)
             )
             self.diversity_model = (
-                DiversityRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.diversity.value,
+                    lambda: maybe_quantize(
+                        self, reward.DiversityRewardModel(device=self.device)
+                    ),
+                )
                 if not self.config.neuron.diversity_off
                 else MockRewardModel(RewardModelType.diversity.value)
             )
             nsfw_model = (
-                NSFWRewardModel(device=self.device)
+                loader.load(
+                    RewardModelType.nsfw.value,
+                    lambda: maybe_quantize(
+                        self, reward.NSFWRewardModel(device=self.device)
+                    ),
+                )
                 if not self.config.neuron.nsfw_off
                 else MockRewardModel(RewardModelType.nsfw.value)
             )
@@ -286,12 +386,112 @@ class neuron:
             bt.logging.debug(str(self.masking_functions))
             bt.logging.debug(str(self.penalty_functions))
 
+        # Wait for the models unless they keep loading in the background, in which case the first step using a model waits for it.
+        loader.close()
+        self.gating_model = loader.resolve([gating_model])[0]
+        bt.logging.debug(str(self.gating_model))
+
+        # Train the gating model from a replay buffer in the background, unless it trains synchronously on each step.
+        self.gating_trainer = None
+        if (
+            not self.config.neuron.mock_gating_model
+            and self.config.gating.train_interval > 0
+        ):
+            self.gating_trainer = GatingTrainer(
+                self.gating_model,
+                buffer_size=self.config.gating.replay_buffer_size,
+                batch_size=self.config.gating.batch_size,
+                interval=self.config.gating.train_interval,
+                learning_rate=self.config.gating.learning_rate,
+                momentum=self.config.gating.momentum,
+            )
+        if not self.config.neuron.background_model_loading:
+            self.reward_functions = loader.resolve(self.reward_functions)
+            self.masking_functions = loader.resolve(self.masking_functions)
+            self.diversity_model = loader.resolve([self.diversity_model])[0]
+
+        # Init the metrics registry and serve it if a metrics port is set.
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(process_collector)
+        self.metrics.add_collector(queue_collector(self))
+        if self.config.neuron.metrics_port:
+            self.metrics_server = MetricsServer(
+                self.metrics, port=self.config.neuron.metrics_port
+            ).start()
+
+        # Init the residency manager keeping the reward and masking models within the memory budget.
+        memory_budget = 0
+        if self.config.neuron.memory_budget not in ("", "0"):
+            memory_budget = parse_size(self.config.neuron.memory_budget)
+        self.residency = ResidencyManager(
+            self.device,
+            budget=memory_budget,
+            offload=self.config.neuron.offload,
+            offload_path=os.path.join(self.config.neuron.full_path, "offload"),
+            metrics=self.metrics,
+        )
+        # Models still loading in the background are registered when first applied.
+        if not self.config.neuron.background_model_loading:
+            for model in self.reward_functions + self.masking_functions:
+                self.residency.register(model)
+
+        # Init the stage timer used to profile the forward steps.
+        # Stages are also timed when only the metrics endpoint is enabled.
+        self.timer = StageTimer(
+            enabled=self.config.neuron.stage_timing
+            or self.config.neuron.metrics_port > 0,
+            window=self.config.neuron.stage_timing_window,
+            histogram=self.metrics.histogram(
+                "validator_stage_seconds",
+                "Wall time of each stage of a step (query, reward models, gating, ...).",
+                ["stage"],
+            ),
+        )
+
+        # Init the columnar event store, events are otherwise logged to completions.log.
+        if (
+            not self.config.neuron.dont_save_events
+            and self.config.neuron.events_backend == "arrow"
+        ):
+            from prompting.validators.event_store import EventStore
+
+            self.event_store = EventStore(
+                os.path.join(self.config.neuron.full_path, "events"),
+                max_segment_bytes=parse_size(self.config.neuron.events_retention_size),
+            )
+
+        # Normalization statistics loaded for reward models which are still loading.
+        self.pending_reward_stats = {}
+
+        # Init the worker setting the weights on chain.
+        self.weight_setter = WeightSetter(
+            subtensor_factory=lambda: bt.subtensor(config=self.config),
+            wallet=self.wallet,
+            netuid=self.config.netuid,
+            version_key=prompting.validators.__spec_version__,
+            timeout=self.config.neuron.set_weights_timeout,
+            retries=self.config.neuron.set_weights_retries,
+            backoff=self.config.neuron.set_weights_backoff,
+            wait_for_inclusion=self.config.neuron.set_weights_wait_for_inclusion,
+            metrics=self.metrics,
+        )
+
+        # Init the checkpointer writing the state saved by `save_state` in the background.
+        self.checkpointer = Checkpointer(
+            EmbeddingSegment(
+                os.path.join(self.config.neuron.full_path, "diversity_embeddings"),
+                max_rows=reward.DiversityRewardModel.history_range[1],
+            ),
+            background=not self.config.neuron.sync_checkpoint,
+        )
+
         # Init the event loop.
         self.loop = asyncio.get_event_loop()
 
         # Init wandb.
         if not self.config.wandb.off:
             bt.logging.debug("loading", "wandb")
+            self.wandb_logger = WandbLogger(max_queue_size=self.config.wandb.queue_size)
             init_wandb(self)
 
         if self.config.neuron.epoch_length_override:
@@ -299,7 +499,7 @@ class neuron:
         else:
             self.config.neuron.epoch_length = 100
 
-        self.prev_block = ttl_get_block(self)
+        self.prev_block = self.block_clock.block
         self.step = 0
 
     def run(self):
@@ -313,7 +513,7 @@ class neuron:
                         f"Validator is not registered - hotkey {self.wallet.hotkey.ss58_address} not in metagraph"
                     )
 
-                bt.logging.info(f"step({self.step}) block({ttl_get_block( self )})")
+                bt.logging.info(f"step({self.step}) block({self.block_clock.block})")
 
                 # Run multiple forwards.
                 async def run_forward():
@@ -325,6 +525,10 @@ class neuron:
 
                 self.loop.run_until_complete(run_forward())
 
+                # Swap in the metagraph synced in the background, if it has been updated.
+                if self.metagraph_syncer is not None:
+                    resync_metagraph(self)
+
                 # Resync the network state
                 if should_checkpoint(self):
                     checkpoint(self)
@@ -338,11 +542,18 @@ class neuron:
                 if should_reinit_wandb(self):
                     reinit_wandb(self)
 
-                self.prev_block = ttl_get_block(self)
+                self.prev_block = self.block_clock.block
                 self.step += 1
         except Exception as err:
             bt.logging.error("Error in training loop", str(err))
             bt.logging.debug(print_exception(type(err), err, err.__traceback__))
+        finally:
+            # Write the pending checkpoints before exiting.
+            self.checkpointer.close(timeout=60)
+            if self.metagraph_syncer is not None:
+                self.metagraph_syncer.stop()
+            self.weight_setter.stop()
+            self.block_clock.stop()
 
 
 def main():
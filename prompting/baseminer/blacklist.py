@@ -17,7 +17,6 @@
 # DEALINGS IN THE SOFTWARE.
 import time
 import json
-import wandb
 import hashlib
 import bittensor as bt
 from typing import Union, Tuple, Callable, List
@@ -53,6 +52,11 @@ async def is_prompt_in_cache(self, synapse: Prompting) -> bool:
         for key in keys_to_remove:
             del self.prompt_cache[key]
 
+    self.metrics.counter(
+        "miner_prompt_cache_total",
+        "Number of prompt cache lookups by result.",
+        ["result"],
+    ).inc(result="hit" if should_blacklist else "miss")
     return should_blacklist
 
 
@@ -130,7 +134,14 @@ def blacklist(
 
         # Finally, log and return the blacklist result.
         bt.logging.trace(f"blacklisted: {does_blacklist}, reason: {reason}")
+        self.metrics.counter(
+            "miner_blacklist_total",
+            "Number of blacklist decisions.",
+            ["blacklisted"],
+        ).inc(blacklisted=str(bool(does_blacklist)).lower())
         if does_blacklist and self.config.wandb.on:
+            import wandb
+
             wandb.log(
                 {
                     "blacklisted": float(does_blacklist),
@@ -184,6 +184,24 @@ def get_config() -> "bt.Config":
         help="If True, the miner does not set weights.",
         default=False,
     )
+    parser.add_argument(
+        "--miner.set_weights_timeout",
+        type=float,
+        help="Seconds before an attempt to set weights is abandoned.",
+        default=60.0,
+    )
+    parser.add_argument(
+        "--miner.set_weights_retries",
+        type=int,
+        help="Number of retries after a failed attempt to set weights.",
+        default=3,
+    )
+    parser.add_argument(
+        "--miner.block_resync_interval",
+        type=float,
+        help="Seconds between resyncs of the block estimate with the chain, 0 to not resync.",
+        default=60.0,
+    )
     parser.add_argument(
         "--miner.no_serve",
         action="store_true",
@@ -197,6 +215,14 @@ def get_config() -> "bt.Config":
         default=False,
     )
 
+    # Metrics.
+    parser.add_argument(
+        "--miner.metrics_port",
+        type=int,
+        help="Port of the prometheus metrics endpoint (requests, blacklist decisions, prompt cache, memory). 0 disables it.",
+        default=0,
+    )
+
     # Mocks.
     parser.add_argument(
         "--miner.mock_subtensor",
@@ -19,7 +19,6 @@
 import os
 import copy
 import time
-import wandb
 import asyncio
 import argparse
 import pydantic
@@ -31,11 +30,13 @@ from typing import List, Dict, Tuple, Union
 
 import bittensor as bt
 from prompting.protocol import Prompting
+from prompting.metrics import MetricsRegistry, MetricsServer, process_collector
 
 from prompting.baseminer.priority import priority
 from prompting.baseminer.blacklist import blacklist, is_prompt_in_cache
 from prompting.baseminer.run import run
-from prompting.baseminer.set_weights import set_weights
+from prompting.weight_setter import WeightSetter
+from prompting.block_clock import BlockClock
 from prompting.baseminer.config import check_config, get_config
 
 
@@ -46,7 +47,14 @@ class Miner(ABC):
     The `blacklist` and `priority` methods can also be overridden to provide custom logic.
     """
 
-    def __init__(self, config=None, axon=None, wallet=None, subtensor=None):
+    def __init__(
+        self,
+        config=None,
+        axon=None,
+        wallet=None,
+        subtensor=None,
+        subtensor_factory=None,
+    ):
         """
         Initializes the Miner with the given configurations and Bittensor objects.
 
@@ -55,6 +63,8 @@ class Miner(ABC):
             axon: Bittensor Axon object which handles incoming requests.
             wallet: Bittensor Wallet object which holds cryptographic keys.
             subtensor: Bittensor Subtensor object which manages the blockchain connection.
+            subtensor_factory: Creates the subtensors of the weight setter and block clock threads, which can not
+                share the websocket of `subtensor`. Defaults to creating a new subtensor from the config.
         """
         # Setup base config from Miner.config() and merge with subclassed config.
         base_config = copy.deepcopy(config or get_config())
@@ -122,7 +132,40 @@ class Miner(ABC):
         )
         bt.logging.info(f"Axon created: {self.axon}")
 
+        # The metrics registry records request handling and is served if a metrics port is set.
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(process_collector)
+        if self.config.miner.metrics_port:
+            self.metrics_server = MetricsServer(
+                self.metrics, port=self.config.miner.metrics_port
+            ).start()
+
+        # The threads which request the chain create their own subtensor, also to reconnect after a failure.
+        subtensor_factory = subtensor_factory or (
+            lambda: bt.subtensor(config=self.config)
+        )
+
+        # The weights are set on chain from a worker thread, so slow chain requests do not stall the run loop.
+        self.weight_setter = WeightSetter(
+            subtensor_factory=subtensor_factory,
+            wallet=self.wallet,
+            netuid=self.config.netuid,
+            version_key=1,
+            timeout=self.config.miner.set_weights_timeout,
+            retries=self.config.miner.set_weights_retries,
+            metrics=self.metrics,
+        )
+
+        # The run loop waits for epochs on a local estimate of the block, resynced with the chain in the background.
+        self.block_clock = BlockClock(
+            subtensor_factory=subtensor_factory,
+            block=self.subtensor.get_current_block(),
+            resync_interval=self.config.miner.block_resync_interval,
+        )
+
         if self.config.wandb.on:
+            import wandb
+
             tags = [self.wallet.hotkey.ss58_address, f"netuid_{self.config.netuid}"]
             self.wandb_run = wandb.init(
                 project=self.config.wandb.project_name,
@@ -199,7 +242,19 @@ class Miner(ABC):
                 raise ValueError(
                     f"Blacklisted: Prompt sent recently in last {self.config.miner.blacklist.prompt_cache_block_span} blocks."
                 )
-        return self.prompt(synapse)
+
+        requests_in_flight = self.metrics.gauge(
+            "miner_requests_in_flight", "Number of prompts being processed."
+        )
+        requests_in_flight.inc()
+        start_time = time.time()
+        try:
+            return self.prompt(synapse)
+        finally:
+            requests_in_flight.dec()
+            self.metrics.histogram(
+                "miner_prompt_seconds", "Wall time spent answering a prompt."
+            ).observe(time.time() - start_time)
 
     @abstractmethod
     def prompt(self, synapse: Prompting) -> Prompting:
@@ -15,12 +15,10 @@
 # THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
-import time
-import wandb
 import bittensor as bt
 import traceback
 from prompting.protocol import Prompting
-from .set_weights import set_weights
+from .set_weights import submit_weights
 
 
 def run(self):
@@ -71,7 +69,7 @@ def run(self):
     self.axon.start()
 
     # --- Run until should_exit = True.
-    self.last_epoch_block = self.subtensor.get_current_block()
+    self.last_epoch_block = self.block_clock.block
     bt.logging.info(f"Miner starting at block: {self.last_epoch_block}")
 
     # This loop maintains the miner's operations until intentionally stopped.
@@ -79,30 +77,24 @@ def run(self):
     step = 0
     try:
         while not self.should_exit:
-            start_epoch = time.time()
-
-            # --- Wait until next epoch.
-            current_block = self.subtensor.get_current_block()
-            while (
-                current_block - self.last_epoch_block
-                < self.config.miner.blocks_per_epoch
-            ):
-                # --- Wait for next bloc.
-                time.sleep(1)
-                current_block = self.subtensor.get_current_block()
-
-                # --- Check if we should exit.
-                if self.should_exit:
-                    break
+            # --- Wait until next epoch, on the local block estimate.
+            next_epoch_block = self.last_epoch_block + int(
+                self.config.miner.blocks_per_epoch
+            )
+            current_block = None
+            while current_block is None and not self.should_exit:
+                # --- Wake up every second to check if we should exit.
+                current_block = self.block_clock.wait_until_blocking(
+                    next_epoch_block, timeout=1
+                )
+            if current_block is None:
+                break
 
             # --- Update the metagraph with the latest network state.
-            self.last_epoch_block = self.subtensor.get_current_block()
+            self.last_epoch_block = current_block
 
-            metagraph = self.subtensor.metagraph(
-                netuid=self.config.netuid,
-                lite=True,
-                block=self.last_epoch_block,
-            )
+            # The latest metagraph, the estimate may be ahead of the chain when blocks are slow.
+            metagraph = self.subtensor.metagraph(netuid=self.config.netuid, lite=True)
             log = (
                 f"Step:{step} | "
                 f"Block:{metagraph.block.item()} | "
@@ -115,22 +107,25 @@ def run(self):
             )
             bt.logging.info(log)
             if self.config.wandb.on:
+                import wandb
+
                 wandb.log(log)
 
-            # --- Set weights.
+            # --- Set weights, from the worker thread of the weight setter.
             if not self.config.miner.no_set_weights:
-                set_weights(
-                    self.subtensor,
-                    self.config.netuid,
-                    self.my_subnet_uid,
-                    self.wallet,
-                    self.config.wandb.on,
-                )
+                last_result = self.weight_setter.last_result
+                if self.config.wandb.on and last_result is not None:
+                    import wandb
+
+                    wandb.log({"set_weights": int(last_result.success)})
+                submit_weights(self.weight_setter, metagraph, self.my_subnet_uid)
             step += 1
 
     # If someone intentionally stops the miner, it'll safely terminate operations.
     except KeyboardInterrupt:
         self.axon.stop()
+        self.weight_setter.stop()
+        self.block_clock.stop()
         bt.logging.success("Miner killed by keyboard interrupt.")
         exit()
 
@@ -17,58 +17,26 @@
 # DEALINGS IN THE SOFTWARE.
 
 import torch
-import wandb
 import bittensor as bt
+from prompting.weight_setter import WeightSetter
 
 
-def set_weights(
-    subtensor: "bt.subtensor",
-    netuid: int,
-    uid: int,
-    wallet: "bt.wallet",
-    wandb_on=False,
+def submit_weights(
+    weight_setter: WeightSetter, metagraph: "bt.metagraph", uid: int
 ) -> None:
     """
-    Sets the miner's weights on the Bittensor network.
+    Submits the miner's weights to the weight setter, which sets them on chain from its worker thread.
 
-    This function assigns a weight of 1 to the current miner (identified by its UID) and
-    a weight of 0 to all other peers in the network. The weights determine the trust level
-    the miner assigns to other nodes on the network.
-
-    The function performs the following steps:
-    1. Queries the Bittensor network for the total number of peers.
-    2. Sets a weight vector with a value of 1 for the current miner and 0 for all other peers.
-    3. Updates these weights on the Bittensor network using the `set_weights` method of the subtensor.
-    4. Optionally logs the weight-setting operation to Weights & Biases (wandb) for monitoring.
+    The miner assigns a weight of 1 to itself and 0 to all other peers, sized by the metagraph rather than by
+    querying the chain for the number of peers.
 
     Args:
-        subtensor (bt.subtensor): The Bittensor object managing the blockchain connection.
-        netuid (int): The unique identifier for the chain subnet.
+        weight_setter (WeightSetter): Worker setting the weights on chain.
+        metagraph (bt.metagraph): Latest state of the subnet.
         uid (int): The unique identifier for the miner on the network.
-        wallet (bt.wallet): The miner's wallet holding cryptographic information.
-        wandb_on (bool, optional): Flag to determine if logging to Weights & Biases is enabled. Defaults to False.
-
-    Raises:
-        Exception: If there's an error while setting weights, the exception is logged for diagnosis.
     """
-    try:
-        # --- query the chain for the most current number of peers on the network
-        chain_weights = torch.zeros(subtensor.subnetwork_n(netuid=netuid))
-        chain_weights[uid] = 1
-
-        # --- Set weights.
-        subtensor.set_weights(
-            uids=torch.arange(0, len(chain_weights)),
-            netuid=netuid,
-            weights=chain_weights,
-            wait_for_inclusion=False,
-            wallet=wallet,
-            version_key=1,
-        )
-        if wandb_on:
-            wandb.log({"set_weights": 1})
-
-    except Exception as e:
-        if wandb_on:
-            wandb.log({"set_weights": 0})
-        bt.logging.error(f"Failed to set weights on chain with exception: { e }")
+    chain_weights = torch.zeros(metagraph.n.item())
+    chain_weights[uid] = 1
+    weight_setter.submit(
+        uids=torch.arange(0, len(chain_weights)), weights=chain_weights
+    )
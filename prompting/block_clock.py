@@ -0,0 +1,158 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import asyncio
+import threading
+import bittensor as bt
+from typing import Callable, Optional
+
+
+class BlockClock:
+    """Estimates the current block locally, so the block does not need to be requested from the chain on every use.
+
+    The estimate counts the blocks produced at `block_time` seconds since the last observed block. A background
+    thread observes the block of the chain every `resync_interval` seconds and re-anchors the estimate when it
+    drifted. The estimate never decreases: when the chain is behind the estimate, the estimate holds until the chain
+    catches up, so epochs computed from it are not repeated.
+    """
+
+    def __init__(
+        self,
+        subtensor_factory: Callable[[], "bt.subtensor"],
+        block: Optional[int] = None,
+        block_time: float = 12.0,
+        resync_interval: float = 60.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            subtensor_factory (Callable[[], bt.subtensor]): Creates the subtensor of the resync thread, the websocket
+                of the subtensor of the caller can not be shared.
+            block (int): Current block, when already known. Requested from the chain otherwise.
+            block_time (float): Seconds between blocks.
+            resync_interval (float): Seconds between resyncs with the chain, 0 to not resync.
+            timer (Callable[[], float]): Monotonic clock the estimate is computed with.
+        """
+        self.subtensor_factory = subtensor_factory
+        self.block_time = block_time
+        self.resync_interval = resync_interval
+        self.timer = timer
+        self.subtensor = None
+        self.lock = threading.Lock()
+        self.anchor_block = None
+        self.anchor_time = None
+        self.last_block = 0
+        self.last_sync_time = None
+        self._stop = threading.Event()
+        if block is None:
+            self.sync()
+        else:
+            self.observe(block)
+
+        self._thread = None
+        if resync_interval > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="BlockClock", daemon=True
+            )
+            self._thread.start()
+
+    def _estimate(self, now: float) -> int:
+        return self.anchor_block + int((now - self.anchor_time) // self.block_time)
+
+    def observe(self, block: int, at: Optional[float] = None):
+        """Records that the chain was at `block` at time `at` of the timer, now by default."""
+        at = self.timer() if at is None else at
+        with self.lock:
+            # Keep the anchor while the estimate is right, its block boundaries are more accurate.
+            if self.anchor_block is None or self._estimate(at) != block:
+                self.anchor_block = block
+                self.anchor_time = at
+            self.last_block = max(self.last_block, block)
+
+    @property
+    def block(self) -> int:
+        """Estimated current block."""
+        with self.lock:
+            self.last_block = max(self.last_block, self._estimate(self.timer()))
+            return self.last_block
+
+    def seconds_until(self, block: int) -> float:
+        """Estimated seconds until the chain reaches `block`, 0 if it was reached."""
+        if self.block >= block:
+            return 0.0
+        with self.lock:
+            start = self.anchor_time + (block - self.anchor_block) * self.block_time
+        return max(start - self.timer(), 0.0)
+
+    def _delay(self, block: int) -> float:
+        # Wake up at least once per block, to follow the resyncs of the estimate.
+        return min(self.seconds_until(block), self.block_time) + 1e-3
+
+    async def wait_until(self, block: int) -> int:
+        """Waits until the estimate reaches `block` and returns the current block."""
+        while True:
+            current = self.block
+            if current >= block:
+                return current
+            await asyncio.sleep(self._delay(block))
+
+    async def next_block(self) -> int:
+        """Waits for the next block and returns it."""
+        return await self.wait_until(self.block + 1)
+
+    def wait_until_blocking(
+        self, block: int, timeout: Optional[float] = None
+    ) -> Optional[int]:
+        """Blocking variant of `wait_until`. Returns None when the timeout expires or the clock is stopped first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.block
+            if current >= block:
+                return current
+            delay = self._delay(block)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                delay = min(delay, remaining)
+            if self._stop.wait(delay):
+                return None
+
+    def sync(self) -> int:
+        """Observes the current block of the chain and returns it."""
+        if self.subtensor is None:
+            self.subtensor = self.subtensor_factory()
+        start = self.timer()
+        block = self.subtensor.get_current_block()
+        # The block was current at some point of the request.
+        self.observe(block, at=(start + self.timer()) / 2)
+        self.last_sync_time = time.time()
+        return block
+
+    def _run(self):
+        while not self._stop.wait(self.resync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                # Reconnect on the next resync, the estimate keeps counting meanwhile.
+                self.subtensor = None
+                bt.logging.warning(f"Failed to sync block with error: {e}")
+
+    def stop(self):
+        self._stop.set()
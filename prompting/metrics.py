@@ -0,0 +1,364 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import bisect
+import threading
+import bittensor as bt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Default histogram buckets in seconds, from a few milliseconds to the longest query timeouts.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    25.0,
+    60.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metric:
+    """Base class of the metrics, holding one value per combination of label values."""
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames) or any(
+            name not in labels for name in self.labelnames
+        ):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], object]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Returns the (name, labels, value) samples of the metric."""
+        return [
+            (self.name, dict(zip(self.labelnames, key)), value)
+            for key, value in self._snapshot().items()
+        ]
+
+    def get(self, **labels) -> float:
+        """Returns the current value for the given labels."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Counter(Metric):
+    """Monotonically increasing value, e.g. the number of handled requests."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError(
+                "Counters can only be incremented by non-negative amounts."
+            )
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Sets the counter to a total read from a monotonically increasing source, e.g. the cpu time of the
+        process read by a collector. Lower totals are ignored."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = max(self._values.get(key, 0.0), float(value))
+
+
+class Gauge(Metric):
+    """Value which can go up and down, e.g. memory usage or the number of requests in flight."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies, counted in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per bucket counts (plus the +Inf bucket), sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, **labels) -> Tuple[int, float]:
+        """Returns the (count, sum) of the observations for the given labels."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state is not None else (0, 0.0)
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], object]:
+        with self._lock:
+            return {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            }
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, (counts, total, count) in self._snapshot().items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(
+                    (
+                        self.name + "_bucket",
+                        {**labels, "le": _format_value(bound)},
+                        cumulative,
+                    )
+                )
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    In-process registry of metrics, rendered in the Prometheus text exposition format.
+
+    Recording a value only takes the lock of the metric for a dictionary update, so it is safe to call from the
+    forward loop and the axon threads. Collectors registered with `add_collector` are called when the registry is
+    scraped rather than on the hot path, which is where expensive values such as memory usage are read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[["MetricsRegistry"], None]] = []
+
+    def _get_or_create(self, cls, name: str, documentation: str, **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    f"Metric {name} is already registered as a {metric.type}."
+                )
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        """Returns the counter `name`, creating it on first use."""
+        return self._get_or_create(Counter, name, documentation, labelnames=labelnames)
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        """Returns the gauge `name`, creating it on first use."""
+        return self._get_or_create(Gauge, name, documentation, labelnames=labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Returns the histogram `name`, creating it on first use."""
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames=labelnames, buckets=buckets
+        )
+
+    def add_collector(self, collector: Callable[["MetricsRegistry"], None]):
+        """Registers a function called with the registry before every scrape."""
+        self._collectors.append(collector)
+
+    def collect(self) -> Iterable[Metric]:
+        """Runs the collectors and returns the registered metrics."""
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                bt.logging.warning(f"Metrics collector {collector} failed with: {e}")
+        with self._lock:
+            return list(self._metrics.values())
+
+    def expose(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def process_collector(registry: MetricsRegistry):
+    """Reads the cpu and memory usage of the process and the memory allocated on each gpu."""
+    try:
+        import psutil
+
+        process = psutil.Process()
+        memory = process.memory_info()
+        cpu_times = process.cpu_times()
+        registry.gauge(
+            "process_resident_memory_bytes", "Resident memory size in bytes."
+        ).set(memory.rss)
+        registry.gauge(
+            "process_virtual_memory_bytes", "Virtual memory size in bytes."
+        ).set(memory.vms)
+        registry.counter(
+            "process_cpu_seconds_total", "Total user and system cpu time in seconds."
+        ).set_total(cpu_times.user + cpu_times.system)
+    except ImportError:
+        pass
+
+    import torch
+
+    if torch.cuda.is_available():
+        allocated = registry.gauge(
+            "gpu_memory_allocated_bytes",
+            "Memory allocated by tensors on the gpu in bytes.",
+            ["device"],
+        )
+        reserved = registry.gauge(
+            "gpu_memory_reserved_bytes",
+            "Memory reserved by the caching allocator on the gpu in bytes.",
+            ["device"],
+        )
+        for device in range(torch.cuda.device_count()):
+            allocated.set(torch.cuda.memory_allocated(device), device=device)
+            reserved.set(torch.cuda.memory_reserved(device), device=device)
+
+
+class MetricsServer:
+    """Serves the metrics of a registry over plain http from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "0.0.0.0"):
+        """
+        Args:
+            registry (MetricsRegistry): Registry to expose.
+            port (int): Port to listen on, 0 binds a free port.
+            host (str, optional): Address to listen on. Defaults to all interfaces.
+        """
+        self.registry = registry
+        self.host = host
+        self._port = port
+        self.server: ThreadingHTTPServer = None
+        self.thread: threading.Thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1] if self.server else self._port
+
+    def start(self) -> "MetricsServer":
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self._port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        )
+        self.thread.start()
+        bt.logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join(5)
+            self.server = None
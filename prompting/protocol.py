@@ -16,6 +16,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import codecs
 import pydantic
 import time
 import torch
@@ -197,9 +198,11 @@ class StreamPrompting(bt.StreamingSynapse):
         Bittensor network. It's the heart of the StreamPrompting class, ensuring that streaming tokens, which represent
         prompts or messages, are decoded and appropriately managed.
 
-        As the streaming response is consumed, the tokens are decoded from their 'utf-8' encoded format, split based on
-        newline characters, and concatenated into the `completion` attribute. This accumulation of decoded tokens in the
-        `completion` attribute allows for a continuous and coherent accumulation of the streaming content.
+        As the streaming response is consumed, the chunks are decoded from 'utf-8' with an incremental decoder, so that
+        multi-byte characters split across chunks are decoded once all of their bytes have arrived. The decoded text is
+        split based on newline characters and the tokens are collected in a local buffer, which is joined into the
+        `completion` attribute once the stream ends (or is closed). This keeps accumulation linear in the length of the
+        stream and runs the pydantic assignment validation only once.
 
         Args:
             response: The streaming response object containing the content chunks to be processed. Each chunk in this
@@ -207,12 +210,25 @@ class StreamPrompting(bt.StreamingSynapse):
         """
         if self.completion is None:
             self.completion = ""
-        async for chunk in response.content.iter_any():
-            tokens = chunk.decode("utf-8").split("\n")
-            for token in tokens:
-                if token:
-                    self.completion += token
-            yield tokens
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = [self.completion]
+        try:
+            async for chunk in response.content.iter_any():
+                text = decoder.decode(chunk)
+                if not text:
+                    # The chunk only holds the start of a multi-byte character.
+                    continue
+                tokens = text.split("\n")
+                buffer.extend(token for token in tokens if token)
+                yield tokens
+
+            text = decoder.decode(b"", final=True)
+            if text:
+                tokens = text.split("\n")
+                buffer.extend(token for token in tokens if token)
+                yield tokens
+        finally:
+            self.completion = "".join(buffer)
 
     def deserialize(self) -> str:
         """
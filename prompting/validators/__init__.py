@@ -15,17 +15,8 @@
 # THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
-from . import config
-from . import forward
-from . import gating
-from . import misc
-from . import mock
-from . import prompts
-from . import reward
-from . import utils
-from . import weights
-from . import event
-from . import dataset
+
+import importlib
 
 __version__ = "2.1.6"
 version_split = __version__.split(".")
@@ -34,3 +25,47 @@ __spec_version__ = (
     + (10 * int(version_split[1]))
     + (1 * int(version_split[2]))
 )
+
+# Submodules are imported on first access (PEP 562), so that importing the package or one of its submodules does
+# not pull in the heavy dependencies (transformers, datasets, wandb, ...) of the others.
+_submodules = {
+    "bundle",
+    "checkpoint",
+    "config",
+    "corpus",
+    "dataset",
+    "event",
+    "event_store",
+    "forward",
+    "gating",
+    "gating_offline",
+    "gating_trainer",
+    "loader",
+    "metagraph_sync",
+    "mock",
+    "penalty",
+    "prompts",
+    "quantize",
+    "rescore",
+    "residency",
+    "reward",
+    "sampler",
+    "scoreboard",
+    "scorer_state",
+    "tasks",
+    "timing",
+    "units",
+    "utils",
+    "wandb_logger",
+    "weights",
+}
+
+
+def __getattr__(name: str):
+    if name in _submodules:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _submodules)
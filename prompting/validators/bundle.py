@@ -0,0 +1,293 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import glob
+import json
+import time
+import torch
+import argparse
+import bittensor as bt
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Files other than the weights needed to load a model: configs, tokenizers and remote code.
+_MODEL_FILE_PATTERNS = ["*.json", "*.txt", "*.model", "*.py", "*.tiktoken"]
+
+# Manifest and directory of the bundle in use, set by `use_bundle`.
+_manifest: Optional[Dict] = None
+_bundle_path: Optional[str] = None
+
+
+def use_bundle(path: str) -> Dict:
+    """Loads the models and files of the bundle at `path` instead of the Hugging Face hub.
+    Args:
+        path (str): Directory of a bundle built with `python -m prompting.validators.bundle`.
+    Returns:
+        Dict: The manifest of the bundle.
+    """
+    global _manifest, _bundle_path
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            f"Unsupported bundle version {manifest.get('version')}, rebuild the bundle at {path}"
+        )
+    _manifest, _bundle_path = manifest, os.path.abspath(path)
+    bt.logging.info(
+        f"Using model bundle {path} with {len(manifest['models'])} models and {len(manifest['files'])} files"
+    )
+    return manifest
+
+
+def _matches(entry: Dict, revision: Optional[str]) -> bool:
+    requested = revision or "main"
+    return requested in (entry["revision"], entry["commit"]) or entry[
+        "commit"
+    ].startswith(requested)
+
+
+def resolve_model_path(name: str, revision: Optional[str] = None) -> str:
+    """Returns the local directory of the model in the bundle in use, or `name` to load it from the hub.
+    Args:
+        name (str): Hugging Face repository of the model.
+        revision (str, optional): Revision the model is loaded at, the bundled model is only used if it matches.
+    """
+    if _manifest is None:
+        return name
+    entry = _manifest["models"].get(name)
+    if entry is None:
+        bt.logging.warning(
+            f"Model {name} is not in the bundle, loading it from the hub"
+        )
+        return name
+    if not _matches(entry, revision):
+        bt.logging.warning(
+            f"Bundled {name} is at revision {entry['revision']} ({entry['commit']}) instead of {revision}, loading it from the hub"
+        )
+        return name
+    return os.path.join(_bundle_path, entry["path"])
+
+
+def resolve_file(repo_id: str, filename: str) -> Optional[str]:
+    """Returns the local path of a file of the bundle in use, None if it is not bundled."""
+    if _manifest is None:
+        return None
+    entry = _manifest["files"].get(f"{repo_id}/{filename}")
+    if entry is None:
+        return None
+    return os.path.join(_bundle_path, entry["path"])
+
+
+def _unshare(state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """Copies tensors sharing storage (e.g. tied embeddings), which safetensors cannot serialize."""
+    seen = set()
+    result = {}
+    for name, tensor in state_dict.items():
+        pointer = tensor.untyped_storage().data_ptr()
+        result[name] = tensor.clone() if pointer in seen else tensor.contiguous()
+        seen.add(pointer)
+    return result
+
+
+def convert_to_safetensors(directory: str):
+    """Converts the pytorch `.bin` weights of a model directory to safetensors, which are loaded memory-mapped."""
+    from safetensors.torch import save_file
+
+    for bin_path in sorted(glob.glob(os.path.join(directory, "pytorch_model*.bin"))):
+        state_dict = torch.load(bin_path, map_location="cpu")
+        safe_name = os.path.basename(bin_path).replace("pytorch_model", "model")
+        save_file(
+            _unshare(state_dict),
+            os.path.join(directory, safe_name[: -len(".bin")] + ".safetensors"),
+            metadata={"format": "pt"},
+        )
+        os.remove(bin_path)
+
+    index_path = os.path.join(directory, "pytorch_model.bin.index.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        index["weight_map"] = {
+            name: shard.replace("pytorch_model", "model").replace(
+                ".bin", ".safetensors"
+            )
+            for name, shard in index["weight_map"].items()
+        }
+        with open(os.path.join(directory, "model.safetensors.index.json"), "w") as f:
+            json.dump(index, f, indent=2)
+        os.remove(index_path)
+
+
+def _local_name(repo_id: str) -> str:
+    return repo_id.replace("/", "--")
+
+
+def build_bundle(
+    output: str,
+    models: List[Tuple[str, Optional[str], bool]],
+    files: List[Tuple[str, str]] = (),
+) -> Dict:
+    """Downloads models and files into a bundle directory and writes its manifest.
+    Args:
+        output (str): Directory of the bundle.
+        models (List[Tuple[str, Optional[str], bool]]): Repository, revision (None for main) and whether to
+            include the weights (False for tokenizer or config only models) of each model.
+        files (List[Tuple[str, str]]): Repository and name of single files, e.g. checkpoints.
+    Returns:
+        Dict: The manifest.
+    """
+    from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+
+    api = HfApi()
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": time.time(),
+        "models": {},
+        "files": {},
+    }
+    for repo_id, revision, weights in models:
+        if repo_id in manifest["models"]:
+            continue
+        info = api.model_info(repo_id, revision=revision)
+        has_safetensors = any(
+            sibling.rfilename.endswith(".safetensors") for sibling in info.siblings
+        )
+        patterns = list(_MODEL_FILE_PATTERNS)
+        if weights:
+            patterns.append(
+                "*.safetensors" if has_safetensors else "pytorch_model*.bin"
+            )
+        path = os.path.join("models", _local_name(repo_id))
+        bt.logging.info(f"Bundling {repo_id}@{info.sha}")
+        snapshot_download(
+            repo_id,
+            revision=info.sha,
+            local_dir=os.path.join(output, path),
+            allow_patterns=patterns,
+        )
+        if weights and not has_safetensors:
+            convert_to_safetensors(os.path.join(output, path))
+        manifest["models"][repo_id] = {
+            "revision": revision or "main",
+            "commit": info.sha,
+            "path": path,
+            "weights": weights,
+        }
+
+    for repo_id, filename in files:
+        info = api.model_info(repo_id)
+        directory = os.path.join("files", _local_name(repo_id))
+        bt.logging.info(f"Bundling {repo_id}/{filename}@{info.sha}")
+        hf_hub_download(
+            repo_id,
+            filename,
+            revision=info.sha,
+            local_dir=os.path.join(output, directory),
+        )
+        manifest["files"][f"{repo_id}/{filename}"] = {
+            "revision": "main",
+            "commit": info.sha,
+            "path": os.path.join(directory, filename),
+        }
+
+    # Write the manifest last, a bundle without manifest is incomplete.
+    with open(os.path.join(output, MANIFEST_FILE + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(
+        os.path.join(output, MANIFEST_FILE + ".tmp"),
+        os.path.join(output, MANIFEST_FILE),
+    )
+    return manifest
+
+
+def default_models(
+    gating_model_name: str,
+) -> Tuple[List[Tuple[str, Optional[str], bool]], List[Tuple[str, str]]]:
+    """Returns the models and files used by the validator reward, masking and gating models."""
+    from prompting.validators.reward import (
+        Blacklist,
+        DahoasRewardModel,
+        DirectPreferenceRewardModel,
+        DiversityRewardModel,
+        NSFWRewardModel,
+        OpenAssistantRewardModel,
+        PromptRewardModel,
+        ReciprocateRewardModel,
+    )
+    from prompting.validators.reward.relevance import (
+        BertRelevanceRewardModel,
+        MpnetRelevenceModel,
+    )
+
+    models = [
+        (DirectPreferenceRewardModel.reward_model_name, None, True),
+        (OpenAssistantRewardModel.reward_model_name, None, True),
+        (
+            ReciprocateRewardModel.reward_model_path,
+            ReciprocateRewardModel.revision,
+            True,
+        ),
+        # The Dahoas model is built from its config, its weights are the checkpoint file below.
+        (DahoasRewardModel.model_name, None, False),
+        (PromptRewardModel.reward_model_name, None, True),
+        (BertRelevanceRewardModel.relevance_model_path, None, True),
+        (MpnetRelevenceModel.diversity_model_path, None, True),
+        (DiversityRewardModel.diversity_model_path, None, True),
+        (NSFWRewardModel.nsfw_filter_model_path, None, True),
+        (Blacklist.tokenizer_name, None, False),
+        (gating_model_name, None, True),
+    ]
+    files = [(DahoasRewardModel.weights_repo, DahoasRewardModel.weights_file)]
+    return models, files
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Bundles the validator models into a local directory loaded with --neuron.model_bundle."
+    )
+    parser.add_argument("output", type=str, help="Directory of the bundle.")
+    parser.add_argument(
+        "--gating_model_name",
+        type=str,
+        default="EleutherAI/gpt-neo-125m",
+        help="Model of the gating model, see --gating.model_name.",
+    )
+    parser.add_argument(
+        "--models",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Additional models to bundle, as repo or repo@revision.",
+    )
+    args = parser.parse_args(args)
+
+    models, files = default_models(args.gating_model_name)
+    for model in args.models:
+        repo_id, _, revision = model.partition("@")
+        models.append((repo_id, revision or None, True))
+    manifest = build_bundle(args.output, models, files)
+    print(
+        f"Bundled {len(manifest['models'])} models and {len(manifest['files'])} files into {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
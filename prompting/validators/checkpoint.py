@@ -0,0 +1,300 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import queue
+import tempfile
+import threading
+import numpy as np
+import torch
+import bittensor as bt
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+def atomic_save(obj: Any, path: str):
+    """Saves the object with `torch.save` to a temporary file renamed over the path, so that the path always holds
+    a complete checkpoint."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(obj: Any, path: str):
+    """Writes the object as json to a temporary file renamed over the path."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EmbeddingSegment:
+    """Append-only file of fp16 embedding rows, the historic embeddings of the diversity model.
+
+    The rows are appended to `<name>.<generation>.f16` and the number of committed rows is written to the
+    `<name>.json` index after them, so rows of an interrupted append are ignored. Once the file holds twice
+    `max_rows`, the last `max_rows` are compacted to a file of the next generation.
+    """
+
+    def __init__(self, path: str, max_rows: int):
+        """
+        Args:
+            path (str): Path of the segment without extension, e.g. `<full_path>/diversity_embeddings`.
+            max_rows (int): Number of most recent rows kept and loaded.
+        """
+        self.path = path
+        self.max_rows = max_rows
+
+    @property
+    def index_path(self) -> str:
+        return self.path + ".json"
+
+    def data_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.f16"
+
+    def index(self) -> Optional[Dict]:
+        """Returns the `generation`, `dim` and committed `rows` of the segment, None if there is none."""
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def append(self, rows: torch.Tensor):
+        """Appends the rows to the segment."""
+        rows = rows.detach().to("cpu", torch.float16).numpy()
+        index = self.index()
+        if (
+            index is None
+            or index["dim"] != rows.shape[1]
+            or not os.path.exists(self.data_path(index["generation"]))
+        ):
+            self.rewrite(rows)
+            return
+
+        row_bytes = rows.shape[1] * rows.itemsize
+        with open(self.data_path(index["generation"]), "r+b") as f:
+            # Drop the rows of an interrupted append.
+            f.truncate(index["rows"] * row_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        index["rows"] += len(rows)
+        atomic_write_json(index, self.index_path)
+
+        if index["rows"] >= 2 * self.max_rows:
+            self.rewrite(self.read(index), index["generation"] + 1)
+
+    def rewrite(self, rows: np.ndarray, generation: int = None):
+        """Writes the last `max_rows` rows to a new file and points the index to it."""
+        index = self.index()
+        if generation is None:
+            generation = 0 if index is None else index["generation"] + 1
+        rows = np.ascontiguousarray(rows[-self.max_rows :], dtype=np.float16)
+        with open(self.data_path(generation), "wb") as f:
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        atomic_write_json(
+            {"generation": generation, "dim": rows.shape[1], "rows": len(rows)},
+            self.index_path,
+        )
+        if index is not None and index["generation"] != generation:
+            try:
+                os.remove(self.data_path(index["generation"]))
+            except OSError:
+                pass
+
+    def read(self, index: Dict = None) -> np.ndarray:
+        """Returns the last `max_rows` committed rows."""
+        index = index or self.index()
+        if index is None or index["rows"] == 0:
+            return np.zeros((0, index["dim"] if index else 0), dtype=np.float16)
+        rows = np.memmap(
+            self.data_path(index["generation"]),
+            dtype=np.float16,
+            mode="r",
+            shape=(index["rows"], index["dim"]),
+        )
+        return np.array(rows[-self.max_rows :])
+
+    def load(self) -> Optional[torch.FloatTensor]:
+        """Returns the last `max_rows` rows as float32, None if there is no segment."""
+        if self.index() is None:
+            return None
+        return torch.from_numpy(self.read()).float()
+
+
+@dataclass
+class Snapshot:
+    """State captured on the main loop and written by the checkpointer.
+    Args:
+        files (Dict[str, Any]): Objects saved with `torch.save`, by path.
+        embeddings (torch.Tensor): Historic embeddings added since the previous snapshot.
+        rewrite (bool): Rewrite the segment with `embeddings` instead of appending them.
+        writes (List[Callable]): Other writes of the snapshot, e.g. encoding and writing captured state.
+        callbacks (List[Callable]): Called once the snapshot is written.
+    """
+
+    files: Dict[str, Any] = field(default_factory=dict)
+    embeddings: Optional[torch.Tensor] = None
+    rewrite: bool = False
+    writes: List[Callable[[], None]] = field(default_factory=list)
+    callbacks: List[Callable[[], None]] = field(default_factory=list)
+
+
+class Checkpointer:
+    """Writes state snapshots from a background thread, so checkpoints do not pause the forward loop.
+
+    Snapshots are written in the order they are submitted. The historic embeddings of the diversity model are
+    appended to an `EmbeddingSegment`, only the rows added since the previous snapshot are copied and written.
+    """
+
+    def __init__(self, embeddings: EmbeddingSegment, background: bool = True):
+        """
+        Args:
+            embeddings (EmbeddingSegment): Segment of the historic embeddings.
+            background (bool): Write the snapshots from a background thread, else when submitted.
+        """
+        self.embeddings = embeddings
+        self.background = background
+        # Value of the `historic_count` of the diversity model at the last snapshot.
+        self.embeddings_count = None
+        self.rewrite_embeddings = True
+        self.queue = queue.Queue()
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(
+                target=self.run, name="Checkpointer", daemon=True
+            )
+            self.thread.start()
+
+    def snapshot_embeddings(
+        self,
+        snapshot: Snapshot,
+        historic_embeddings: torch.Tensor,
+        historic_count: int,
+    ):
+        """Adds the historic embeddings added since the previous snapshot to the snapshot.
+        Args:
+            snapshot (Snapshot): Snapshot to add the embeddings to.
+            historic_embeddings (torch.Tensor): Most recent embeddings, the diversity model replaces the tensor
+                when it adds embeddings so it is not modified once captured.
+            historic_count (int): Number of embeddings ever added to the history.
+        """
+        if self.rewrite_embeddings or self.embeddings_count is None:
+            new_rows = len(historic_embeddings)
+            snapshot.rewrite = True
+        else:
+            new_rows = min(
+                historic_count - self.embeddings_count, len(historic_embeddings)
+            )
+        snapshot.embeddings = (
+            historic_embeddings[len(historic_embeddings) - new_rows :]
+            .detach()
+            .to("cpu", torch.float16)
+        )
+        self.embeddings_count = historic_count
+        self.rewrite_embeddings = False
+
+    def mark_loaded(self, historic_count: int):
+        """Marks the embeddings loaded from the segment as written."""
+        self.embeddings_count = historic_count
+        self.rewrite_embeddings = False
+
+    def submit(self, snapshot: Snapshot):
+        """Writes the snapshot, from the background thread when enabled."""
+        if self.background:
+            self.queue.put(snapshot)
+        else:
+            self.write(snapshot)
+
+    def write(self, snapshot: Snapshot):
+        for path, obj in snapshot.files.items():
+            try:
+                atomic_save(obj, path)
+            except Exception as e:
+                bt.logging.warning(f"Failed to save {path} with error: {e}")
+
+        if snapshot.embeddings is not None and snapshot.embeddings.numel() > 0:
+            try:
+                if snapshot.rewrite:
+                    self.embeddings.rewrite(snapshot.embeddings.numpy())
+                else:
+                    self.embeddings.append(snapshot.embeddings)
+            except Exception as e:
+                # Rows of this snapshot are lost, the next snapshot rewrites the segment.
+                self.rewrite_embeddings = True
+                bt.logging.warning(
+                    f"Failed to save historic embeddings to {self.embeddings.path} with error: {e}"
+                )
+
+        for write in snapshot.writes:
+            try:
+                write()
+            except Exception as e:
+                bt.logging.warning(f"Failed to write checkpoint with error: {e}")
+
+        for callback in snapshot.callbacks:
+            try:
+                callback()
+            except Exception as e:
+                bt.logging.warning(f"Checkpoint callback failed with error: {e}")
+
+    def run(self):
+        while True:
+            snapshot = self.queue.get()
+            try:
+                if snapshot is None:
+                    return
+                self.write(snapshot)
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until the submitted snapshots are written. Returns False on timeout."""
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(
+                lambda: self.queue.unfinished_tasks == 0, timeout
+            )
+
+    def close(self, timeout: float = None) -> bool:
+        """Writes the pending snapshots and stops the thread."""
+        if self.thread is None:
+            return True
+        self.queue.put(None)
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
@@ -50,7 +50,7 @@ def check_config(cls, config: "bt.Config"):
     if not os.path.exists(config.neuron.full_path):
         os.makedirs(config.neuron.full_path, exist_ok=True)
 
-    if not config.neuron.dont_save_events:
+    if not config.neuron.dont_save_events and config.neuron.events_backend == "log":
         # Add custom event logger for the events.
         logger.level("EVENTS", no=38, icon="📝")
         logger.add(
@@ -102,6 +102,30 @@ def add_args(cls, parser):
         help="Disables setting weights.",
         default=False,
     )
+    parser.add_argument(
+        "--neuron.set_weights_timeout",
+        type=float,
+        help="Seconds before an attempt to set weights is abandoned.",
+        default=60.0,
+    )
+    parser.add_argument(
+        "--neuron.set_weights_retries",
+        type=int,
+        help="Number of retries after a failed attempt to set weights.",
+        default=3,
+    )
+    parser.add_argument(
+        "--neuron.set_weights_backoff",
+        type=float,
+        help="Seconds before the first retry to set weights, doubled for every following retry.",
+        default=2.0,
+    )
+    parser.add_argument(
+        "--neuron.set_weights_wait_for_inclusion",
+        action="store_true",
+        help="Wait for the weights to be included in a block, so failed inclusions are retried.",
+        default=False,
+    )
     parser.add_argument(
         "--neuron.moving_average_alpha",
         type=float,
@@ -138,6 +162,37 @@ def add_args(cls, parser):
         default=3,
     )
 
+    parser.add_argument(
+        "--neuron.streaming",
+        action="store_true",
+        help="Query miners with the StreamPrompting synapse and consume completions as they are streamed.",
+        default=False,
+    )
+    parser.add_argument(
+        "--neuron.followup_stream_token_budget",
+        type=int,
+        help="Maximum number of streamed tokens consumed per miner for summary and followup prompts, 0 for no limit.",
+        default=0,
+    )
+    parser.add_argument(
+        "--neuron.followup_stream_byte_budget",
+        type=int,
+        help="Maximum number of streamed bytes consumed per miner for summary and followup prompts, 0 for no limit.",
+        default=0,
+    )
+    parser.add_argument(
+        "--neuron.answer_stream_token_budget",
+        type=int,
+        help="Maximum number of streamed tokens consumed per miner for answer prompts, 0 for no limit.",
+        default=0,
+    )
+    parser.add_argument(
+        "--neuron.answer_stream_byte_budget",
+        type=int,
+        help="Maximum number of streamed bytes consumed per miner for answer prompts, 0 for no limit.",
+        default=0,
+    )
+
     parser.add_argument(
         "--neuron.epoch_length_override",
         type=int,
@@ -150,6 +205,24 @@ def add_args(cls, parser):
         help="Blocks before a checkpoint is saved.",
         default=100,
     )
+    parser.add_argument(
+        "--neuron.metagraph_sync_interval",
+        type=float,
+        help="Seconds between metagraph syncs in a background thread, 0 to sync on the main loop at checkpoints.",
+        default=120.0,
+    )
+    parser.add_argument(
+        "--neuron.block_resync_interval",
+        type=float,
+        help="Seconds between resyncs of the block estimate with the chain, 0 to not resync.",
+        default=60.0,
+    )
+    parser.add_argument(
+        "--neuron.sync_checkpoint",
+        action="store_true",
+        help="Write checkpoints on the main loop instead of a background thread.",
+        default=False,
+    )
     parser.add_argument(
         "--neuron.events_retention_size",
         type=str,
@@ -162,6 +235,33 @@ def add_args(cls, parser):
         help="If set, we dont save events to a log file.",
         default=False,
     )
+    parser.add_argument(
+        "--neuron.events_backend",
+        type=str,
+        choices=["log", "arrow"],
+        help="Where events are saved: json lines in completions.log, or batched arrow segments (rotated at events_retention_size) in the events directory.",
+        default="log",
+    )
+
+    parser.add_argument(
+        "--neuron.stage_timing",
+        action="store_true",
+        help="Record the wall and cpu time of each stage of a step (query, reward models, gating, ...) in the events.",
+        default=False,
+    )
+    parser.add_argument(
+        "--neuron.stage_timing_window",
+        type=int,
+        help="Number of recent steps used to compute the stage time percentiles.",
+        default=100,
+    )
+
+    parser.add_argument(
+        "--neuron.metrics_port",
+        type=int,
+        help="Port of the prometheus metrics endpoint (step latency, scoring time, status codes, memory). 0 disables it.",
+        default=0,
+    )
 
     parser.add_argument(
         "--neuron.vpermit_tao_limit",
@@ -170,6 +270,25 @@ def add_args(cls, parser):
         default=4096,
     )
 
+    parser.add_argument(
+        "--neuron.uid_sampler_off",
+        action="store_true",
+        help="Sample uids uniformly instead of preferring miners that respond successfully.",
+        default=False,
+    )
+    parser.add_argument(
+        "--neuron.uid_sampler_exploration",
+        type=float,
+        help="Fraction of each uid sample reserved for re-probing miners that have been failing.",
+        default=0.1,
+    )
+    parser.add_argument(
+        "--neuron.uid_sampler_decay",
+        type=float,
+        help="Discount applied to the uid success statistics after each step.",
+        default=0.99,
+    )
+
     parser.add_argument(
         "--neuron.axon_off",
         "--axon_off",
@@ -219,6 +338,12 @@ def add_args(cls, parser):
         help="Notes to add to the wandb run.",
         default="",
     )
+    parser.add_argument(
+        "--wandb.queue_size",
+        type=int,
+        help="Maximum number of records waiting to be logged to wandb, records are dropped above it.",
+        default=256,
+    )
     parser.add_argument(
         "--wandb.track_gating_model",
         action="store_true",
@@ -304,6 +429,49 @@ def add_args(cls, parser):
         help="Dont download the dendrite pool.",
         default=False,
     )
+    parser.add_argument(
+        "--neuron.model_bundle",
+        type=str,
+        help="Load the models from a local bundle built with `python -m prompting.validators.bundle` instead of the hub.",
+        default=None,
+    )
+    parser.add_argument(
+        "--neuron.model_loading_workers",
+        type=int,
+        help="Number of models (reward models, gating model) loaded concurrently at startup.",
+        default=4,
+    )
+    parser.add_argument(
+        "--neuron.memory_budget",
+        type=str,
+        help="Memory budget of the reward and masking models on the device (e.g. 8GB). Least recently used models are offloaded to stay within the budget and paged back in when applied. 0 keeps every model on the device.",
+        default="0",
+    )
+    parser.add_argument(
+        "--neuron.offload",
+        type=str,
+        choices=["cpu", "disk"],
+        help="Where models are offloaded to when exceeding --neuron.memory_budget.",
+        default="cpu",
+    )
+    parser.add_argument(
+        "--neuron.cpu_quantize",
+        action="store_true",
+        help="Quantize the Linear layers of the encoder based reward and masking models (rlhf, relevance, diversity, nsfw) to int8 when running on cpu.",
+        default=False,
+    )
+    parser.add_argument(
+        "--neuron.cpu_threads",
+        type=int,
+        help="Number of intra-op torch threads used with --neuron.cpu_quantize, 0 uses one thread per physical core.",
+        default=0,
+    )
+    parser.add_argument(
+        "--neuron.background_model_loading",
+        action="store_true",
+        help="Keep loading the reward models in the background instead of waiting for them at startup, the first step using a model waits for it to be loaded. All models still start loading at startup.",
+        default=False,
+    )
     parser.add_argument(
         "--neuron.mock_gating_model",
         action="store_true",
@@ -316,6 +484,30 @@ def add_args(cls, parser):
         help="Dont download the dataset.",
         default=False,
     )
+    parser.add_argument(
+        "--neuron.corpus_path",
+        type=str,
+        help="Sample the base texts from a local corpus built with `python -m prompting.validators.corpus` instead of the online datasets.",
+        default=None,
+    )
+    parser.add_argument(
+        "--neuron.corpus_seed",
+        type=int,
+        help="Seed of the corpus document sampling.",
+        default=None,
+    )
+    parser.add_argument(
+        "--neuron.dataset_prefetch_size",
+        type=int,
+        help="Number of dataset texts prefetched by a background thread. 0 reads the dataset in the forward loop.",
+        default=32,
+    )
+    parser.add_argument(
+        "--neuron.dataset_cache_size",
+        type=int,
+        help="Number of dataset documents cached on disk and served first after a restart. 0 disables the cache.",
+        default=1000,
+    )
     parser.add_argument(
         "--neuron.use_custom_gating_model",
         action="store_true",
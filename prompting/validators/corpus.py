@@ -0,0 +1,164 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import mmap
+import glob
+import random
+import argparse
+import numpy as np
+import bittensor as bt
+from array import array
+from collections.abc import Iterator
+from typing import Iterable, Optional
+from prompting.validators.dataset import truncate_sentences
+
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+
+
+class CorpusDataset(Iterator):
+    """
+    Dataset sampling random documents from a local corpus built by `build_corpus`.
+
+    A corpus is a directory holding the utf-8 encoded documents concatenated in `texts.bin` and the byte offsets of
+    the documents (one more than the number of documents) in `offsets.npy`. Both files are memory-mapped, so
+    sampling a document is O(1), needs no network and only pages in the bytes of the sampled document.
+    """
+
+    def __init__(self, path: str, seed: Optional[int] = None):
+        """
+        Args:
+            path (str): Directory of the corpus.
+            seed (int, optional): Seed of the document sampling, for reproducible runs.
+        """
+        super().__init__()
+        self.path = path
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        if len(self.offsets) < 2:
+            raise ValueError(f"Corpus {path} is empty")
+        with open(os.path.join(path, TEXTS_FILE), "rb") as f:
+            self.texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.random = random.Random(seed)
+        bt.logging.info(f"Loaded corpus {path} with {len(self)} documents")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.texts[start:end].decode("utf-8")
+
+    def __next__(self):
+        return {"text": self[self.random.randrange(len(self))]}
+
+
+def build_corpus(
+    texts: Iterable[str],
+    path: str,
+    max_documents: Optional[int] = None,
+    max_sentences: Optional[int] = None,
+) -> int:
+    """Writes the texts as a corpus readable by `CorpusDataset`, skipping empty texts.
+    Args:
+        texts (Iterable[str]): Documents, e.g. from `iter_text_files` or `iter_hf_dataset`.
+        path (str): Directory of the corpus, created if missing. An existing corpus is replaced.
+        max_documents (int, optional): Stop after this many documents.
+        max_sentences (int, optional): Truncate the documents to this many sentences.
+    Returns:
+        int: Number of documents written.
+    """
+    os.makedirs(path, exist_ok=True)
+    texts_path = os.path.join(path, TEXTS_FILE)
+    offsets_path = os.path.join(path, OFFSETS_FILE)
+
+    offsets = array("Q", [0])
+    with open(texts_path + ".tmp", "wb") as f:
+        for text in texts:
+            if max_documents is not None and len(offsets) > max_documents:
+                break
+            if max_sentences is not None:
+                text = truncate_sentences(text, max_sentences)
+            if not text.strip():
+                continue
+            encoded = text.encode("utf-8")
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+
+    # np.save appends the extension to paths without one.
+    with open(offsets_path + ".tmp", "wb") as f:
+        np.save(f, np.frombuffer(offsets, dtype=np.uint64))
+    os.replace(texts_path + ".tmp", texts_path)
+    os.replace(offsets_path + ".tmp", offsets_path)
+    return len(offsets) - 1
+
+
+def iter_text_files(directory: str, pattern: str = "**/*.txt") -> Iterable[str]:
+    """Yields the content of the text files of a directory, one document per file."""
+    for file_path in sorted(
+        glob.glob(os.path.join(directory, pattern), recursive=True)
+    ):
+        with open(file_path, encoding="utf-8", errors="replace") as f:
+            yield f.read()
+
+
+def iter_hf_dataset(
+    name: str, config_name: Optional[str] = None, split: str = "train"
+) -> Iterable[str]:
+    """Yields the `text` field of a streaming Hugging Face dataset."""
+    from datasets import load_dataset
+
+    for item in load_dataset(name, config_name, split=split, streaming=True):
+        yield item["text"]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Builds a local corpus for --neuron.corpus_path from a Hugging Face dataset or text files."
+    )
+    parser.add_argument("output", type=str, help="Directory of the corpus.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--hf", type=str, help="Name of a Hugging Face dataset.")
+    source.add_argument("--dir", type=str, help="Directory of text files.")
+    parser.add_argument("--hf_config", type=str, default=None)
+    parser.add_argument("--split", type=str, default="train")
+    parser.add_argument("--pattern", type=str, default="**/*.txt")
+    parser.add_argument("--max_documents", type=int, default=None)
+    parser.add_argument(
+        "--max_sentences",
+        type=int,
+        default=31,
+        help="Sentences kept per document, the validator uses at most 30. 0 keeps documents whole.",
+    )
+    args = parser.parse_args(args)
+
+    if args.hf:
+        texts = iter_hf_dataset(args.hf, args.hf_config, args.split)
+    else:
+        texts = iter_text_files(args.dir, args.pattern)
+    count = build_corpus(
+        texts,
+        args.output,
+        max_documents=args.max_documents,
+        max_sentences=args.max_sentences or None,
+    )
+    print(f"Wrote {count} documents to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
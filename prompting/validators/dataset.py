@@ -16,15 +16,24 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import os
+import json
+import queue
 import random
+import threading
 import bittensor as bt
-from datasets import load_dataset
 from collections.abc import Iterator
+from typing import Callable, List, Optional
 
 
 class Dataset(Iterator):
     def __init__(self):
         super().__init__()
+        from datasets import load_dataset
+
+        # The forward flows read from executor threads, the streaming generators can not run concurrently.
+        self._lock = threading.Lock()
+
         seed = random.randint(0, 1000)
         self.openwebtext = iter(
             load_dataset("openwebtext", split="train", streaming=True).shuffle(
@@ -41,16 +50,188 @@ class Dataset(Iterator):
         )
 
     def __next__(self):
-        while True:
-            bt.logging.debug("Retrieving data from dataset...")
-            if random.random() < 0.5:
-                text = next(self.openwebtext)["text"]
-            else:
-                text = next(self.red_pajama)["text"]
-
-            # Check if the text is not empty or does not consist only of newline characters
-            if text.strip():
-                return {"text": text}
+        with self._lock:
+            while True:
+                bt.logging.debug("Retrieving data from dataset...")
+                if random.random() < 0.5:
+                    text = next(self.openwebtext)["text"]
+                else:
+                    text = next(self.red_pajama)["text"]
+
+                # Check if the text is not empty or does not consist only of newline characters
+                if text.strip():
+                    return {"text": text}
+
+
+def truncate_sentences(text: str, max_sentences: int) -> str:
+    """Keeps the first `max_sentences` sentences of the text (split on ".") and the period ending the last one."""
+    parts = text.split(".", maxsplit=max_sentences)
+    if len(parts) <= max_sentences:
+        return text
+    return ".".join(parts[:-1]) + "."
+
+
+class PrefetchDataset(Iterator):
+    """
+    Produces the dataset texts from a background thread into a bounded queue.
+
+    The source (by default a `Dataset`, whose streaming shuffle buffers are slow to fill) is created and read by the
+    producer thread, which filters empty texts and truncates them to `max_sentences` sentences. The flow cuts the
+    context at 30 sentences at most, so the default of 31 does not change the texts it uses. Produced texts are
+    also appended to a rolling cache on disk (two files of `cache_size / 2` documents), which is loaded on start and
+    served whenever the queue is empty, e.g. after a restart while the source warms up. The source is recreated
+    after a read error, and the iterator stops once a finite source is exhausted.
+    """
+
+    def __init__(
+        self,
+        source_factory: Callable[[], Iterator] = Dataset,
+        max_size: int = 32,
+        cache_path: Optional[str] = None,
+        cache_size: int = 1000,
+        max_sentences: Optional[int] = 31,
+        retry_interval: float = 10.0,
+    ):
+        """
+        Args:
+            source_factory (Callable[[], Iterator], optional): Creates the iterator of `{"text": ...}` items.
+            max_size (int, optional): Number of prefetched texts.
+            cache_path (str, optional): Directory of the disk cache, no cache if None.
+            cache_size (int, optional): Number of documents kept in the disk cache.
+            max_sentences (int, optional): Number of sentences texts are truncated to, None to keep them whole.
+            retry_interval (float, optional): Seconds to wait before recreating the source after an error.
+        """
+        super().__init__()
+        self.source_factory = source_factory
+        self.max_sentences = max_sentences
+        self.retry_interval = retry_interval
+        self.queue = queue.Queue(maxsize=max_size)
+        self.exhausted = False
+
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self._cache_file = None
+        self._cache_index = 0
+        self._cache_count = 0
+        self.warm: List[str] = []
+        if self.cache_path is not None and self.cache_size > 0:
+            os.makedirs(self.cache_path, exist_ok=True)
+            self.warm = self._load_cache()
+            random.shuffle(self.warm)
+            # Overwrite the older of the two cache files first.
+            mtimes = [
+                os.path.getmtime(path) if os.path.exists(path) else 0
+                for path in map(self._cache_file_path, range(2))
+            ]
+            self._cache_index = mtimes.index(min(mtimes))
+            bt.logging.debug(f"Loaded {len(self.warm)} cached dataset documents")
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(
+            target=self._produce, name="dataset-producer", daemon=True
+        )
+        self.thread.start()
+
+    def __next__(self):
+        # The forward flows may read concurrently from executor threads.
+        with self._lock:
+            try:
+                text = self.queue.get_nowait()
+            except queue.Empty:
+                if self.warm:
+                    return {"text": self.warm.pop()}
+                bt.logging.debug("Waiting for the dataset producer...")
+                text = self.queue.get()
+
+            if text is None:
+                # Keep the end of the source visible to the next calls.
+                self.queue.put(None)
+                if self.warm:
+                    return {"text": self.warm.pop()}
+                raise StopIteration
+            return {"text": text}
+
+    def qsize(self) -> int:
+        """Returns the number of prefetched texts."""
+        return self.queue.qsize()
+
+    def close(self):
+        """Stops the producer."""
+        self._stop.set()
+        self.thread.join(5)
+        if self._cache_file is not None:
+            self._cache_file.close()
+
+    def _produce(self):
+        source = None
+        while not self._stop.is_set():
+            try:
+                if source is None:
+                    source = iter(self.source_factory())
+                text = next(source)["text"]
+            except StopIteration:
+                self.exhausted = True
+                self._put(None)
+                return
+            except Exception as e:
+                bt.logging.warning(
+                    f"Failed to read from the dataset, retrying in {self.retry_interval}s: {e}"
+                )
+                source = None
+                self._stop.wait(self.retry_interval)
+                continue
+
+            if self.max_sentences is not None:
+                text = truncate_sentences(text, self.max_sentences)
+            if not text.strip():
+                continue
+            self._cache(text)
+            self._put(text)
+
+    def _put(self, text: Optional[str]):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(text, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _cache_file_path(self, index: int) -> str:
+        return os.path.join(self.cache_path, f"documents-{index}.jsonl")
+
+    def _load_cache(self) -> List[str]:
+        texts = []
+        for index in range(2):
+            path = self._cache_file_path(index)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        texts.append(json.loads(line)["text"])
+                    except (ValueError, KeyError):
+                        # Partially written line.
+                        continue
+        return texts
+
+    def _cache(self, text: str):
+        if self.cache_path is None or self.cache_size <= 0:
+            return
+        try:
+            if self._cache_file is None or self._cache_count >= self.cache_size // 2:
+                # Roll over to the other file, dropping the oldest half of the cache.
+                if self._cache_file is not None:
+                    self._cache_file.close()
+                    self._cache_index = 1 - self._cache_index
+                self._cache_file = open(
+                    self._cache_file_path(self._cache_index), "w", buffering=1
+                )
+                self._cache_count = 0
+            self._cache_file.write(json.dumps({"text": text}) + "\n")
+            self._cache_count += 1
+        except OSError as e:
+            bt.logging.warning(f"Failed to cache dataset document: {e}")
 
 
 class MockDataset(Iterator):
@@ -18,7 +18,7 @@
 
 import bittensor as bt
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 from prompting.validators.reward import RewardModelType
 from prompting.validators.penalty import PenaltyModelType
 
@@ -33,6 +33,12 @@ class EventSchema:
     completion_status_codes: List[
         str
     ]  # List of completion status codes for a given prompt
+    completion_first_token_times: Optional[
+        List[float]
+    ]  # List of times to first streamed token for a given prompt
+    completion_tokens_per_second: Optional[
+        List[float]
+    ]  # List of streamed tokens per second for a given prompt
     name: str  # Prompt type, e.g. 'followup', 'answer'
     task_type: str  # Task type, e.g. 'summary', 'question'
     block: float  # Current block at given step
@@ -116,6 +122,14 @@ class EventSchema:
     sentence_match_penalty_adjusted: Optional[List[float]]
     sentence_match_penalty_applied: Optional[List[float]]
 
+    # Timing data
+    stage_times: Optional[
+        Dict[str, float]
+    ]  # Wall and cpu time of each stage of the step
+    stage_time_percentiles: Optional[
+        Dict[str, float]
+    ]  # Rolling wall time percentiles of each stage
+
     # Weights data
     set_weights: Optional[List[List[float]]]
 
@@ -221,6 +235,8 @@ class EventSchema:
             completion_times=event_dict["completion_times"],
             completion_status_messages=event_dict["completion_status_messages"],
             completion_status_codes=event_dict["completion_status_codes"],
+            completion_first_token_times=event_dict.get("completion_first_token_times"),
+            completion_tokens_per_second=event_dict.get("completion_tokens_per_second"),
             name=event_dict["name"],
             task_type=event_dict["task_type"],
             block=event_dict["block"],
@@ -232,5 +248,7 @@ class EventSchema:
             rewards=event_dict["rewards"],
             **rewards,
             **penalties,
+            stage_times=event_dict.get("stage_times"),
+            stage_time_percentiles=event_dict.get("stage_time_percentiles"),
             set_weights=None,
         )
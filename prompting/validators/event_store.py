@@ -0,0 +1,383 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import glob
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+import pyarrow as pa
+import bittensor as bt
+from typing import Dict, Iterator, List, Optional
+
+# Field metadata marking columns holding ids into the string table of the segment.
+INTERNED_KEY = b"interned"
+
+
+def string_id(value: str) -> int:
+    """Content-addressed id of a string: the first 8 bytes of its blake2b digest."""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class EventStore:
+    """
+    Append-only columnar store of the validator events.
+
+    `log` only enqueues the event, the events are encoded and written in batches by a background thread to
+    Arrow IPC stream segments named `events-<timestamp>.arrow`. Strings (prompts, completions, status messages, ...)
+    are replaced by content-addressed ids and each distinct string is written once per segment to the sidecar
+    `events-<timestamp>.strings.arrow`, so repeated prompts and completions cost eight bytes per occurrence.
+    Segments are rotated once they exceed `max_segment_bytes`, or when the columns of the events change in a way
+    that does not fit the schema of the open segment. The stream format keeps every fully written batch readable
+    if the process dies. Use `EventReader` to read the events back.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_segment_bytes: int = 2 * 10**9,
+        batch_size: int = 64,
+        flush_interval: float = 10.0,
+        max_queue_size: int = 4096,
+    ):
+        """
+        Args:
+            path (str): Directory of the segments, created if missing.
+            max_segment_bytes (int, optional): Size of the events file above which a new segment is started.
+            batch_size (int, optional): Maximum number of events written as one record batch.
+            flush_interval (float, optional): Seconds after which a partial batch is written.
+            max_queue_size (int, optional): Number of pending events above which new events are dropped.
+        """
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(self.path, exist_ok=True)
+
+        codec = "zstd" if pa.Codec.is_available("zstd") else None
+        self.write_options = pa.ipc.IpcWriteOptions(compression=codec)
+
+        self.dropped = 0
+        self.segment: Optional[str] = None
+        self._schema: Optional[pa.Schema] = None
+        self._writer: Optional[pa.ipc.RecordBatchStreamWriter] = None
+        self._strings_writer: Optional[pa.ipc.RecordBatchStreamWriter] = None
+        self._sink: Optional[pa.OSFile] = None
+        self._strings_sink: Optional[pa.OSFile] = None
+        self._seen_strings = set()
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="event-store", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event: Dict):
+        """Enqueues an event to be written. Never blocks: events are dropped if the writer falls behind."""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def qsize(self) -> int:
+        """Returns the number of events waiting to be written."""
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = None):
+        """Blocks until every event enqueued so far is written."""
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        done.wait(timeout)
+
+    def close(self):
+        """Writes the pending events and closes the open segment."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if isinstance(item, dict):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            self._write(batch)
+            batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                self._close_segment()
+                return
+
+    def _write(self, events: List[Dict]):
+        if not events:
+            return
+        try:
+            self._write_table(events)
+        except Exception as e:
+            if len(events) == 1:
+                self.dropped += 1
+                bt.logging.warning(f"Failed to write an event with error: {e}")
+                return
+            # Write the events one at a time, so that a single bad event does not lose the batch.
+            bt.logging.warning(
+                f"Failed to write {len(events)} events with error: {e}, writing them one at a time"
+            )
+            for event in events:
+                self._write([event])
+
+    def _write_table(self, events: List[Dict]):
+        table, strings = self._encode(events)
+        if self._writer is not None:
+            conformed = self._conform(table)
+            if conformed is None:
+                self._close_segment()
+            else:
+                table = conformed
+        if self._writer is None:
+            self._open_segment(table.schema)
+        self._write_strings(strings)
+        self._writer.write_table(table)
+        self._sink.flush()
+        if self._sink.tell() >= self.max_segment_bytes:
+            self._close_segment()
+
+    def _intern(self, value: str, strings: Dict[int, str]) -> int:
+        key = string_id(value)
+        strings[key] = value
+        return key
+
+    def _encode(self, events: List[Dict]):
+        """Encodes the events into a table, returning it with the strings it references."""
+        names = list(dict.fromkeys(name for event in events for name in event))
+        strings: Dict[int, str] = {}
+        fields, arrays = [], []
+        for name in names:
+            values = [event.get(name) for event in events]
+            present = [value for value in values if value is not None]
+            metadata = None
+            if present and all(isinstance(value, str) for value in present):
+                array = pa.array(
+                    [
+                        None if value is None else self._intern(value, strings)
+                        for value in values
+                    ],
+                    type=pa.int64(),
+                )
+                metadata = {INTERNED_KEY: b"scalar"}
+            elif (
+                present
+                and all(isinstance(value, list) for value in present)
+                and all(isinstance(item, str) for value in present for item in value)
+                and any(present)
+            ):
+                array = pa.array(
+                    [
+                        None
+                        if value is None
+                        else [self._intern(item, strings) for item in value]
+                        for value in values
+                    ],
+                    type=pa.list_(pa.int64()),
+                )
+                metadata = {INTERNED_KEY: b"list"}
+            elif present and all(isinstance(value, dict) for value in present):
+                array = pa.array(values, type=pa.map_(pa.string(), pa.float64()))
+            else:
+                try:
+                    array = pa.array(values)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    # Mixed types, store the json representation.
+                    array = pa.array(
+                        [
+                            None
+                            if value is None
+                            else self._intern(json.dumps(value), strings)
+                            for value in values
+                        ],
+                        type=pa.int64(),
+                    )
+                    metadata = {INTERNED_KEY: b"json"}
+            fields.append(pa.field(name, array.type, metadata=metadata))
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, schema=pa.schema(fields)), strings
+
+    def _conform(self, table: pa.Table) -> Optional[pa.Table]:
+        """Casts the table to the schema of the open segment, or returns None if it does not fit."""
+        schema = self._schema
+        if table.schema.equals(schema, check_metadata=True):
+            return table
+        if not set(table.column_names).issubset(schema.names):
+            return None
+        columns = []
+        for field in schema:
+            if field.name not in table.column_names:
+                columns.append(pa.nulls(len(table), field.type))
+                continue
+            if table.schema.field(field.name).metadata != field.metadata:
+                return None
+            try:
+                columns.append(table.column(field.name).cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                return None
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _open_segment(self, schema: pa.Schema):
+        self.segment = os.path.join(self.path, f"events-{time.time_ns()}")
+        self._schema = schema
+        self._sink = pa.OSFile(self.segment + ".arrow", "wb")
+        self._writer = pa.ipc.new_stream(self._sink, schema, options=self.write_options)
+        self._strings_sink = pa.OSFile(self.segment + ".strings.arrow", "wb")
+        self._strings_writer = pa.ipc.new_stream(
+            self._strings_sink,
+            pa.schema([("id", pa.int64()), ("value", pa.large_string())]),
+            options=self.write_options,
+        )
+        self._seen_strings = set()
+
+    def _write_strings(self, strings: Dict[int, str]):
+        missing = {
+            key: value
+            for key, value in strings.items()
+            if key not in self._seen_strings
+        }
+        if not missing:
+            return
+        self._strings_writer.write_batch(
+            pa.record_batch(
+                [
+                    pa.array(list(missing.keys()), type=pa.int64()),
+                    pa.array(list(missing.values()), type=pa.large_string()),
+                ],
+                names=["id", "value"],
+            )
+        )
+        self._strings_sink.flush()
+        self._seen_strings.update(missing)
+
+    def _close_segment(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._sink.close()
+        self._strings_writer.close()
+        self._strings_sink.close()
+        self._writer = self._sink = None
+        self._strings_writer = self._strings_sink = None
+
+
+def _read_stream(path: str) -> List[pa.RecordBatch]:
+    """Reads the complete record batches of a stream, ignoring a batch truncated by a crash."""
+    batches = []
+    try:
+        with pa.OSFile(path, "rb") as source:
+            reader = pa.ipc.open_stream(source)
+            while True:
+                try:
+                    batches.append(reader.read_next_batch())
+                except StopIteration:
+                    break
+    except (pa.ArrowInvalid, OSError) as e:
+        bt.logging.warning(f"Stopped reading {path} at a truncated batch: {e}")
+    return batches
+
+
+class EventReader:
+    """Reads the events written by an `EventStore`."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Directory of the segments.
+        """
+        self.path = path
+
+    def segments(self) -> List[str]:
+        """Returns the paths of the segments, oldest first."""
+        return sorted(
+            path
+            for path in glob.glob(os.path.join(self.path, "events-*.arrow"))
+            if not path.endswith(".strings.arrow")
+        )
+
+    def strings(self, segment: str) -> Dict[int, str]:
+        """Returns the string table of a segment."""
+        table = {}
+        for batch in _read_stream(segment[: -len(".arrow")] + ".strings.arrow"):
+            table.update(zip(batch.column(0).to_pylist(), batch.column(1).to_pylist()))
+        return table
+
+    def read_table(self, segment: str) -> pa.Table:
+        """Returns the raw table of a segment, with interned columns holding string ids."""
+        batches = _read_stream(segment)
+        if not batches:
+            return None
+        return pa.Table.from_batches(batches)
+
+    def iter_events(self, columns: List[str] = None) -> Iterator[Dict]:
+        """Yields the events of all segments as dictionaries, with strings resolved.
+        Args:
+            columns (List[str], optional): Only read these columns.
+        """
+        for segment in self.segments():
+            yield from self.iter_segment_events(segment, columns)
+
+    def iter_segment_events(
+        self, segment: str, columns: List[str] = None
+    ) -> Iterator[Dict]:
+        """Yields the events of one segment as dictionaries, with strings resolved.
+        Args:
+            segment (str): Path of the segment, see `segments`.
+            columns (List[str], optional): Only read these columns.
+        """
+        table = self.read_table(segment)
+        if table is None:
+            return
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        strings = self.strings(segment)
+        decoded = {}
+        for field in table.schema:
+            values = table.column(field.name).to_pylist()
+            kind = (field.metadata or {}).get(INTERNED_KEY)
+            if kind == b"scalar":
+                values = [None if v is None else strings[v] for v in values]
+            elif kind == b"list":
+                values = [
+                    None if v is None else [strings[i] for i in v] for v in values
+                ]
+            elif kind == b"json":
+                values = [None if v is None else json.loads(strings[v]) for v in values]
+            elif pa.types.is_map(field.type):
+                values = [None if v is None else dict(v) for v in values]
+            decoded[field.name] = values
+        for i in range(table.num_rows):
+            yield {name: values[i] for name, values in decoded.items()}
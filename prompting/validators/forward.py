@@ -20,16 +20,16 @@
 import time
 import torch
 import random
+import asyncio
+import aiohttp
 import bittensor as bt
 import random
 
 from loguru import logger
-from typing import List
-from dataclasses import asdict
-from prompting.validators.event import EventSchema
-from prompting.validators.misc import ttl_get_block
+from typing import List, Tuple
 from prompting.validators.prompts import followup_prompt, answer_prompt, augment_prompt
 from prompting.validators.utils import check_uid_availability
+from prompting.validators.reward.batch import CompletionBatch
 from prompting.validators.tasks import (
     Task,
     create_summarization_task,
@@ -49,6 +49,8 @@ def get_random_uids(self, k: int, exclude: List[int] = None) -> torch.LongTensor
         uids (torch.LongTensor): Randomly sampled available uids.
     Notes:
         If `k` is larger than the number of available `uids`, set `k` to the number of available `uids`.
+        Unless `--neuron.uid_sampler_off` is set, uids are drawn by the reliability-aware `self.uid_sampler`
+        instead of uniformly.
     """
     candidate_uids = []
     avail_uids = []
@@ -71,11 +73,159 @@ def get_random_uids(self, k: int, exclude: List[int] = None) -> torch.LongTensor
             [uid for uid in avail_uids if uid not in candidate_uids],
             k - len(candidate_uids),
         )
-    uids = torch.tensor(random.sample(available_uids, k))
+
+    if self.config.neuron.uid_sampler_off:
+        uids = torch.tensor(random.sample(available_uids, k))
+    else:
+        uids = torch.tensor(self.uid_sampler.sample(available_uids, k))
     return uids
 
 
-async def run_step(self, task: Task, k: int, timeout: float, exclude: list = []):
+async def call_stream(
+    dendrite: "bt.dendrite",
+    target_axon: "bt.AxonInfo",
+    synapse: "bt.StreamingSynapse",
+    timeout: float,
+):
+    """Queries an axon with a streaming synapse through the primitives of the bittensor 6.1.0 dendrite, whose `call`
+    only returns once the whole stream has been consumed.
+
+    Yields the lists of tokens as they arrive, then the filled synapse. Closing the generator early releases the
+    connection.
+    Args:
+        dendrite (bt.dendrite): Dendrite signing the request and holding the http session.
+        target_axon (bt.AxonInfo): Axon to query.
+        synapse (bt.StreamingSynapse): Synapse to send, filled with the response.
+        timeout (float): Query timeout.
+    """
+    start_time = time.time()
+    request_name = synapse.__class__.__name__
+    endpoint = (
+        f"0.0.0.0:{str(target_axon.port)}"
+        if target_axon.ip == str(dendrite.external_ip)
+        else f"{target_axon.ip}:{str(target_axon.port)}"
+    )
+    url = f"http://{endpoint}/{request_name}"
+    synapse = dendrite.preprocess_synapse_for_request(target_axon, synapse, timeout)
+
+    try:
+        async with (await dendrite.session).post(
+            url,
+            headers=synapse.to_headers(),
+            json=synapse.dict(),
+            timeout=timeout,
+        ) as response:
+            async for tokens in synapse.process_streaming_response(response):
+                yield tokens
+            json_response = synapse.extract_response_json(response)
+            dendrite.process_server_response(response, json_response, synapse)
+        synapse.dendrite.process_time = str(time.time() - start_time)
+    except aiohttp.ClientConnectorError:
+        synapse.dendrite.status_code = "503"
+        synapse.dendrite.status_message = f"Service at {synapse.axon.ip}:{str(synapse.axon.port)}/{request_name} unavailable."
+    except asyncio.TimeoutError:
+        synapse.dendrite.status_code = "408"
+        synapse.dendrite.status_message = f"Timedout after {timeout} seconds."
+    except Exception as e:
+        synapse.dendrite.status_code = "422"
+        synapse.dendrite.status_message = (
+            f"Failed to parse response object with error: {str(e)}"
+        )
+    yield synapse
+
+
+async def stream_response(
+    self,
+    axon: "bt.AxonInfo",
+    synapse: "prompting.protocol.StreamPrompting",
+    timeout: float,
+    token_budget: int = 0,
+    byte_budget: int = 0,
+) -> Tuple[bt.Synapse, dict]:
+    """Queries a single axon with a streaming synapse, consuming the tokens as they arrive.
+    Args:
+        axon (bt.AxonInfo): Axon to query.
+        synapse (prompting.protocol.StreamPrompting): Synapse to send, copied before the query.
+        timeout (float): Query timeout.
+        token_budget (int): Maximum number of tokens to consume before cutting off the stream, 0 for no limit.
+        byte_budget (int): Maximum number of utf-8 bytes to consume before cutting off the stream, 0 for no limit.
+    Returns:
+        response (bt.Synapse): The filled synapse, holding the (possibly truncated) completion.
+        stats (dict): Time to first token in seconds and tokens per second of the stream.
+    """
+    # A deep copy, so that the responses of the uids do not share their terminal infos.
+    synapse = synapse.copy(deep=True)
+    tokens: List[str] = []
+    num_bytes = 0
+    truncated = False
+    first_token_time = None
+
+    start_time = time.time()
+    if hasattr(self.dendrite, "call_stream"):
+        # Dendrites of later bittensor versions, and the mock dendrite, stream themselves.
+        stream = self.dendrite.call_stream(
+            target_axon=axon, synapse=synapse, timeout=timeout, deserialize=False
+        )
+    else:
+        stream = call_stream(self.dendrite, axon, synapse, timeout)
+    try:
+        async for chunk in stream:
+            # The stream yields lists of tokens and finally the filled synapse.
+            if not isinstance(chunk, list):
+                synapse = chunk
+                break
+
+            for token in chunk:
+                if not token:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+
+                token_bytes = len(token.encode("utf-8"))
+                if (token_budget and len(tokens) >= token_budget) or (
+                    byte_budget and num_bytes + token_bytes > byte_budget
+                ):
+                    truncated = True
+                    break
+
+                tokens.append(token)
+                num_bytes += token_bytes
+
+            if truncated:
+                break
+    finally:
+        if truncated:
+            try:
+                # Closing the stream releases the connection; the dendrite yields the synapse
+                # from its `finally` block which makes `aclose` raise a RuntimeError.
+                await stream.aclose()
+            except RuntimeError:
+                pass
+
+    elapsed_time = time.time() - start_time
+    if truncated:
+        synapse.completion = "".join(tokens)
+        synapse.dendrite.status_code = 200
+        synapse.dendrite.status_message = "Stream cut off at budget"
+        synapse.dendrite.process_time = str(elapsed_time)
+
+    streaming_time = elapsed_time - (first_token_time or 0)
+    stats = {
+        "first_token_time": first_token_time or 0,
+        "tokens_per_second": len(tokens) / streaming_time if streaming_time > 0 else 0,
+    }
+    return synapse, stats
+
+
+async def run_step(
+    self,
+    task: Task,
+    k: int,
+    timeout: float,
+    exclude: list = [],
+    token_budget: int = 0,
+    byte_budget: int = 0,
+):
     task_name = task.task_name
     prompt = task.compose_prompt()
 
@@ -83,23 +233,52 @@ async def run_step(self, task: Task, k: int, timeout: float, exclude: list = [])
 
     # Record event start time.
     event = {"name": task_name, "task_type": task.task_type}
+    timings = {}
     start_time = time.time()
     # Get the list of uids to query for this step.
-    uids = get_random_uids(self, k=k, exclude=exclude).to(self.device)
-    axons = [self.metagraph.axons[uid] for uid in uids]
-    synapse = prompting.protocol.Prompting(roles=["user"], messages=[prompt])
+    with self.timer.stage("sample_uids", timings):
+        uids = get_random_uids(self, k=k, exclude=exclude).to(self.device)
+        axons = [self.metagraph.axons[uid] for uid in uids]
 
     # Make calls to the network with the prompt.
-    responses: List[bt.Synapse] = await self.dendrite(
-        axons=axons,
-        synapse=synapse,
-        timeout=timeout,
-    )
+    with self.timer.stage("query", timings):
+        if self.config.neuron.streaming:
+            synapse = prompting.protocol.StreamPrompting(
+                roles=["user"], messages=[prompt]
+            )
+            streams = await asyncio.gather(
+                *[
+                    stream_response(
+                        self,
+                        axon=axon,
+                        synapse=synapse,
+                        timeout=timeout,
+                        token_budget=token_budget,
+                        byte_budget=byte_budget,
+                    )
+                    for axon in axons
+                ]
+            )
+            responses: List[bt.Synapse] = [response for response, _ in streams]
+            event["completion_first_token_times"] = [
+                stats["first_token_time"] for _, stats in streams
+            ]
+            event["completion_tokens_per_second"] = [
+                stats["tokens_per_second"] for _, stats in streams
+            ]
+        else:
+            synapse = prompting.protocol.Prompting(roles=["user"], messages=[prompt])
+            responses: List[bt.Synapse] = await self.dendrite(
+                axons=axons,
+                synapse=synapse,
+                timeout=timeout,
+            )
 
     # Update blacklist with completions so that n-gram filtering can be applied
-    self.blacklist.add(
-        [response.completion for response in responses if response.completion]
-    )
+    with self.timer.stage("blacklist_add", timings):
+        self.blacklist.add(
+            [response.completion for response in responses if response.completion]
+        )
 
     # Restrict the format of acceptable followup completions.
     for response in responses:
@@ -118,34 +297,44 @@ async def run_step(self, task: Task, k: int, timeout: float, exclude: list = [])
                 completion = completion.split(".")[-1].split(".")[-1]
                 response.completion = " ".join(completion.split(" ")[-max_words:])
 
+    # Completions shared by the reward models, each tokenizer tokenizes them once.
+    batch = CompletionBatch.from_responses(task.base_text, responses)
+
     # Compute the rewards for the responses given the prompt.
     rewards: torch.FloatTensor = torch.zeros(len(responses), dtype=torch.float32).to(
         self.device
     )
     for weight_i, reward_fn_i in zip(self.reward_weights, self.reward_functions):
-        reward_i_normalized, reward_event = reward_fn_i.apply(
-            task.base_text, responses, task_name
-        )
+        with self.timer.stage(
+            f"reward/{reward_fn_i.name}", timings
+        ), self.residency.use(reward_fn_i):
+            reward_i_normalized, reward_event = reward_fn_i.apply(
+                task.base_text, responses, task_name, batch=batch
+            )
         rewards += weight_i * reward_i_normalized.to(self.device)
         if not self.config.neuron.disable_log_rewards:
             event = {**event, **reward_event}
         bt.logging.trace(str(reward_fn_i.name), reward_i_normalized.tolist())
 
     for masking_fn_i in self.masking_functions:
-        mask_i_normalized, reward_event = masking_fn_i.apply(
-            task.base_text, responses, task_name
-        )
+        with self.timer.stage(f"mask/{masking_fn_i.name}", timings), self.residency.use(
+            masking_fn_i
+        ):
+            mask_i_normalized, reward_event = masking_fn_i.apply(
+                task.base_text, responses, task_name, batch=batch
+            )
         rewards *= mask_i_normalized.to(self.device)  # includes diversity
         if not self.config.neuron.disable_log_rewards:
             event = {**event, **reward_event}
         bt.logging.trace(str(masking_fn_i.name), mask_i_normalized.tolist())
 
     for penalty_fn_i in self.penalty_functions:
-        (
-            raw_penalty_i,
-            adjusted_penalty_i,
-            applied_penalty_i,
-        ) = penalty_fn_i.apply_penalties(responses, task)
+        with self.timer.stage(f"penalty/{penalty_fn_i.name}", timings):
+            (
+                raw_penalty_i,
+                adjusted_penalty_i,
+                applied_penalty_i,
+            ) = penalty_fn_i.apply_penalties(responses, task)
         rewards *= applied_penalty_i.to(self.device)
         if not self.config.neuron.disable_log_rewards:
             event[penalty_fn_i.name + "_raw"] = raw_penalty_i.tolist()
@@ -154,10 +343,18 @@ async def run_step(self, task: Task, k: int, timeout: float, exclude: list = [])
         bt.logging.trace(str(penalty_fn_i.name), applied_penalty_i.tolist())
 
     # Train the gating model based on the predicted scores and the actual rewards.
-    gating_scores: torch.FloatTensor = self.gating_model(prompt).to(self.device)
-    gating_loss: torch.FloatTensor = self.gating_model.backward(
-        scores=gating_scores[uids], rewards=rewards
-    )
+    with self.timer.stage("gating_forward", timings):
+        gating_scores: torch.FloatTensor = self.gating_model(prompt).to(self.device)
+    with self.timer.stage("gating_backward", timings):
+        if self.gating_trainer is not None:
+            # The background trainer updates the gating model from its replay buffer.
+            gating_loss: torch.FloatTensor = self.gating_trainer.push(
+                self.gating_model.features(prompt), uids, rewards
+            )
+        else:
+            gating_loss: torch.FloatTensor = self.gating_model.backward(
+                scores=gating_scores[uids], rewards=rewards
+            )
 
     # Find the best completion given the rewards vector.
     completions: List[str] = [comp.completion for comp in responses]
@@ -176,23 +373,44 @@ async def run_step(self, task: Task, k: int, timeout: float, exclude: list = [])
         for comp in responses
     ]
 
-    # Compute forward pass rewards, assumes followup_uids and answer_uids are mutually exclusive.
-    # shape: [ metagraph.n ]
-    scattered_rewards: torch.FloatTensor = self.moving_averaged_scores.scatter(
-        0, uids, rewards
-    ).to(self.device)
+    with self.timer.stage("update_scores", timings):
+        # Update the reliability statistics used to sample uids.
+        self.uid_sampler.update(
+            uids.tolist(), completion_status_codes, completion_times, timeout
+        )
 
-    # Update moving_averaged_scores with rewards produced by this step.
-    # shape: [ metagraph.n ]
-    alpha: float = self.config.neuron.moving_average_alpha
-    self.moving_averaged_scores: torch.FloatTensor = alpha * scattered_rewards + (
-        1 - alpha
-    ) * self.moving_averaged_scores.to(self.device)
+        # Update the moving averaged scores and statistics of the queried uids only.
+        self.scoreboard.update(
+            uids,
+            rewards,
+            success=torch.tensor(
+                [code == "200" for code in completion_status_codes], dtype=torch.bool
+            ),
+            latency=torch.tensor(completion_times, dtype=torch.float32),
+        )
+
+    # Attach the stage timings of this step and the rolling percentiles of all steps.
+    # Note: the logging stage is recorded after the event is logged, so it only shows up in the percentiles.
+    if self.config.neuron.stage_timing:
+        event["stage_times"] = timings
+        event["stage_time_percentiles"] = self.timer.percentiles()
+
+    # Export the step latency and response status codes.
+    self.metrics.histogram(
+        "validator_step_seconds", "Wall time of a step.", ["task"]
+    ).observe(time.time() - start_time, task=task_name)
+    responses_total = self.metrics.counter(
+        "validator_responses_total",
+        "Number of responses by dendrite status code.",
+        ["status_code"],
+    )
+    for status_code in completion_status_codes:
+        responses_total.inc(status_code=status_code)
 
     # Log the step event.
     event.update(
         {
-            "block": ttl_get_block(self),
+            "block": self.block_clock.block,
             "step_length": time.time() - start_time,
             "prompt": prompt,
             "uids": uids.tolist(),
@@ -206,24 +424,30 @@ async def run_step(self, task: Task, k: int, timeout: float, exclude: list = [])
         }
     )
 
-    bt.logging.debug("event:", str(event))
-    if not self.config.neuron.dont_save_events:
-        logger.log("EVENTS", "events", **event)
+    with self.timer.stage("logging"):
+        bt.logging.debug("event:", str(event))
+        if not self.config.neuron.dont_save_events:
+            if self.config.neuron.events_backend == "arrow":
+                self.event_store.log(event)
+            else:
+                logger.log("EVENTS", "events", **event)
 
-    # Log the event to wandb.
-    if not self.config.wandb.off:
-        wandb_event = EventSchema.from_dict(
-            event, self.config.neuron.disable_log_rewards
-        )
-        self.wandb.log(asdict(wandb_event))
+        # Log the event to wandb from the background logger.
+        if not self.config.wandb.off:
+            self.wandb_logger.log_event(event, self.config.neuron.disable_log_rewards)
 
     # Return the event.
     return event
 
 
 async def questions_and_answers_around_summary_flow(self):
-    # Obtain a unique context from the dataset.
-    data = next(self.dataset)["text"]
+    # Obtain a unique context from the dataset, without blocking the event loop on a slow read.
+    # A StopIteration can not be raised through the future, so an exhausted dataset returns None.
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, next, self.dataset, None)
+    if data is None:
+        raise RuntimeError("The dataset is exhausted, no context is left to query")
+    data = data["text"]
 
     random_cutoff = random.randint(15, 30)
     # Truncate context to a limited set of sentences.
@@ -238,10 +462,13 @@ async def questions_and_answers_around_summary_flow(self):
         task=summary_task,
         k=self.config.neuron.followup_sample_size,
         timeout=self.config.neuron.followup_timeout,
+        token_budget=self.config.neuron.followup_stream_token_budget,
+        byte_budget=self.config.neuron.followup_stream_byte_budget,
     )
 
     best_summary = summarization_event["best"]
-    exclude = summarization_event["uids"]
+    # Copy the uids, the event may still be waiting to be written by the event store.
+    exclude = list(summarization_event["uids"])
     best_summary_context = "### SUMMARY CONTEXT:\n" + best_summary
 
     for k in range(self.config.neuron.num_followup_steps):
@@ -253,6 +480,8 @@ async def questions_and_answers_around_summary_flow(self):
             k=self.config.neuron.followup_sample_size,
             timeout=self.config.neuron.followup_timeout,
             exclude=exclude,
+            token_budget=self.config.neuron.followup_stream_token_budget,
+            byte_budget=self.config.neuron.followup_stream_byte_budget,
         )
         exclude += qg_event["uids"]
 
@@ -269,11 +498,20 @@ async def questions_and_answers_around_summary_flow(self):
             k=self.config.neuron.answer_sample_size,
             timeout=self.config.neuron.answer_timeout,
             exclude=exclude,
+            token_budget=self.config.neuron.answer_stream_token_budget,
+            byte_budget=self.config.neuron.answer_stream_byte_budget,
         )
 
         exclude += qa_event["uids"]
 
 
 async def forward(self):
-    # Definition of flow to be executed at forward step
-    await questions_and_answers_around_summary_flow(self)
+    forwards_in_flight = self.metrics.gauge(
+        "validator_forwards_in_flight", "Number of concurrent forwards running."
+    )
+    forwards_in_flight.inc()
+    try:
+        # Definition of flow to be executed at forward step
+        await questions_and_answers_around_summary_flow(self)
+    finally:
+        forwards_in_flight.dec()
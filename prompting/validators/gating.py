@@ -16,12 +16,15 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import argparse
 import torch
+import hashlib
+import argparse
 import bittensor as bt
-from transformers import AutoModel, AutoTokenizer
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List
 from prompting.validators.utils import resync_linear_layer
+from prompting.validators.bundle import resolve_model_path
 
 
 class BaseGatingModel(torch.nn.Module, ABC):
@@ -29,9 +32,13 @@ class BaseGatingModel(torch.nn.Module, ABC):
     This class is an abstract base class for the gating model. It defines the interface for the gating model.
     """
 
-    def __init__(self):
+    def __init__(self, feature_cache_size: int = 0):
         super().__init__()
         self.linear = torch.nn.Linear(768, 1024)
+        self.feature_cache_size = feature_cache_size
+        self.feature_cache: "OrderedDict[str, torch.FloatTensor]" = OrderedDict()
+        self.feature_cache_hits = 0
+        self.feature_cache_misses = 0
 
     @classmethod
     def add_args(cls, parser: argparse.ArgumentParser):
@@ -43,6 +50,10 @@ class BaseGatingModel(torch.nn.Module, ABC):
         - `--gating.num_uids`: Number of uids to gate on. (default: 4096)
         - `--gating.learning_rate`: Learning rate for the gating model optimizer. (default: 0.01)
         - `--gating.momentum`: Momentum for the gating model optimizer. (default: 0.9)
+        - `--gating.feature_cache_size`: Number of encoded prompts kept in the feature cache. (default: 256)
+        - `--gating.train_interval`: Seconds between minibatch updates of the background trainer. (default: 5.0)
+        - `--gating.replay_buffer_size`: Number of recent steps the background trainer samples from. (default: 1024)
+        - `--gating.batch_size`: Number of steps per minibatch update of the background trainer. (default: 32)
         """
         parser.add_argument(
             "--gating.model_name",
@@ -67,11 +78,64 @@ class BaseGatingModel(torch.nn.Module, ABC):
             default=0.9,
             help="Momentum for the gating model",
         )
+        parser.add_argument(
+            "--gating.feature_cache_size",
+            type=int,
+            default=256,
+            help="Number of prompts whose encoder features are cached, 0 disables the cache",
+        )
+        parser.add_argument(
+            "--gating.train_interval",
+            type=float,
+            default=5.0,
+            help="Seconds between minibatch updates of the gating model by the background trainer, 0 trains synchronously on each step",
+        )
+        parser.add_argument(
+            "--gating.replay_buffer_size",
+            type=int,
+            default=1024,
+            help="Number of recent steps (prompt features, uids, rewards) the gating model is trained on",
+        )
+        parser.add_argument(
+            "--gating.batch_size",
+            type=int,
+            default=32,
+            help="Number of steps per minibatch update of the gating model",
+        )
 
     @abstractmethod
     def forward(self, message: str) -> "torch.FloatTensor":
         """Forward pass through the gating model"""
 
+    def encode(self, message: str) -> "torch.FloatTensor":
+        """Encodes the message into the features the linear layer is applied to"""
+        raise NotImplementedError
+
+    def encode_batch(self, messages: List[str]) -> "torch.FloatTensor":
+        """Encodes each message like `encode`, returning a tensor of shape (len(messages), hidden_size)"""
+        return torch.stack([self.encode(message) for message in messages])
+
+    def features(self, message: str) -> "torch.FloatTensor":
+        """Returns the encoded features of the message, memoized per message hash in a bounded LRU cache.
+        The encoder is frozen, only the linear layer is trained, so the features of a message never change.
+        """
+        if self.feature_cache_size <= 0:
+            return self.encode(message)
+
+        key = hashlib.blake2b(message.encode("utf-8"), digest_size=16).hexdigest()
+        features = self.feature_cache.get(key)
+        if features is not None:
+            self.feature_cache_hits += 1
+            self.feature_cache.move_to_end(key)
+            return features
+
+        self.feature_cache_misses += 1
+        features = self.encode(message).detach()
+        self.feature_cache[key] = features
+        if len(self.feature_cache) > self.feature_cache_size:
+            self.feature_cache.popitem(last=False)
+        return features
+
     @abstractmethod
     def backward(self, scores: "torch.FloatTensor", rewards: "torch.FloatTensor"):
         """Backward pass through the gating model"""
@@ -132,9 +196,9 @@ class GatingModel(BaseGatingModel):
                         for the gating model. If `None`, the default model name specified in the configuration is used.
         - `num_uids`: Number of uids to gate on. If `None`, the default number specified in the configuration is used.
         """
-        super().__init__()
         if config is None:
             config = GatingModel.config()
+        super().__init__(feature_cache_size=config.gating.get("feature_cache_size", 0))
         if model_name is not None:
             config.gating.model_name = model_name
         config.gating.num_uids = (
@@ -143,9 +207,15 @@ class GatingModel(BaseGatingModel):
         self.config = config
         self.num_uids = config.gating.num_uids
         self.device = torch.device(self.config.neuron.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.config.gating.model_name)
+        from transformers import AutoModel, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            resolve_model_path(self.config.gating.model_name)
+        )
         self.tokenizer.pad_token = self.tokenizer.eos_token
-        self.model = AutoModel.from_pretrained(self.config.gating.model_name)
+        self.model = AutoModel.from_pretrained(
+            resolve_model_path(self.config.gating.model_name)
+        )
         self.linear = torch.nn.Linear(
             self.model.config.hidden_size, config.gating.num_uids
         )
@@ -168,33 +238,64 @@ class GatingModel(BaseGatingModel):
         loss = torch.nn.functional.mse_loss(
             normalized_scores, normalized_rewards.detach()
         )
+        self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         return loss
 
-    def forward(self, message: str) -> "torch.FloatTensor":
-        """Runs a forward pass through the model.
+    def encode(self, message: str) -> "torch.FloatTensor":
+        """Encodes the message as the hidden state of the last token of its first chunk of `model_max_length` tokens.
         Args:
             message (:obj:`str`):
                 text message to be encoded.
         Returns:
-            scores (:obj:`torch.FloatTensor` of shape :obj:`(network_size)`):
-                Scores for each uids as output by the gating model.
+            hidden_states (:obj:`torch.FloatTensor` of shape :obj:`(hidden_size)`):
+                Features of the message.
         """
+        # Only the first chunk is read, so the overflowing chunks are not tokenized nor encoded.
         encoded_input = self.tokenizer(
             message,
             truncation=True,
-            padding=True,
-            return_overflowing_tokens=True,
             return_tensors="pt",
         ).to(self.device)
 
-        # Pop the overflow mapping from the input to maintain the expected { input_ids, mask } format of the model
-        _ = encoded_input.pop("overflow_to_sample_mapping")
+        with torch.no_grad():
+            return self.model(**encoded_input).last_hidden_state[0, -1, :]
+
+    def encode_batch(self, messages: List[str]) -> "torch.FloatTensor":
+        """Encodes the messages like `encode` in one padded forward pass.
+        Args:
+            messages (:obj:`List[str]`):
+                text messages to be encoded.
+        Returns:
+            hidden_states (:obj:`torch.FloatTensor` of shape :obj:`(len(messages), hidden_size)`):
+                Features of each message.
+        """
+        encoded_input = self.tokenizer(
+            messages,
+            truncation=True,
+            padding=True,
+            return_tensors="pt",
+        ).to(self.device)
 
         with torch.no_grad():
-            hidden_states = self.model(**encoded_input).last_hidden_state[0, -1, :]
-        return self.linear(hidden_states)
+            hidden_states = self.model(**encoded_input).last_hidden_state
+
+        # Read the hidden state of the last token of each message, ignoring the padding.
+        attention_mask = encoded_input["attention_mask"]
+        last = attention_mask.shape[1] - 1 - attention_mask.flip(1).argmax(dim=1)
+        return hidden_states[torch.arange(len(messages), device=self.device), last]
+
+    def forward(self, message: str) -> "torch.FloatTensor":
+        """Runs a forward pass through the model.
+        Args:
+            message (:obj:`str`):
+                text message to be encoded.
+        Returns:
+            scores (:obj:`torch.FloatTensor` of shape :obj:`(network_size)`):
+                Scores for each uids as output by the gating model.
+        """
+        return self.linear(self.features(message))
 
     def resync(
         self,
@@ -229,9 +330,9 @@ class SentenceEmbedGatingModel(BaseGatingModel):
                         gating model. If `None`, the default model name specified in the configuration is used.
         - `num_uids`: Number of uids to gate on. If `None`, the default number specified in the configuration is used.
         """
-        super().__init__()
         if config is None:
             config = SentenceEmbedGatingModel.config()
+        super().__init__(feature_cache_size=config.gating.get("feature_cache_size", 0))
         if model_name is not None:
             config.gating.model_name = model_name
         config.gating.num_uids = (
@@ -240,8 +341,14 @@ class SentenceEmbedGatingModel(BaseGatingModel):
         self.config = config
         self.num_uids = config.gating.num_uids
         self.device = torch.device(self.config.neuron.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.config.gating.model_name)
-        self.transformer = AutoModel.from_pretrained(self.config.gating.model_name)
+        from transformers import AutoModel, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            resolve_model_path(self.config.gating.model_name)
+        )
+        self.transformer = AutoModel.from_pretrained(
+            resolve_model_path(self.config.gating.model_name)
+        )
         self.linear = torch.nn.Linear(
             self.transformer.config.hidden_size, config.gating.num_uids
         )
@@ -272,14 +379,14 @@ class SentenceEmbedGatingModel(BaseGatingModel):
             input_mask_expanded.sum(1), min=1e-9
         )
 
-    def forward(self, message: str) -> "torch.FloatTensor":
-        """Runs a forward pass through the model.
+    def encode(self, message: str) -> "torch.FloatTensor":
+        """Encodes the message as the mean of the sentence embeddings of its chunks.
         Args:
             message (:obj:`str`):
                 text message to be encoded.
         Returns:
-            scores (:obj:`torch.FloatTensor` of shape :obj:`(network_size)`):
-                Scores for each uids as output by the gating model.
+            batch_representation (:obj:`torch.FloatTensor` of shape :obj:`(hidden_size)`):
+                Features of the message.
         """
         encoded_input = self.tokenizer(
             message,
@@ -301,11 +408,54 @@ class SentenceEmbedGatingModel(BaseGatingModel):
         sentence_embeddings = torch.nn.functional.normalize(
             sentence_embeddings, p=2, dim=1
         )
-        batch_representation = torch.mean(sentence_embeddings, dim=0)
+        return torch.mean(sentence_embeddings, dim=0)
+
+    def encode_batch(self, messages: List[str]) -> "torch.FloatTensor":
+        """Encodes the messages like `encode`, running the chunks of all messages in one padded forward pass.
+        Args:
+            messages (:obj:`List[str]`):
+                text messages to be encoded.
+        Returns:
+            batch_representation (:obj:`torch.FloatTensor` of shape :obj:`(len(messages), hidden_size)`):
+                Features of each message.
+        """
+        encoded_input = self.tokenizer(
+            messages,
+            padding=True,
+            truncation=True,
+            return_overflowing_tokens=True,
+            return_tensors="pt",
+        ).to(self.device)
+        chunk_to_message = encoded_input.pop("overflow_to_sample_mapping")
+
+        with torch.no_grad():
+            embeddings = self.transformer(**encoded_input)
+
+        sentence_embeddings = self.mean_pooling(
+            embeddings, encoded_input["attention_mask"]
+        )
+        sentence_embeddings = torch.nn.functional.normalize(
+            sentence_embeddings, p=2, dim=1
+        )
 
-        scores = self.linear(batch_representation)
+        # Average the chunk embeddings of each message.
+        batch_representation = sentence_embeddings.new_zeros(
+            (len(messages), sentence_embeddings.shape[1])
+        )
+        batch_representation.index_add_(0, chunk_to_message, sentence_embeddings)
+        counts = torch.bincount(chunk_to_message, minlength=len(messages))
+        return batch_representation / counts.unsqueeze(1).to(batch_representation)
 
-        return scores
+    def forward(self, message: str) -> "torch.FloatTensor":
+        """Runs a forward pass through the model.
+        Args:
+            message (:obj:`str`):
+                text message to be encoded.
+        Returns:
+            scores (:obj:`torch.FloatTensor` of shape :obj:`(network_size)`):
+                Scores for each uids as output by the gating model.
+        """
+        return self.linear(self.features(message))
 
     def backward(self, scores: torch.FloatTensor, rewards: torch.FloatTensor):
         """Runs a backward pass through the model.
@@ -320,6 +470,7 @@ class SentenceEmbedGatingModel(BaseGatingModel):
         loss = torch.nn.functional.mse_loss(
             normalized_scores, normalized_rewards.detach()
         )
+        self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         return loss
@@ -0,0 +1,288 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Offline trainer of the gating model head over the recorded step events.
+#
+# Example:
+#   python -m prompting.validators.gating_offline --output ~/.bittensor/miners/default/default/netuid1/core_validator \
+#       --log "~/.bittensor/miners/default/default/netuid1/core_validator/completions*.log" --gating.num_uids 1024
+import os
+import glob
+import json
+import math
+import random
+import argparse
+import torch
+import bittensor as bt
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+from prompting.validators.gating import (
+    BaseGatingModel,
+    GatingModel,
+    SentenceEmbedGatingModel,
+)
+from prompting.validators.gating_trainer import gating_loss
+from prompting.validators.utils import gating_linear_layer_path
+
+# (prompt, queried uids, rewards) of one step.
+Step = Tuple[str, List[int], List[float]]
+
+
+def _step(event: dict) -> Step:
+    """Returns the training step of an event, or None if the event can not be trained on."""
+    prompt, uids, rewards = (
+        event.get("prompt"),
+        event.get("uids"),
+        event.get("rewards"),
+    )
+    if not prompt or not uids or not rewards or len(uids) != len(rewards):
+        return None
+    if any(reward is None or not math.isfinite(reward) for reward in rewards):
+        return None
+    return prompt, [int(uid) for uid in uids], [float(reward) for reward in rewards]
+
+
+def iter_log_events(path: str) -> Iterator[dict]:
+    """Yields the events of a `completions.log` file, written by loguru as json lines with the event in `record.extra`."""
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)["record"]["extra"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+
+def read_log_steps(path: str) -> List[Step]:
+    """Returns the training steps of a `completions.log` file."""
+    return [step for step in map(_step, iter_log_events(path)) if step is not None]
+
+
+def read_segment_steps(segment: str) -> List[Step]:
+    """Returns the training steps of an event store segment."""
+    from prompting.validators.event_store import EventReader
+
+    reader = EventReader(os.path.dirname(segment))
+    events = reader.iter_segment_events(segment, columns=["prompt", "uids", "rewards"])
+    return [step for step in map(_step, events) if step is not None]
+
+
+def load_steps(
+    log_paths: List[str] = (), events_path: str = None, workers: int = None
+) -> List[Step]:
+    """Reads the training steps of the log files and of the event store segments in parallel, one file per process."""
+    jobs = [(read_log_steps, path) for path in log_paths]
+    if events_path is not None:
+        from prompting.validators.event_store import EventReader
+
+        jobs += [
+            (read_segment_steps, segment)
+            for segment in EventReader(events_path).segments()
+        ]
+
+    steps = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(read, path) for read, path in jobs]
+        for (_, path), future in zip(jobs, futures):
+            file_steps = future.result()
+            bt.logging.info(f"Read {len(file_steps)} steps from {path}")
+            steps.extend(file_steps)
+    return steps
+
+
+def encode_prompts(
+    gating_model: BaseGatingModel, prompts: List[str], batch_size: int = 16
+) -> torch.FloatTensor:
+    """Encodes the prompts with the gating encoder, in batches of prompts of similar length."""
+    order = sorted(range(len(prompts)), key=lambda idx: len(prompts[idx]))
+    features = None
+    for start in range(0, len(order), batch_size):
+        indices = order[start : start + batch_size]
+        batch_features = gating_model.encode_batch([prompts[idx] for idx in indices])
+        if features is None:
+            features = batch_features.new_empty((len(prompts), batch_features.shape[1]))
+        features[indices] = batch_features
+    return features
+
+
+def fit_linear(
+    linear: torch.nn.Linear,
+    features: torch.FloatTensor,
+    steps: List[Tuple[int, torch.LongTensor, torch.FloatTensor]],
+    epochs: int = 1,
+    batch_size: int = 32,
+    learning_rate: float = 0.01,
+    momentum: float = 0.9,
+) -> List[float]:
+    """Fits the linear head with minibatch SGD on the loss of `GatingModel.backward`.
+    Args:
+        linear (torch.nn.Linear): Head of the gating model, trained in place.
+        features (torch.FloatTensor): Encoded prompts.
+        steps (List[Tuple[int, torch.LongTensor, torch.FloatTensor]]): Index of the prompt features, queried uids
+            and rewards of each step.
+    Returns:
+        losses (List[float]): Mean loss of each epoch.
+    """
+    optimizer = torch.optim.SGD(
+        linear.parameters(), lr=learning_rate, momentum=momentum
+    )
+    losses = []
+    for epoch in range(epochs):
+        random.shuffle(steps)
+        total = 0.0
+        for start in range(0, len(steps), batch_size):
+            batch = steps[start : start + batch_size]
+            optimizer.zero_grad()
+            scores = linear(features[[index for index, _, _ in batch]])
+            loss = torch.stack(
+                [
+                    gating_loss(scores[i][uids], rewards)
+                    for i, (_, uids, rewards) in enumerate(batch)
+                ]
+            ).mean()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        losses.append(total / max(len(steps), 1))
+        bt.logging.info(f"Epoch {epoch}: loss {losses[-1]:.6f}")
+    return losses
+
+
+def train(
+    gating_model: BaseGatingModel,
+    steps: List[Step],
+    epochs: int = 1,
+    batch_size: int = 32,
+    encode_batch_size: int = 16,
+    learning_rate: float = 0.01,
+    momentum: float = 0.9,
+) -> List[float]:
+    """Encodes the distinct prompts of the steps and fits the head of the gating model on them."""
+    num_uids = gating_model.linear.out_features
+    steps = [step for step in steps if max(step[1]) < num_uids]
+    prompts = sorted({prompt for prompt, _, _ in steps})
+    prompt_index = {prompt: index for index, prompt in enumerate(prompts)}
+    bt.logging.info(f"Encoding {len(prompts)} distinct prompts of {len(steps)} steps")
+    features = encode_prompts(gating_model, prompts, encode_batch_size)
+
+    device = features.device
+    samples = [
+        (
+            prompt_index[prompt],
+            torch.tensor(uids, device=device),
+            torch.tensor(rewards, device=device),
+        )
+        for prompt, uids, rewards in steps
+    ]
+    return fit_linear(
+        gating_model.linear,
+        features,
+        samples,
+        epochs=epochs,
+        batch_size=batch_size,
+        learning_rate=learning_rate,
+        momentum=momentum,
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Trains the gating model head on recorded step events, written where save_state writes it."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=False,
+        help="Directory the head is saved to, the full path of the validator.",
+    )
+    parser.add_argument(
+        "--log", type=str, nargs="*", default=[], help="completions.log files or globs."
+    )
+    parser.add_argument(
+        "--events", type=str, default=None, help="Directory of an arrow event store."
+    )
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--encode_batch_size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Continue training the head already saved in the output directory.",
+    )
+    parser.add_argument(
+        "--neuron.device",
+        type=str,
+        default="cuda" if torch.cuda.is_available() else "cpu",
+    )
+    parser.add_argument(
+        "--neuron.use_custom_gating_model",
+        action="store_true",
+        help="Train the head of the sentence embedding gating model.",
+    )
+    parser.add_argument("--neuron.model_bundle", type=str, default=None)
+    BaseGatingModel.add_args(parser)
+    config = bt.config(parser, args)
+    if not config.output:
+        parser.error("--output is required")
+
+    log_paths = sorted(
+        {
+            path
+            for pattern in config.log
+            for path in glob.glob(os.path.expanduser(pattern))
+        }
+    )
+    steps = load_steps(log_paths, config.events, workers=config.workers)
+    if not steps:
+        raise SystemExit("No steps with a prompt, uids and rewards were found.")
+    if not config.gating.num_uids:
+        config.gating.num_uids = max(max(uids) for _, uids, _ in steps) + 1
+
+    if config.neuron.model_bundle:
+        from prompting.validators.bundle import use_bundle
+
+        use_bundle(config.neuron.model_bundle)
+    model_class = (
+        SentenceEmbedGatingModel
+        if config.neuron.use_custom_gating_model
+        else GatingModel
+    )
+    gating_model = model_class(metagraph=None, config=config).to(config.neuron.device)
+
+    path = gating_linear_layer_path(config.output, config.gating.model_name)
+    if config.warm and os.path.exists(path):
+        gating_model.linear.load_state_dict(
+            torch.load(path, map_location=config.neuron.device)
+        )
+
+    train(
+        gating_model,
+        steps,
+        epochs=config.epochs,
+        batch_size=config.gating.batch_size,
+        encode_batch_size=config.encode_batch_size,
+        learning_rate=config.gating.learning_rate,
+        momentum=config.gating.momentum,
+    )
+
+    os.makedirs(config.output, exist_ok=True)
+    torch.save(gating_model.linear.state_dict(), path)
+    print(f"Saved the gating model head trained on {len(steps)} steps to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import copy
+import time
+import random
+import torch
+import threading
+import bittensor as bt
+from collections import deque
+from typing import List, Tuple
+from prompting.validators.utils import resync_linear_layer
+
+Sample = Tuple[torch.FloatTensor, torch.LongTensor, torch.FloatTensor]
+
+
+def gating_loss(
+    scores: torch.FloatTensor, rewards: torch.FloatTensor
+) -> torch.FloatTensor:
+    """Mean squared error between the softmax of the gating scores of the queried uids and of their rewards,
+    the loss of `GatingModel.backward`."""
+    normalized_scores = torch.nn.functional.softmax(scores, dim=0)
+    normalized_rewards = torch.nn.functional.softmax(rewards, dim=0)
+    return torch.nn.functional.mse_loss(
+        normalized_scores, normalized_rewards.to(normalized_scores).detach()
+    )
+
+
+class ReplayBuffer:
+    """Bounded buffer of the (prompt features, queried uids, rewards) of the most recent steps."""
+
+    def __init__(self, capacity: int):
+        self.samples = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def push(
+        self,
+        features: torch.FloatTensor,
+        uids: torch.LongTensor,
+        rewards: torch.FloatTensor,
+    ):
+        with self.lock:
+            self.samples.append(
+                (features.detach(), uids.detach().long(), rewards.detach().float())
+            )
+
+    def sample(self, batch_size: int) -> List[Sample]:
+        """Returns up to `batch_size` samples drawn uniformly without replacement."""
+        with self.lock:
+            return random.sample(self.samples, min(batch_size, len(self.samples)))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+
+class GatingTrainer:
+    """
+    Trains the linear head of the gating model off the forward path.
+
+    Each step pushes the prompt features, the queried uids and their rewards into a replay buffer. A background
+    thread wakes up every `interval` seconds and, when new samples were pushed, runs a minibatch SGD update on its own
+    copy of the head. The trained head is then published to the gating model by swapping its `linear` module for a
+    copy, so a concurrent forward reads either the previous or the new weights, never a partial update.
+    """
+
+    def __init__(
+        self,
+        gating_model: "prompting.validators.gating.BaseGatingModel",
+        buffer_size: int = 1024,
+        batch_size: int = 32,
+        interval: float = 5.0,
+        learning_rate: float = 0.01,
+        momentum: float = 0.9,
+    ):
+        """
+        Args:
+            gating_model (BaseGatingModel): Gating model whose `linear` head is trained and published.
+            buffer_size (int, optional): Number of most recent steps kept in the replay buffer.
+            batch_size (int, optional): Number of samples per minibatch update.
+            interval (float, optional): Seconds between two minibatch updates.
+            learning_rate (float, optional): Learning rate of the SGD optimizer.
+            momentum (float, optional): Momentum of the SGD optimizer.
+        """
+        self.gating_model = gating_model
+        self.buffer = ReplayBuffer(buffer_size)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.head = copy.deepcopy(gating_model.linear)
+        self.optimizer = torch.optim.SGD(
+            self.head.parameters(), lr=learning_rate, momentum=momentum
+        )
+        self.lock = threading.Lock()
+        self.steps = 0
+        self.pushed = 0
+        self.trained = 0
+        self.last_loss = None
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="gating-trainer", daemon=True
+        )
+        self._thread.start()
+
+    def push(
+        self,
+        features: torch.FloatTensor,
+        uids: torch.LongTensor,
+        rewards: torch.FloatTensor,
+    ) -> torch.FloatTensor:
+        """Adds the step to the replay buffer and returns the loss of the published head on it."""
+        self.buffer.push(features, uids, rewards)
+        self.pushed += 1
+        with torch.no_grad():
+            return gating_loss(self.gating_model.linear(features)[uids], rewards)
+
+    def train_step(self) -> torch.FloatTensor:
+        """Runs one minibatch update and publishes the head. Returns the loss, or None if the buffer is empty."""
+        samples = self.buffer.sample(self.batch_size)
+        if not samples:
+            return None
+
+        with self.lock:
+            self.optimizer.zero_grad()
+            loss = torch.stack(
+                [
+                    gating_loss(self.head(features)[uids], rewards)
+                    for features, uids, rewards in samples
+                ]
+            ).mean()
+            loss.backward()
+            self.optimizer.step()
+            self.publish()
+
+        self.steps += 1
+        self.last_loss = loss.item()
+        return loss.detach()
+
+    def publish(self):
+        """Swaps the head of the gating model for a copy of the trained head."""
+        self.gating_model.linear = copy.deepcopy(self.head).requires_grad_(False)
+
+    def load_head(self, state_dict: dict):
+        """Loads trained weights, e.g. from a saved gating model, into the head and publishes it."""
+        with self.lock:
+            self.head.load_state_dict(state_dict)
+            self.optimizer.state.clear()
+            self.publish()
+
+    def resync(
+        self,
+        previous_metagraph: "bt.metagraph.Metagraph",
+        metagraph: "bt.metagraph.Metagraph",
+    ):
+        """Reinitializes the head rows of replaced uids and forgets the samples, which reward the previous hotkeys."""
+        with self.lock:
+            resync_linear_layer(self.head, previous_metagraph, metagraph)
+            self.buffer.clear()
+            self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # Only train when new steps came in since the last update.
+            if self.pushed == self.trained:
+                continue
+            self.trained = self.pushed
+            try:
+                start = time.perf_counter()
+                loss = self.train_step()
+                if loss is not None:
+                    bt.logging.trace(
+                        f"Gating model update {self.steps}: loss {loss.item():.6f} in {time.perf_counter() - start:.3f}s"
+                    )
+            except Exception as e:
+                bt.logging.error(f"Failed to train the gating model: {e}")
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._thread.join(timeout)
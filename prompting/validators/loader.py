@@ -0,0 +1,152 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+import bittensor as bt
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+class LazyModel:
+    """
+    Proxy to a model loading in the background.
+
+    The `name` of the model is available right away, any other attribute access (e.g. `apply`) or call waits for
+    the model to be loaded and is forwarded to it. Use `model` to get the underlying model.
+    """
+
+    def __init__(self, name: str, future: Future):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "_future", future)
+
+    @property
+    def model(self) -> Any:
+        return self._future.result()
+
+    @property
+    def loaded(self) -> bool:
+        return self._future.done()
+
+    def when_loaded(self, fn: Callable[[Any], None]):
+        """Calls `fn` with the model once it is loaded, right away if it already is."""
+        self._future.add_done_callback(
+            lambda future: future.exception() is None and fn(future.result())
+        )
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.model, attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self.model, attr, value)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.model(*args, **kwargs)
+
+    def __str__(self) -> str:
+        return str(self.name)
+
+    def __repr__(self) -> str:
+        return str(self.name)
+
+
+class ModelLoader:
+    """
+    Loads independent models concurrently in a thread pool.
+
+    Most of the time of a `from_pretrained` load is spent on disk and network I/O (and in torch kernels releasing
+    the GIL), so the models load in parallel rather than one after another. `load` returns a `LazyModel` right
+    away; `resolve` waits for the models and replaces the proxies by the models themselves. The load time of each
+    model is recorded and logged as a breakdown once `close` was called and all models are loaded.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Args:
+            max_workers (int, optional): Number of models loaded at the same time.
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="model-loader"
+        )
+        self.futures: Dict[str, Future] = {}
+        self.timings: Dict[str, float] = {}
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reported = False
+
+    def load(self, name: str, factory: Callable[[], Any]) -> LazyModel:
+        """Starts loading a model in the background.
+        Args:
+            name (str): Name of the model, e.g. its `RewardModelType` value.
+            factory (Callable[[], Any]): Creates the model.
+        """
+
+        def load_model():
+            start_time = time.perf_counter()
+            model = factory()
+            self.timings[name] = time.perf_counter() - start_time
+            bt.logging.debug(f"Loaded {name} in {self.timings[name]:.1f}s")
+            return model
+
+        future = self.executor.submit(load_model)
+        with self._lock:
+            self.futures[name] = future
+        future.add_done_callback(self._on_done)
+        return LazyModel(name, future)
+
+    def close(self):
+        """Marks the end of the loads, the breakdown is logged once they are all done."""
+        with self._lock:
+            self._closed = True
+        self.executor.shutdown(wait=False)
+        self._on_done(None)
+
+    def resolve(self, models: List[Any]) -> List[Any]:
+        """Waits for the models of the list and replaces the proxies by the models."""
+        return [
+            model.model if isinstance(model, LazyModel) else model for model in models
+        ]
+
+    def report(self) -> str:
+        """Returns the load time of each model, the total wall time and the time a sequential load would take."""
+        lines = [
+            f"{name:<24} {seconds:8.1f}s"
+            for name, seconds in sorted(
+                self.timings.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+        lines.append(
+            f"{'total (wall)':<24} {time.perf_counter() - self.start_time:8.1f}s"
+        )
+        lines.append(f"{'total (sequential)':<24} {sum(self.timings.values()):8.1f}s")
+        return "\n".join(lines)
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            if (
+                self._reported
+                or not self._closed
+                or not all(f.done() for f in self.futures.values())
+            ):
+                return
+            self._reported = True
+        failed = [name for name, f in self.futures.items() if f.exception()]
+        if failed:
+            bt.logging.error(f"Failed to load models: {failed}")
+        bt.logging.info("Model loading times:\n" + self.report())
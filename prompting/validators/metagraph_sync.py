@@ -0,0 +1,174 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import operator
+import threading
+import numpy as np
+import torch
+import bittensor as bt
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+
+def replaced_uids(previous_hotkeys: List[str], hotkeys: List[str]) -> torch.LongTensor:
+    """Returns the uids whose hotkey differs from the previous one, including the uids which are new."""
+    min_len = min(len(previous_hotkeys), len(hotkeys))
+    changed = np.flatnonzero(
+        np.asarray(previous_hotkeys[:min_len], dtype=object)
+        != np.asarray(hotkeys[:min_len], dtype=object)
+    )
+    return torch.cat(
+        [
+            torch.from_numpy(changed).long(),
+            torch.arange(min_len, len(hotkeys), dtype=torch.long),
+        ]
+    )
+
+
+AXON_FIELDS = operator.attrgetter(
+    "version",
+    "ip",
+    "port",
+    "ip_type",
+    "hotkey",
+    "coldkey",
+    "protocol",
+    "placeholder1",
+    "placeholder2",
+)
+
+
+def axon_hashes(metagraph: "bt.metagraph") -> np.ndarray:
+    """Returns a hash of the axon info of each uid, so axons are compared as one array instead of object by object."""
+    return np.fromiter(
+        (hash(AXON_FIELDS(axon)) for axon in metagraph.axons),
+        dtype=np.int64,
+        count=len(metagraph.axons),
+    )
+
+
+@dataclass
+class MetagraphUpdate:
+    """A synced metagraph and its difference to the metagraph it replaces."""
+
+    metagraph: "bt.metagraph"
+    previous_metagraph: "bt.metagraph"
+    replaced_uids: torch.LongTensor
+    axons_changed: bool
+    axon_hashes: np.ndarray
+
+    @classmethod
+    def diff(
+        cls,
+        previous_metagraph: "bt.metagraph",
+        metagraph: "bt.metagraph",
+        previous_axon_hashes: Optional[np.ndarray] = None,
+    ) -> "MetagraphUpdate":
+        """Diffs the metagraphs. The axon hashes of the previous metagraph are computed unless given."""
+        if previous_axon_hashes is None:
+            previous_axon_hashes = axon_hashes(previous_metagraph)
+        hashes = axon_hashes(metagraph)
+        return cls(
+            metagraph=metagraph,
+            previous_metagraph=previous_metagraph,
+            replaced_uids=replaced_uids(previous_metagraph.hotkeys, metagraph.hotkeys),
+            axons_changed=not np.array_equal(previous_axon_hashes, hashes),
+            axon_hashes=hashes,
+        )
+
+
+def sync_new_metagraph(netuid: int, subtensor: "bt.subtensor") -> "bt.metagraph":
+    """Returns a new metagraph of the subnet synced with the subtensor."""
+    metagraph = bt.metagraph(netuid=netuid, network=subtensor.network, sync=False)
+    metagraph.sync(subtensor=subtensor)
+    return metagraph
+
+
+class MetagraphSyncer:
+    """Syncs the metagraph from a background thread, so that the chain requests do not stall the forward loop.
+
+    Every `interval` seconds a new metagraph is synced with a subtensor of the thread and diffed against the
+    metagraph currently in use. The main loop swaps in the latest update with `pop`.
+    """
+
+    def __init__(
+        self,
+        metagraph: "bt.metagraph",
+        subtensor_factory: Callable[[], "bt.subtensor"],
+        interval: float = 120.0,
+    ):
+        """
+        Args:
+            metagraph (bt.metagraph): Metagraph in use.
+            subtensor_factory (Callable[[], bt.subtensor]): Creates the subtensor of the thread, the websocket of
+                the subtensor of the main loop can not be shared.
+            interval (float): Seconds between syncs.
+        """
+        self.metagraph = metagraph
+        self.subtensor_factory = subtensor_factory
+        self.interval = interval
+        self.subtensor = None
+        self.axon_hashes = axon_hashes(metagraph)
+        self.pending: Optional[MetagraphUpdate] = None
+        self.last_sync_time = None
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="MetagraphSyncer", daemon=True
+        )
+        self._thread.start()
+
+    def sync(self) -> MetagraphUpdate:
+        """Syncs a new metagraph and stores its update."""
+        if self.subtensor is None:
+            self.subtensor = self.subtensor_factory()
+        metagraph = sync_new_metagraph(self.metagraph.netuid, self.subtensor)
+        with self.lock:
+            # Diffed against the metagraph in use, which does not change until the update is popped.
+            update = MetagraphUpdate.diff(
+                self.metagraph, metagraph, previous_axon_hashes=self.axon_hashes
+            )
+            self.pending = update
+            self.last_sync_time = time.time()
+        return update
+
+    def pop(self) -> Optional[MetagraphUpdate]:
+        """Returns the latest update, None if there was none since the last call. The update is in use afterwards."""
+        with self.lock:
+            update, self.pending = self.pending, None
+            if update is not None:
+                self.metagraph = update.metagraph
+                self.axon_hashes = update.axon_hashes
+            return update
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                start = time.perf_counter()
+                update = self.sync()
+                bt.logging.debug(
+                    f"Synced metagraph in {time.perf_counter() - start:.2f}s, {len(update.replaced_uids)} replaced uids"
+                )
+            except Exception as e:
+                # Reconnect on the next sync.
+                self.subtensor = None
+                bt.logging.warning(f"Failed to sync metagraph with error: {e}")
+
+    def stop(self):
+        self._stop.set()
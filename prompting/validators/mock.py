@@ -16,6 +16,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import re
 import torch
 import asyncio
 import bittensor as bt
@@ -66,7 +67,9 @@ class MockRewardModel(BaseRewardModel):
     def set_counter_to_half(self):
         pass
 
-    def apply(self, prompt: str, completion: List[str], name: str) -> torch.FloatTensor:
+    def apply(
+        self, prompt: str, completion: List[str], name: str, batch=None
+    ) -> torch.FloatTensor:
         mock_reward = torch.tensor([1 for _ in completion], dtype=torch.float32)
         return mock_reward, {}
 
@@ -122,6 +125,13 @@ class MockDendrite(torch.nn.Module):
 
         return await test()
 
+    async def call_stream(self, target_axon, synapse, timeout, deserialize=True):
+        await asyncio.sleep(0.01)
+        response = MockDendriteResponse(synapse.messages[0])
+        for token in re.findall(r"\S+\s*", response.completion):
+            yield [token]
+        yield response
+
     def resync(self, metagraph):
         pass
 
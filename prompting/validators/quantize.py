@@ -0,0 +1,132 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Dynamic int8 quantization of the encoder based reward and masking models for cpu only validators.
+import os
+import torch
+import bittensor as bt
+from typing import Dict, List
+
+# Fixed sample used to measure the output delta of the quantized models against fp32.
+QUANTIZATION_SAMPLE = [
+    "What is the capital of France?",
+    "The capital of France is Paris, which is also its largest city.",
+    "Summarize the following text in two sentences.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "Write a short poem about the ocean at night.",
+    "I am sorry, but I cannot help with that request.",
+    "The mitochondria is the powerhouse of the cell.",
+    "Here is a python function that reverses a string: def reverse(s): return s[::-1]",
+]
+
+
+def set_cpu_threads(num_threads: int = 0) -> int:
+    """Sets the number of intra-op threads used by torch on cpu.
+    Args:
+        num_threads (int): Number of threads, 0 uses one thread per physical core.
+    Returns:
+        num_threads (int): The number of threads set.
+    """
+    if num_threads <= 0:
+        try:
+            import psutil
+
+            num_threads = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+        except ImportError:
+            num_threads = os.cpu_count() or 1
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
+def quantize_linear_layers(model: torch.nn.Module) -> torch.nn.Module:
+    """Returns a copy of the model with its Linear layers dynamically quantized to int8."""
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def _encode(model: torch.nn.Module, tokenizer, sample: List[str]) -> torch.FloatTensor:
+    """Returns the classifier logits or the mean pooled token embeddings of the sample."""
+    inputs = tokenizer(sample, padding=True, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model(**inputs)
+    if getattr(outputs, "logits", None) is not None:
+        return outputs.logits.float()
+    mask = inputs["attention_mask"].unsqueeze(-1).float()
+    return (outputs.last_hidden_state * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+
+def output_delta(
+    reference: torch.nn.Module,
+    quantized: torch.nn.Module,
+    tokenizer,
+    sample: List[str] = QUANTIZATION_SAMPLE,
+) -> Dict[str, float]:
+    """Compares the outputs of the quantized model against the fp32 reference on the sample.
+    Returns:
+        delta (Dict[str, float]): Max and mean absolute output delta and the mean cosine similarity.
+    """
+    expected = _encode(reference, tokenizer, sample)
+    actual = _encode(quantized, tokenizer, sample)
+    delta = (actual - expected).abs()
+    return {
+        "max_abs_delta": delta.max().item(),
+        "mean_abs_delta": delta.mean().item(),
+        "cosine_similarity": torch.nn.functional.cosine_similarity(
+            actual, expected, dim=-1
+        )
+        .mean()
+        .item(),
+    }
+
+
+def quantize_reward_model(
+    reward_model, sample: List[str] = QUANTIZATION_SAMPLE
+) -> Dict[str, Dict[str, float]]:
+    """Quantizes the encoders of a reward model in place.
+    The encoders are the `model` attribute of the reward model, or of each of its `models`
+    (e.g. the relevance model wraps a bert and an mpnet encoder).
+    Returns:
+        deltas (Dict[str, Dict[str, float]]): The output delta against fp32 of each encoder.
+    """
+    deltas = {}
+    for encoder in getattr(reward_model, "models", [reward_model]):
+        reference = encoder.model.eval()
+        encoder.model = quantize_linear_layers(reference)
+        deltas[encoder.name] = output_delta(
+            reference, encoder.model, encoder.tokenizer, sample
+        )
+    return deltas
+
+
+def maybe_quantize(self, reward_model):
+    """Quantizes the reward model when the validator runs with --neuron.cpu_quantize on cpu."""
+    if not self.config.neuron.cpu_quantize:
+        return reward_model
+    if str(self.device) != "cpu":
+        bt.logging.warning(
+            f"Skipping quantization of {reward_model.name}, int8 dynamic quantization only runs on cpu (device: {self.device})"
+        )
+        return reward_model
+
+    for name, delta in quantize_reward_model(reward_model).items():
+        bt.logging.info(
+            f"Quantized {name} to int8: max abs delta {delta['max_abs_delta']:.4f}, "
+            f"mean abs delta {delta['mean_abs_delta']:.4f}, cosine similarity {delta['cosine_similarity']:.4f}"
+        )
+    return reward_model
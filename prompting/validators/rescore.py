@@ -0,0 +1,546 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Re-scores recorded step events with the current reward, mask and penalty models and replays the
+# moving average of the scores, to see how the weights would have moved under another reward setup.
+#
+# Example:
+#   python -m prompting.validators.rescore --output ~/rescored \
+#       --log "~/.bittensor/miners/default/default/netuid1/core_validator/completions*.log" \
+#       --reward.dpo_weight 0.5 --reward.reciprocate_weight 0.5 --workers 2
+import os
+import re
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import torch
+import bittensor as bt
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
+from prompting.validators.gating_offline import iter_log_events
+from prompting.validators.reward.batch import CompletionBatch
+from prompting.validators.reward.config import (
+    DefaultRewardFrameworkConfig,
+    RewardModelType,
+)
+from prompting.validators.tasks import Task
+
+# Event fields read from the logs, the recorded penalties are read from `{name}_applied`.
+EVENT_COLUMNS = [
+    "block",
+    "name",
+    "task_type",
+    "prompt",
+    "uids",
+    "completions",
+    "completion_status_codes",
+    "rewards",
+]
+
+# Reward models in the order of the validator, with the name of their weight in `config.reward`.
+REWARD_WEIGHTS = [
+    (RewardModelType.dpo.value, "dpo_weight"),
+    (RewardModelType.rlhf.value, "rlhf_weight"),
+    (RewardModelType.reciprocate.value, "reciprocate_weight"),
+    (RewardModelType.dahoas.value, "dahoas_weight"),
+    (RewardModelType.prompt.value, "prompt_based_weight"),
+]
+
+# Masks in the order of the validator, with the name of their `--neuron.*_off` flag.
+MASKS = [
+    (RewardModelType.blacklist.value, "blacklist_off"),
+    (RewardModelType.relevance.value, "relevance_off"),
+    (RewardModelType.diversity.value, "diversity_off"),
+    (RewardModelType.nsfw.value, "nsfw_off"),
+]
+
+# The base text of a task is delimited with triple single quotes in its prompt (the prompts call them backticks), see
+# `prompting.validators.tasks`.
+BASE_TEXT_PATTERN = re.compile(r"'''(.*?)'''", re.DOTALL)
+
+
+@dataclass
+class RecordedTask(Task):
+    """Task of a recorded step. Its criteria are drawn at random and not recorded, so it has none."""
+
+    prompt: str = ""
+
+    def compose_prompt(self) -> str:
+        return self.prompt
+
+
+@dataclass
+class RecordedResponse:
+    """Completion and status code of a recorded response, in place of the synapse the models read."""
+
+    completion: str
+    status_code: int
+
+    @property
+    def dendrite(self) -> "RecordedResponse":
+        return self
+
+
+def _event(event: dict) -> dict:
+    """Returns the event if it can be re-scored, else None."""
+    uids, completions = event.get("uids"), event.get("completions")
+    if not event.get("prompt") or not uids or completions is None:
+        return None
+    if len(uids) != len(completions):
+        return None
+    return event
+
+
+def read_log_events(path: str) -> List[dict]:
+    """Returns the events of a `completions.log` file which can be re-scored."""
+    return [event for event in map(_event, iter_log_events(path)) if event is not None]
+
+
+def read_segment_events(segment: str, recorded_penalties: List[str] = ()) -> List[dict]:
+    """Returns the events of an event store segment which can be re-scored."""
+    from prompting.validators.event_store import EventReader
+
+    columns = EVENT_COLUMNS + [f"{name}_applied" for name in recorded_penalties]
+    reader = EventReader(os.path.dirname(segment))
+    events = reader.iter_segment_events(segment, columns=columns)
+    return [event for event in map(_event, events) if event is not None]
+
+
+def load_events(
+    log_paths: List[str] = (),
+    events_path: str = None,
+    recorded_penalties: List[str] = (),
+    workers: int = None,
+) -> List[dict]:
+    """Reads the events of the log files and of the event store segments in parallel, ordered by block."""
+    jobs = [(read_log_events, (path,)) for path in log_paths]
+    if events_path is not None:
+        from prompting.validators.event_store import EventReader
+
+        jobs += [
+            (read_segment_events, (segment, list(recorded_penalties)))
+            for segment in EventReader(events_path).segments()
+        ]
+
+    events = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(read, *args) for read, args in jobs]
+        for (_, args), future in zip(jobs, futures):
+            file_events = future.result()
+            bt.logging.info(f"Read {len(file_events)} events from {args[0]}")
+            events.extend(file_events)
+
+    # Stable, so events of the same block keep the order they were written in.
+    events.sort(key=lambda event: event.get("block") or 0)
+    return events
+
+
+class Rescorer:
+    """Computes the rewards of recorded events like `forward.run_step`: the weighted sum of the reward models,
+    times the masks and the penalties.
+
+    Notes:
+        Penalties named in `recorded_penalties` are taken from the `{name}_applied` values of the event when it has
+        them, as the task validation penalty depends on the task criteria which are not recorded.
+        The normalization statistics of the reward models, the blacklist counter and the diversity history are
+        updated with the events in the order they are re-scored, per worker process.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        masks: List[str],
+        device: str = "cpu",
+        mock: bool = False,
+        recorded_penalties: List[str] = (),
+        path: str = None,
+    ):
+        """
+        Args:
+            weights (Dict[str, float]): Weight of each reward model by its name, models of weight 0 are not loaded.
+            masks (List[str]): Names of the masks to apply.
+            device (str): Device of the models.
+            mock (bool): Use `MockRewardModel` for all the reward models and masks.
+            recorded_penalties (List[str]): Names of the penalties read from the events.
+            path (str): Directory the dahoas reward model is downloaded to.
+        """
+        from prompting.validators.penalty import (
+            TaskValidationPenaltyModel,
+            ContentMatchPenaltyModel,
+            KeywordMatchPenaltyModel,
+        )
+
+        self.device = device
+        self.weights = {name: weight for name, weight in weights.items() if weight > 0}
+        self.reward_functions = [self.load(name, mock, path) for name in self.weights]
+        self.masking_functions = [self.load(name, mock, path) for name in masks]
+        # Same penalties as the validator.
+        self.penalty_functions = [
+            TaskValidationPenaltyModel(max_penalty=0.6),
+            ContentMatchPenaltyModel(max_penalty=0.2),
+            KeywordMatchPenaltyModel(max_penalty=1),
+        ]
+        self.recorded_penalties = set(recorded_penalties)
+
+    def load(self, name: str, mock: bool, path: str = None):
+        """Returns the reward model or mask of the name."""
+        from prompting.validators import reward
+        from prompting.validators.mock import MockRewardModel
+
+        if mock:
+            return MockRewardModel(name)
+        constructors = {
+            RewardModelType.dpo.value: lambda: reward.DirectPreferenceRewardModel(
+                device=self.device
+            ),
+            RewardModelType.rlhf.value: lambda: reward.OpenAssistantRewardModel(
+                device=self.device
+            ),
+            RewardModelType.reciprocate.value: lambda: reward.ReciprocateRewardModel(
+                device=self.device
+            ),
+            RewardModelType.dahoas.value: lambda: reward.DahoasRewardModel(
+                path=path, device=self.device
+            ),
+            RewardModelType.prompt.value: lambda: reward.PromptRewardModel(
+                device=self.device
+            ),
+            RewardModelType.blacklist.value: lambda: reward.Blacklist(),
+            RewardModelType.relevance.value: lambda: reward.RelevanceRewardModel(
+                device=self.device
+            ),
+            RewardModelType.diversity.value: lambda: reward.DiversityRewardModel(
+                device=self.device
+            ),
+            RewardModelType.nsfw.value: lambda: reward.NSFWRewardModel(
+                device=self.device
+            ),
+        }
+        return constructors[name]()
+
+    def rescore(self, event: dict) -> dict:
+        """Returns the rewards of the event and the normalized rewards of each model and penalty."""
+        prompt = event["prompt"]
+        match = BASE_TEXT_PATTERN.search(prompt)
+        task = RecordedTask(
+            base_text=match.group(1) if match else prompt,
+            task_name=event.get("name") or "",
+            task_type=event.get("task_type") or "",
+            prompt=prompt,
+        )
+        responses = [
+            RecordedResponse(completion or "", int(status_code or 0))
+            for completion, status_code in zip(
+                event["completions"],
+                event.get("completion_status_codes")
+                or [200] * len(event["completions"]),
+            )
+        ]
+        batch = CompletionBatch.from_responses(task.base_text, responses)
+        result = {}
+
+        self.blacklist_add(responses)
+        rewards = torch.zeros(len(responses), dtype=torch.float32)
+        for reward_fn_i in self.reward_functions:
+            reward_i_normalized, _ = reward_fn_i.apply(
+                task.base_text, responses, task.task_name, batch=batch
+            )
+            rewards += self.weights[reward_fn_i.name] * reward_i_normalized.cpu()
+            result[reward_fn_i.name + "_normalized"] = reward_i_normalized.tolist()
+
+        for masking_fn_i in self.masking_functions:
+            mask_i_normalized, _ = masking_fn_i.apply(
+                task.base_text, responses, task.task_name, batch=batch
+            )
+            rewards *= mask_i_normalized.cpu()
+            result[masking_fn_i.name + "_normalized"] = mask_i_normalized.tolist()
+
+        for penalty_fn_i in self.penalty_functions:
+            recorded = event.get(penalty_fn_i.name + "_applied")
+            if penalty_fn_i.name in self.recorded_penalties and recorded is not None:
+                applied_penalty_i = torch.tensor(recorded, dtype=torch.float32)
+            else:
+                _, _, applied_penalty_i = penalty_fn_i.apply_penalties(responses, task)
+            rewards *= applied_penalty_i
+            result[penalty_fn_i.name + "_applied"] = applied_penalty_i.tolist()
+
+        result["rewards"] = rewards.tolist()
+        return result
+
+    def blacklist_add(self, responses: List[RecordedResponse]):
+        """Adds the completions to the blacklist counter, as the validator does before rewarding."""
+        for masking_fn_i in self.masking_functions:
+            if masking_fn_i.name == RewardModelType.blacklist.value:
+                masking_fn_i.add(
+                    [
+                        response.completion
+                        for response in responses
+                        if response.completion
+                    ]
+                )
+
+    def rescore_batch(self, events: List[dict]) -> List[dict]:
+        """Re-scores the events in order."""
+        with torch.no_grad():
+            return [self.rescore(event) for event in events]
+
+
+# Rescorer of the worker process, built once by `_init_worker`.
+_rescorer: Rescorer = None
+
+
+def _init_worker(kwargs: dict):
+    global _rescorer
+    torch.set_num_threads(1)
+    _rescorer = Rescorer(**kwargs)
+
+
+def _rescore_batch(events: List[dict]) -> List[dict]:
+    return _rescorer.rescore_batch(events)
+
+
+def iter_rescored(
+    events: List[dict], rescorer_kwargs: dict, batch_size: int = 256, workers: int = 0
+) -> Iterator[dict]:
+    """Yields the re-scored events in order.
+    Args:
+        events (List[dict]): Recorded events.
+        rescorer_kwargs (dict): Arguments of the `Rescorer`.
+        batch_size (int): Number of events sent to a worker at once.
+        workers (int): Number of worker processes, each loading its own models. 0 re-scores in this process.
+    """
+    batches = [
+        events[start : start + batch_size]
+        for start in range(0, len(events), batch_size)
+    ]
+    if workers <= 0:
+        rescorer = Rescorer(**rescorer_kwargs)
+        for batch in batches:
+            yield from rescorer.rescore_batch(batch)
+        return
+
+    # Spawned, as forked processes can not use cuda.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(rescorer_kwargs,),
+    ) as executor:
+        for rescored in executor.map(_rescore_batch, batches):
+            yield from rescored
+
+
+def moving_average(
+    scores: np.ndarray, uids: List[int], rewards: List[float], alpha: float
+) -> np.ndarray:
+    """Returns the moving averaged scores updated with the rewards of a step, as in `forward.run_step`."""
+    scattered = scores.copy()
+    scattered[uids] = rewards
+    return alpha * scattered + (1 - alpha) * scores
+
+
+def rescore(
+    events: List[dict],
+    output: str,
+    rescorer_kwargs: dict,
+    num_uids: int,
+    alpha: float = 0.05,
+    batch_size: int = 256,
+    workers: int = 0,
+) -> float:
+    """Re-scores the events and writes to the output directory:
+        `rescored.jsonl`: block, task name, uids, recorded and new rewards of each event, with the rewards of each model.
+        `moving_averaged_scores.npy`: Moving averaged scores after each event, shape [ len(events), num_uids ].
+        `recorded_moving_averaged_scores.npy`: The same from the recorded rewards.
+    Returns:
+        events_per_second (float): Throughput of the re-scoring.
+    """
+    os.makedirs(output, exist_ok=True)
+    shape = (len(events), num_uids)
+    trajectory = np.lib.format.open_memmap(
+        os.path.join(output, "moving_averaged_scores.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=shape,
+    )
+    recorded_trajectory = np.lib.format.open_memmap(
+        os.path.join(output, "recorded_moving_averaged_scores.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=shape,
+    )
+    scores = np.zeros(num_uids, dtype=np.float32)
+    recorded_scores = np.zeros(num_uids, dtype=np.float32)
+
+    start_time = time.time()
+    with open(os.path.join(output, "rescored.jsonl"), "w") as f:
+        rescored = iter_rescored(events, rescorer_kwargs, batch_size, workers)
+        for index, (event, result) in enumerate(zip(events, rescored)):
+            uids = [int(uid) for uid in event["uids"]]
+            scores = moving_average(scores, uids, result["rewards"], alpha)
+            trajectory[index] = scores
+            recorded_rewards = event.get("rewards")
+            if recorded_rewards is not None and len(recorded_rewards) == len(uids):
+                recorded_scores = moving_average(
+                    recorded_scores,
+                    uids,
+                    np.nan_to_num(np.array(recorded_rewards, dtype=np.float32)),
+                    alpha,
+                )
+            recorded_trajectory[index] = recorded_scores
+
+            record = {
+                "block": event.get("block"),
+                "name": event.get("name"),
+                "uids": uids,
+                "recorded_rewards": recorded_rewards,
+                **result,
+            }
+            f.write(json.dumps(record) + "\n")
+
+            if (index + 1) % 1000 == 0:
+                bt.logging.info(
+                    f"Re-scored {index + 1} events, {(index + 1) / (time.time() - start_time):.1f} events/s"
+                )
+
+    trajectory.flush()
+    recorded_trajectory.flush()
+    return len(events) / max(time.time() - start_time, 1e-9)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Re-scores recorded step events with the configured reward models and replays the moving averaged scores."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=False,
+        help="Directory the results are written to.",
+    )
+    parser.add_argument(
+        "--log", type=str, nargs="*", default=[], help="completions.log files or globs."
+    )
+    parser.add_argument(
+        "--events", type=str, default=None, help="Directory of an arrow event store."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of worker processes, each loading its own models. 0 re-scores in the main process.",
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=256, help="Events sent to a worker at once."
+    )
+    parser.add_argument(
+        "--num_uids",
+        type=int,
+        default=0,
+        help="Size of the moving averaged scores, defaults to the largest uid of the events plus one.",
+    )
+    parser.add_argument(
+        "--recorded_penalties",
+        type=str,
+        nargs="*",
+        default=["task_validation_penalty"],
+        help="Penalties taken from the events instead of being recomputed.",
+    )
+    parser.add_argument(
+        "--neuron.device",
+        type=str,
+        default="cuda" if torch.cuda.is_available() else "cpu",
+    )
+    parser.add_argument(
+        "--neuron.mock_reward_models",
+        action="store_true",
+        help="Use mock reward models and masks, which do not download anything.",
+    )
+    parser.add_argument(
+        "--neuron.moving_average_alpha",
+        type=float,
+        default=0.05,
+        help="Moving average alpha parameter, how much to add of the new observation.",
+    )
+    for _, flag in MASKS:
+        parser.add_argument(f"--neuron.{flag}", action="store_true", default=False)
+    defaults = DefaultRewardFrameworkConfig()
+    parser.add_argument(
+        "--reward.dpo_weight", type=float, default=defaults.dpo_model_weight
+    )
+    parser.add_argument(
+        "--reward.rlhf_weight", type=float, default=defaults.rlhf_model_weight
+    )
+    parser.add_argument(
+        "--reward.reciprocate_weight",
+        type=float,
+        default=defaults.reciprocate_model_weight,
+    )
+    parser.add_argument(
+        "--reward.dahoas_weight", type=float, default=defaults.dahoas_model_weight
+    )
+    parser.add_argument(
+        "--reward.prompt_based_weight",
+        type=float,
+        default=defaults.prompt_model_weight,
+    )
+    config = bt.config(parser, args)
+    if not config.output:
+        parser.error("--output is required")
+
+    log_paths = sorted(
+        {
+            path
+            for pattern in config.log
+            for path in glob.glob(os.path.expanduser(pattern))
+        }
+    )
+    events = load_events(log_paths, config.events, config.recorded_penalties)
+    if not events:
+        raise SystemExit("No events with a prompt, uids and completions were found.")
+    num_uids = config.num_uids or max(max(event["uids"]) for event in events) + 1
+
+    output = os.path.expanduser(config.output)
+    rescorer_kwargs = dict(
+        weights={name: config.reward[weight] for name, weight in REWARD_WEIGHTS},
+        masks=[name for name, flag in MASKS if not config.neuron[flag]],
+        device=config.neuron.device,
+        mock=config.neuron.mock_reward_models,
+        recorded_penalties=config.recorded_penalties,
+        path=output,
+    )
+    events_per_second = rescore(
+        events,
+        output,
+        rescorer_kwargs,
+        num_uids=num_uids,
+        alpha=config.neuron.moving_average_alpha,
+        batch_size=config.batch_size,
+        workers=config.workers,
+    )
+    print(
+        f"Re-scored {len(events)} events to {output} at {events_per_second:.1f} events/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
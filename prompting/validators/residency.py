@@ -0,0 +1,285 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import time
+import torch
+import threading
+import bittensor as bt
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Any, Dict, List
+from prompting.validators.loader import LazyModel
+
+
+def module_footprint(module: torch.nn.Module) -> int:
+    """Returns the number of bytes held by the parameters and buffers of the module."""
+    tensors = {
+        id(tensor): tensor
+        for tensor in list(module.parameters()) + list(module.buffers())
+    }
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors.values())
+
+
+def _collect_modules(model: Any) -> List[torch.nn.Module]:
+    if isinstance(model, LazyModel):
+        model = model.model
+    modules = []
+    for value in vars(model).values():
+        if isinstance(value, torch.nn.Module):
+            modules.append(value)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if not isinstance(item, (torch.nn.Module, str, int, float)):
+                    modules.extend(_collect_modules(item))
+    return modules
+
+
+def find_modules(model: Any) -> List[torch.nn.Module]:
+    """Returns the torch modules held by a reward model, including those of the models it wraps
+    (e.g. the relevance model wraps a bert and an mpnet model). Modules held more than once or which are
+    submodules of another held module (e.g. the transformer of the dahoas model) are only returned once, through
+    their outermost module."""
+    modules = list({id(module): module for module in _collect_modules(model)}.values())
+    nested = {
+        id(submodule)
+        for module in modules
+        for submodule in module.modules()
+        if submodule is not module
+    }
+    return [module for module in modules if id(module) not in nested]
+
+
+class _Resident:
+    """Residency state and swap statistics of one model."""
+
+    def __init__(self, name: str, modules: List[torch.nn.Module]):
+        self.name = name
+        self.modules = modules
+        self.footprint = sum(module_footprint(module) for module in modules)
+        self.resident = True
+        self.in_use = 0
+        self.swaps_in = 0
+        self.swaps_out = 0
+        self.swap_in_seconds = 0.0
+        self.swap_out_seconds = 0.0
+
+
+class ResidencyManager:
+    """
+    Keeps the reward and masking models within a memory budget on the device.
+
+    Models are registered with their footprint (the bytes of their parameters and buffers). `use` pages a model in
+    before it is applied and marks it as the most recently used. When paging a model in would exceed the budget,
+    the least recently used idle models are offloaded, either to cpu memory or to disk (the tensors are saved once
+    to `offload_path` and the modules are moved to the meta device, holding no memory). A model larger than the
+    budget on its own is still paged in. Models in use by a concurrent forward are never offloaded.
+
+    A budget of 0 disables the manager, `use` then does nothing.
+    """
+
+    def __init__(
+        self,
+        device: str,
+        budget: int = 0,
+        offload: str = "cpu",
+        offload_path: str = None,
+        metrics: "prompting.metrics.MetricsRegistry" = None,
+    ):
+        """
+        Args:
+            device (str): Device the models are applied on.
+            budget (int, optional): Memory budget of the resident models on `device`, in bytes. 0 disables the manager.
+            offload (str, optional): Where idle models are offloaded to, `cpu` or `disk`.
+            offload_path (str, optional): Directory of the offloaded tensors, required for `disk`.
+            metrics (prompting.metrics.MetricsRegistry, optional): Registry receiving the swap counts and times and the resident bytes.
+        """
+        if offload not in ("cpu", "disk"):
+            raise ValueError(f"Unknown offload target: {offload}")
+        if offload == "disk" and offload_path is None:
+            raise ValueError("An offload_path is required to offload models to disk")
+        if offload == "cpu" and str(device) == "cpu" and budget > 0:
+            bt.logging.warning(
+                "Offloading to cpu has no effect when the models run on cpu, use disk offloading instead"
+            )
+
+        self.device = device
+        self.budget = budget
+        self.offload = offload
+        self.offload_path = offload_path
+        self.models: "OrderedDict[str, _Resident]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.swaps = self.swap_seconds = self.resident_bytes = None
+        if metrics is not None:
+            self.swaps = metrics.counter(
+                "validator_model_swaps_total",
+                "Number of times a model was paged in or offloaded.",
+                ["model", "direction"],
+            )
+            self.swap_seconds = metrics.counter(
+                "validator_model_swap_seconds_total",
+                "Time spent paging in and offloading models.",
+                ["model", "direction"],
+            )
+            self.resident_bytes = metrics.gauge(
+                "validator_resident_model_bytes",
+                "Bytes of the models resident on the device.",
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def register(self, model: Any) -> Any:
+        """Registers a reward model and offloads idle models if it exceeds the budget. Returns the model."""
+        if not self.enabled or model.name in self.models:
+            return model
+        resident = _Resident(model.name, find_modules(model))
+        with self.lock:
+            if resident.name not in self.models:
+                self.models[resident.name] = resident
+                self._make_room(resident)
+                self._update_gauge()
+        return model
+
+    @contextmanager
+    def use(self, model: Any):
+        """Context manager paging the model in for the duration of the block."""
+        if not self.enabled:
+            yield model
+            return
+
+        self.register(model)
+        resident = self.models[model.name]
+        with self.lock:
+            resident.in_use += 1
+            self.models.move_to_end(resident.name)
+            # Also settles an overshoot left by models that were in use when the previous model was paged in.
+            self._make_room(resident)
+            if not resident.resident:
+                self._page_in(resident)
+            self._update_gauge()
+        try:
+            yield model
+        finally:
+            with self.lock:
+                resident.in_use -= 1
+
+    def used_bytes(self) -> int:
+        """Returns the bytes of the models resident on the device."""
+        return sum(
+            resident.footprint for resident in self.models.values() if resident.resident
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the residency, footprint and swap statistics of each model."""
+        with self.lock:
+            return {
+                name: {
+                    "resident": resident.resident,
+                    "bytes": resident.footprint,
+                    "swaps_in": resident.swaps_in,
+                    "swaps_out": resident.swaps_out,
+                    "swap_in_seconds": resident.swap_in_seconds,
+                    "swap_out_seconds": resident.swap_out_seconds,
+                }
+                for name, resident in self.models.items()
+            }
+
+    def _make_room(self, incoming: _Resident):
+        """Offloads the least recently used idle models until `incoming` fits in the budget."""
+        used = self.used_bytes() - (incoming.footprint if incoming.resident else 0)
+        for resident in list(self.models.values()):
+            if used + incoming.footprint <= self.budget:
+                break
+            if resident is incoming or not resident.resident or resident.in_use:
+                continue
+            self._page_out(resident)
+            used -= resident.footprint
+
+        if used + incoming.footprint > self.budget:
+            bt.logging.warning(
+                f"Model {incoming.name} ({incoming.footprint} bytes) does not fit in the memory budget "
+                f"({self.budget} bytes, {used} bytes in use)"
+            )
+
+    def _offload_file(self, resident: _Resident, index: int) -> str:
+        return os.path.join(
+            self.offload_path, f"{resident.name.replace('/', '_')}-{index}.pt"
+        )
+
+    def _page_out(self, resident: _Resident):
+        start = time.perf_counter()
+        for index, module in enumerate(resident.modules):
+            if self.offload == "cpu":
+                module.to("cpu")
+                continue
+            path = self._offload_file(resident, index)
+            # The models are only used for inference, so their tensors are written once and reloaded from then on.
+            if not os.path.exists(path):
+                os.makedirs(self.offload_path, exist_ok=True)
+                tensors = {
+                    name: tensor.detach().to("cpu")
+                    for name, tensor in _named_tensors(module)
+                }
+                torch.save(tensors, path + ".tmp")
+                os.replace(path + ".tmp", path)
+            module.to("meta")
+        if str(self.device).startswith("cuda"):
+            torch.cuda.empty_cache()
+        self._record(resident, "out", time.perf_counter() - start)
+        resident.resident = False
+
+    def _page_in(self, resident: _Resident):
+        start = time.perf_counter()
+        for index, module in enumerate(resident.modules):
+            if self.offload == "cpu":
+                module.to(self.device)
+                continue
+            tensors = torch.load(
+                self._offload_file(resident, index), map_location=self.device
+            )
+            module.to_empty(device=self.device)
+            with torch.no_grad():
+                for name, tensor in _named_tensors(module):
+                    tensor.copy_(tensors[name])
+        self._record(resident, "in", time.perf_counter() - start)
+        resident.resident = True
+
+    def _record(self, resident: _Resident, direction: str, seconds: float):
+        if direction == "in":
+            resident.swaps_in += 1
+            resident.swap_in_seconds += seconds
+        else:
+            resident.swaps_out += 1
+            resident.swap_out_seconds += seconds
+        if self.swaps is not None:
+            self.swaps.inc(model=resident.name, direction=direction)
+            self.swap_seconds.inc(seconds, model=resident.name, direction=direction)
+        bt.logging.debug(f"Paged {direction} model {resident.name} in {seconds:.3f}s")
+
+    def _update_gauge(self):
+        if self.resident_bytes is not None:
+            self.resident_bytes.set(self.used_bytes())
+
+
+def _named_tensors(module: torch.nn.Module):
+    """Parameters and buffers of the module, including non persistent buffers and every name of tied tensors."""
+    yield from module.named_parameters(remove_duplicate=False)
+    yield from module.named_buffers(remove_duplicate=False)
@@ -1,11 +1,30 @@
-from .blacklist import Blacklist
-from .nsfw import NSFWRewardModel
-from .dpo import DirectPreferenceRewardModel
-from .open_assistant import OpenAssistantRewardModel
-from .reciprocate import ReciprocateRewardModel
-from .relevance import RelevanceRewardModel
+import importlib
 from .reward import BaseRewardModel
-from .dahoas import DahoasRewardModel
-from .diversity import DiversityRewardModel
-from .prompt import PromptRewardModel
+from .batch import CompletionBatch
 from .config import RewardModelType, DefaultRewardFrameworkConfig
+
+# Reward models are imported on first access (PEP 562), so that only the selected models load their dependencies.
+_reward_models = {
+    "Blacklist": "blacklist",
+    "NSFWRewardModel": "nsfw",
+    "DirectPreferenceRewardModel": "dpo",
+    "OpenAssistantRewardModel": "open_assistant",
+    "ReciprocateRewardModel": "reciprocate",
+    "RelevanceRewardModel": "relevance",
+    "DahoasRewardModel": "dahoas",
+    "DiversityRewardModel": "diversity",
+    "PromptRewardModel": "prompt",
+}
+
+
+def __getattr__(name: str):
+    if name in _reward_models:
+        module = importlib.import_module(f".{_reward_models[name]}", __name__)
+        return getattr(module, name)
+    if name in set(_reward_models.values()):
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_reward_models) | set(_reward_models.values()))
@@ -0,0 +1,146 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import bittensor as bt
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+
+def length_buckets(lengths: Sequence[int], bucket_size: int) -> List[List[int]]:
+    """Groups indices into buckets of at most `bucket_size` sequences of similar length (longest first),
+    so that each bucket is padded to the length of its own longest sequence."""
+    order = sorted(range(len(lengths)), key=lambda idx: lengths[idx], reverse=True)
+    return [order[i : i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+
+def pad_token_ids(
+    tokenizer, token_ids: List[List[int]]
+) -> "transformers.BatchEncoding":
+    """Pads already tokenized sequences into the `input_ids` and `attention_mask` tensors of a model."""
+    return tokenizer.pad({"input_ids": token_ids}, padding=True, return_tensors="pt")
+
+
+class CompletionBatch(Sequence[str]):
+    """
+    Completions of one step, shared by the reward models.
+
+    The batch holds the prompt and the normalized (stripped) completions of the successful responses, and behaves as
+    the list of completions, so reward models written against `List[str]` keep working. Tokenizations are computed
+    with one batched (fast) tokenizer call and memoized per tokenizer identity (class, model and max length) and
+    tokenization arguments, so reward models using the same tokenizer, e.g. the mpnet of the relevance and diversity
+    models, tokenize the completions once per step. `padded_buckets` yields the completions padded in buckets of
+    similar length, which wastes less compute on padding than padding every completion to the longest one.
+    """
+
+    def __init__(self, prompt: str, completions: List[str], indices: List[int] = None):
+        """
+        Args:
+            prompt (str): Prompt the completions answer.
+            completions (List[str]): Completions, stripped of leading and trailing whitespace.
+            indices (List[int], optional): Index of each completion in the responses. Defaults to their position.
+        """
+        self.prompt = prompt
+        self.completions = [completion.strip() for completion in completions]
+        self.indices = list(range(len(completions))) if indices is None else indices
+        self._token_ids: Dict[Tuple, List[List[int]]] = {}
+
+    @classmethod
+    def from_responses(
+        cls, prompt: str, responses: List[bt.Synapse]
+    ) -> "CompletionBatch":
+        """Returns the batch of the completions of the successful responses."""
+        indices = [
+            idx
+            for idx, response in enumerate(responses)
+            if response.dendrite.status_code == 200
+        ]
+        return cls(prompt, [responses[idx].completion for idx in indices], indices)
+
+    def __len__(self) -> int:
+        return len(self.completions)
+
+    def __getitem__(self, index):
+        return self.completions[index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.completions)
+
+    def __repr__(self) -> str:
+        return f"CompletionBatch({len(self)} completions)"
+
+    @staticmethod
+    def tokenizer_key(tokenizer) -> Tuple:
+        """Identity of a tokenizer: two instances loaded from the same model produce the same tokens."""
+        return (
+            type(tokenizer).__name__,
+            getattr(tokenizer, "name_or_path", id(tokenizer)),
+            getattr(tokenizer, "model_max_length", None),
+            getattr(tokenizer, "truncation_side", None),
+        )
+
+    def _tokenize(self, tokenizer, texts: List[str], key: Tuple, kwargs: Dict):
+        key = (self.tokenizer_key(tokenizer), *key, tuple(sorted(kwargs.items())))
+        if key not in self._token_ids:
+            self._token_ids[key] = (
+                tokenizer(texts, **kwargs)["input_ids"] if texts else []
+            )
+        return self._token_ids[key]
+
+    def token_ids(
+        self,
+        tokenizer,
+        prefix: str = "",
+        suffix: str = "",
+        transform: Callable[[str], str] = None,
+        **kwargs,
+    ) -> List[List[int]]:
+        """Returns the token ids of each completion, tokenized as `prefix + transform(completion) + suffix`.
+        Args:
+            tokenizer: Huggingface tokenizer.
+            prefix (str, optional): Text prepended to the completions, e.g. the prompt or a chat template.
+            suffix (str, optional): Text appended to the completions.
+            transform (Callable[[str], str], optional): Normalization applied to the completions, part of the cache key.
+            kwargs: Arguments of the tokenizer call (e.g. `truncation=True`), part of the cache key.
+        """
+        texts = [
+            prefix + (transform(completion) if transform else completion) + suffix
+            for completion in self.completions
+        ]
+        return self._tokenize(
+            tokenizer, texts, ("completions", prefix, suffix, transform), kwargs
+        )
+
+    def prompt_token_ids(self, tokenizer, **kwargs) -> List[int]:
+        """Returns the token ids of the prompt."""
+        return self._tokenize(tokenizer, [self.prompt], ("prompt",), kwargs)[0]
+
+    def buckets(self, token_ids: List[List[int]], bucket_size: int) -> List[List[int]]:
+        """Returns the indices of the completions grouped by token length, longest first."""
+        return length_buckets([len(ids) for ids in token_ids], bucket_size)
+
+    def padded_buckets(
+        self, tokenizer, bucket_size: int = 16, **kwargs
+    ) -> Iterator[Tuple[List[int], "transformers.BatchEncoding"]]:
+        """Yields the indices of the completions of each length bucket and their padded model inputs.
+        Args:
+            tokenizer: Huggingface tokenizer.
+            bucket_size (int, optional): Maximum number of completions per bucket.
+            kwargs: Arguments of the tokenizer call, see `token_ids`.
+        """
+        token_ids = self.token_ids(tokenizer, **kwargs)
+        for indices in self.buckets(token_ids, bucket_size):
+            yield indices, pad_token_ids(tokenizer, [token_ids[idx] for idx in indices])
@@ -19,11 +19,14 @@
 import re
 import torch
 import math
+import threading
 from fuzzywuzzy import fuzz
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
-from transformers import BertTokenizer
+from .batch import CompletionBatch
+from prompting.validators.bundle import resolve_model_path
+from transformers import BertTokenizerFast
 from dataclasses import dataclass
 
 
@@ -37,6 +40,8 @@ class BlacklistRewardEvent(BaseRewardEvent):
 
 
 class Blacklist(BaseRewardModel):
+    tokenizer_name: str = "bert-base-cased"
+
     @property
     def name(self) -> str:
         return RewardModelType.blacklist.value
@@ -76,6 +81,8 @@ class Blacklist(BaseRewardModel):
         super().__init__()
 
         self.counter = {}
+        # Held while the counter is updated, so that the checkpointer can copy it from its thread.
+        self.lock = threading.Lock()
 
         self.n_min = n_min
         self.n_max = n_max
@@ -100,7 +107,9 @@ class Blacklist(BaseRewardModel):
         self.num_completion = 0
 
         self.half_life = half_life
-        self.tokenizer = BertTokenizer.from_pretrained("bert-base-cased")
+        self.tokenizer = BertTokenizerFast.from_pretrained(
+            resolve_model_path(Blacklist.tokenizer_name)
+        )
         self.memory_lim = memory_lim
         self.frequency_multiplier = frequency_multiplier
 
@@ -110,13 +119,26 @@ class Blacklist(BaseRewardModel):
         Args:
             texts (list): batch of completion texts
         """
+        if not isinstance(texts, CompletionBatch):
+            texts = CompletionBatch("", texts)
 
-        for text in texts:
-            # Extract n-grams from lowercased text
-            ngrams = self.extract_ngrams(text.lower())
+        # Tokenize the normalized texts in one batch.
+        batch_ngrams = [
+            self.ngrams(input_ids[1:-1])
+            for input_ids in texts.token_ids(self.tokenizer, transform=self.normalize)
+        ]
 
-            if ngrams:
-                self._add_ngrams(ngrams)
+        with self.lock:
+            for ngrams in batch_ngrams:
+                if ngrams:
+                    self._add_ngrams(ngrams)
+
+    def normalize(self, text: str) -> str:
+        """Removes the punctuation of the text and lowercases it."""
+        if self.preprocess:
+            # remove all punctuation
+            text = self.preprocess.sub("", text)
+        return text.lower()
 
     def extract_ngrams(self, text: str) -> List[tuple]:
         """Extract n-grams from text string
@@ -129,12 +151,19 @@ class Blacklist(BaseRewardModel):
 
         """
 
-        if self.preprocess:
-            # remove all punctuation
-            text = self.preprocess.sub("", text)
+        words = self.tokenizer(self.normalize(text))["input_ids"][1:-1]
+        return self.ngrams(words)
 
-        words = self.tokenizer(text.lower())["input_ids"][1:-1]
+    def ngrams(self, words: List[int]) -> List[tuple]:
+        """Returns the n-grams of a sequence of token ids
 
+        Args:
+            words (List[int]): token ids of a completion, without special tokens
+
+        Returns:
+            list: List of n-gram tuples
+
+        """
         if self.word_limit is not None:
             words = words[: self.word_limit]
 
@@ -190,12 +219,13 @@ class Blacklist(BaseRewardModel):
 
     def reset(self):
         """Reset counters to initial values."""
-        self.num_ngram = 0
-        self.num_completion = 0
-        self.w_current = 1
-        self.counter = {}
-        self.significance_scores = {}
-        self._last_update = 0
+        with self.lock:
+            self.num_ngram = 0
+            self.num_completion = 0
+            self.w_current = 1
+            self.counter = {}
+            self.significance_scores = {}
+            self._last_update = 0
 
     def calculate_significance(self) -> dict:
         """Calculate significance of all n-grams in counter. By construction, n-grams with count 1 will have significance 0.
@@ -232,7 +262,8 @@ class Blacklist(BaseRewardModel):
         """
 
         if self.num_completion - self._last_update > self.window:
-            self.significance_scores = self.calculate_significance()
+            with self.lock:
+                self.significance_scores = self.calculate_significance()
 
         return self.significance_scores
 
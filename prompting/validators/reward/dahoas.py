@@ -21,11 +21,14 @@ import torch
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from prompting.validators.bundle import resolve_file, resolve_model_path
 from transformers import AutoModelForCausalLM, AutoTokenizer, AutoConfig
 
 
 class DahoasRewardModel(BaseRewardModel):
     model_name = "EleutherAI/gpt-j-6b"
+    weights_repo = "Dahoas/gptj-rm-static"
+    weights_file = "hf_ckpt.pt"
 
     @property
     def name(self) -> str:
@@ -35,6 +38,13 @@ class DahoasRewardModel(BaseRewardModel):
     def load_weights(path: str):
         if not os.path.exists(path + "/hf_ckpt.pt"):
             os.makedirs(path, exist_ok=True)
+            # Link the checkpoint of the model bundle in use rather than downloading it.
+            bundled = resolve_file(
+                DahoasRewardModel.weights_repo, DahoasRewardModel.weights_file
+            )
+            if bundled is not None:
+                os.symlink(bundled, path + "/hf_ckpt.pt")
+                return
             os.system(
                 f"wget -O { path + '/hf_ckpt.pt'} \
                 https://huggingface.co/Dahoas/gptj-rm-static/resolve/main/hf_ckpt.pt"
@@ -44,7 +54,9 @@ class DahoasRewardModel(BaseRewardModel):
         super().__init__()
         DahoasRewardModel.load_weights(path=path)
         self.device = torch.device(device)
-        config = AutoConfig.from_pretrained(DahoasRewardModel.model_name)
+        config = AutoConfig.from_pretrained(
+            resolve_model_path(DahoasRewardModel.model_name)
+        )
         self.model = AutoModelForCausalLM.from_config(config).to(self.device)
         self.config = self.model.config
 
@@ -59,7 +71,9 @@ class DahoasRewardModel(BaseRewardModel):
         )
         self.transformer = self.model.transformer
         self.v_head = torch.nn.Linear(self.config.n_embd, 1, bias=False).to(self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained("EleutherAI/gpt-j-6b")
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            resolve_model_path(DahoasRewardModel.model_name)
+        )
         self.tokenizer.pad_token = self.tokenizer.eos_token
         self.PAD_ID = self.tokenizer(self.tokenizer.pad_token)["input_ids"][0]
 
@@ -21,6 +21,8 @@ import torch.nn.functional as F
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from .batch import CompletionBatch
+from prompting.validators.bundle import resolve_model_path
 from transformers import AutoTokenizer, AutoModel
 from dataclasses import dataclass
 from torchmetrics.functional import pairwise_cosine_similarity
@@ -56,6 +58,8 @@ class DiversityRewardEvent(BaseRewardEvent):
 
 class DiversityRewardModel(BaseRewardModel):
     diversity_model_path = "sentence-transformers/all-mpnet-base-v2"
+    # Range of the historic embeddings compared to, the most recent are kept up to the end of the range.
+    history_range = (500, 15500)
 
     @property
     def name(self) -> str:
@@ -65,41 +69,49 @@ class DiversityRewardModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            DiversityRewardModel.diversity_model_path
+            resolve_model_path(DiversityRewardModel.diversity_model_path)
         )
         self.model = AutoModel.from_pretrained(
-            DiversityRewardModel.diversity_model_path
+            resolve_model_path(DiversityRewardModel.diversity_model_path)
         ).to(self.device)
         self.reward_bottom_k = 2
         self.history_reward_bottom_k = 2
         self.historic_embeddings = torch.tensor([]).to(self.device)
-        self.history_range = (500, 15500)
+        # Number of embeddings ever added to the history, used to checkpoint only the new ones.
+        self.historic_count = 0
         self.boundary = 0.2
 
-    def get_embeddings(self, sentences: List[str]) -> "torch.FloatTensor":
-        """Runs a forward pass through the model.
+    def get_embeddings(
+        self, sentences: Union[List[str], CompletionBatch]
+    ) -> "torch.FloatTensor":
+        """Runs a forward pass through the model, in buckets of sentences of similar length.
         Args:
-            sentences (:obj:`List[str]`):
-                text message to be encoded.
+            sentences (:obj:`List[str]` or :obj:`CompletionBatch`):
+                text messages to be encoded.
         Returns:
             embedding (:obj:`torch.FloatTensor`):
-                Embedding for the message.
+                Embedding for each message.
         """
-        # Tokenizing sentences
+        if not isinstance(sentences, CompletionBatch):
+            sentences = CompletionBatch("", sentences)
 
-        encoded_input = self.tokenizer(
-            sentences,
-            padding=True,
-            truncation=True,
-            return_tensors="pt",
-        ).to(self.device)
+        sentence_embeddings = None
+        for indices, encoded_input in sentences.padded_buckets(
+            self.tokenizer, truncation=True
+        ):
+            encoded_input = encoded_input.to(self.device)
 
-        # Compute token embedding
-        with torch.no_grad():
-            embeddings = self.model(**encoded_input)
+            # Compute token embedding
+            with torch.no_grad():
+                embeddings = self.model(**encoded_input)
 
-        # Pooling
-        sentence_embeddings = mean_pooling(embeddings, encoded_input["attention_mask"])
+            # Pooling
+            pooled = mean_pooling(embeddings, encoded_input["attention_mask"])
+            if sentence_embeddings is None:
+                sentence_embeddings = pooled.new_empty(
+                    (len(sentences), pooled.shape[1])
+                )
+            sentence_embeddings[indices] = pooled
 
         # Normalizing
         sentence_embeddings = F.normalize(sentence_embeddings, p=2, dim=1)
@@ -116,6 +128,7 @@ class DiversityRewardModel(BaseRewardModel):
             return torch.stack(unique_embeddings)
 
         embeddings_unique = unique(embeddings)
+        self.historic_count += len(embeddings_unique)
         historic_embeddings = torch.cat([self.historic_embeddings, embeddings_unique])
         self.historic_embeddings = historic_embeddings[-self.history_range[1] :, :]
 
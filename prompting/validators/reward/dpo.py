@@ -21,6 +21,8 @@ import bittensor as bt
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from .batch import CompletionBatch
+from prompting.validators.bundle import resolve_model_path
 from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
@@ -40,17 +42,23 @@ class DirectPreferenceRewardModel(BaseRewardModel):
         self.device = device
         self.penalty = 1.2  # Same penalty as the original [paper](https://arxiv.org/pdf/1909.05858.pdf).
         self.tokenizer = AutoTokenizer.from_pretrained(
-            DirectPreferenceRewardModel.reward_model_name
+            resolve_model_path(DirectPreferenceRewardModel.reward_model_name)
         )
         self.model = AutoModelForCausalLM.from_pretrained(
-            DirectPreferenceRewardModel.reward_model_name,
+            resolve_model_path(DirectPreferenceRewardModel.reward_model_name),
             trust_remote_code=True,
             torch_dtype=torch.float16,
         ).to(self.device)
         self.ngram_logit_processor = NoRepeatNGramLogitsProcessor(ngram_size=5)
 
     def reward_single(
-        self, prompt: str, completion: str, name: str, with_penalty=True
+        self,
+        prompt: str,
+        completion: str,
+        name: str,
+        with_penalty=True,
+        combined_ids: List[int] = None,
+        prompt_ids: List[int] = None,
     ) -> BaseRewardEvent:
         r"""Calculates a direct preference optimization (DPO) style reward for a completion,
         which is a reference model's average log-probability for completion tokens given a prompt.
@@ -66,16 +74,14 @@ class DirectPreferenceRewardModel(BaseRewardModel):
                 reward_event.reward = -11.0
                 return reward_event
 
-            # Tokenize the combined prompt + completion.
-            combined = (
-                self.tokenizer(prompt + completion, return_tensors="pt")
-                .input_ids[0]
-                .to(self.device)
-            )  # [seq_len]
+            # Tokenize the combined prompt + completion, unless already tokenized.
+            if combined_ids is None:
+                combined_ids = self.tokenizer(prompt + completion).input_ids
+            combined = torch.tensor(combined_ids, device=self.device)  # [seq_len]
             # Tokenize only the prompt, to help determine prompt token length.
-            prompt_part = (
-                self.tokenizer(prompt, return_tensors="pt").input_ids[0].to(self.device)
-            )  # [prompt_len]
+            if prompt_ids is None:
+                prompt_ids = self.tokenizer(prompt).input_ids
+            prompt_part = torch.tensor(prompt_ids, device=self.device)  # [prompt_len]
 
             # Completion doesn't fit into model sequence, so return lowest reward.
             if self.tokenizer.model_max_length <= len(prompt_part):
@@ -138,9 +144,22 @@ class DirectPreferenceRewardModel(BaseRewardModel):
     def get_rewards(
         self, prompt: str, completions: List[str], name: str
     ) -> List[BaseRewardEvent]:
-        # Get all the reward results.
+        if not isinstance(completions, CompletionBatch):
+            completions = CompletionBatch(prompt, completions)
+
+        # Get all the reward results, tokenizing the prompt and completions once in a batch.
+        prompt_ids = completions.prompt_token_ids(self.tokenizer)
         reward_events = [
-            self.reward_single(prompt, completion, name) for completion in completions
+            self.reward_single(
+                prompt,
+                completion,
+                name,
+                combined_ids=combined_ids,
+                prompt_ids=prompt_ids,
+            )
+            for completion, combined_ids in zip(
+                completions, completions.token_ids(self.tokenizer, prefix=prompt)
+            )
         ]
 
         bt.logging.trace(
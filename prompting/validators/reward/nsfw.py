@@ -20,6 +20,8 @@ import torch
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from .batch import CompletionBatch
+from prompting.validators.bundle import resolve_model_path
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from dataclasses import dataclass
 
@@ -40,19 +42,22 @@ class NSFWRewardModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            NSFWRewardModel.nsfw_filter_model_path
+            resolve_model_path(NSFWRewardModel.nsfw_filter_model_path)
         )
         self.model = AutoModelForSequenceClassification.from_pretrained(
-            NSFWRewardModel.nsfw_filter_model_path
+            resolve_model_path(NSFWRewardModel.nsfw_filter_model_path)
         ).to(self.device)
 
-    def reward(self, prompt: str, completion: str, name: str) -> NSFWRewardEvent:
+    def reward(
+        self, prompt: str, completion: str, name: str, input_ids: List[int] = None
+    ) -> NSFWRewardEvent:
         reward_event = NSFWRewardEvent()
 
         boundary = -0.5
         with torch.no_grad():
             message = completion
-            input_ids = self.tokenizer(message)["input_ids"]
+            if input_ids is None:
+                input_ids = self.tokenizer(message)["input_ids"]
 
             # Returns the nsfw hate score for the chunk.
             def hate_score(chunk) -> float:
@@ -79,9 +84,15 @@ class NSFWRewardModel(BaseRewardModel):
     def get_rewards(
         self, prompt: str, completions: List[str], name: str
     ) -> List[NSFWRewardEvent]:
-        # Get all the reward results.
+        if not isinstance(completions, CompletionBatch):
+            completions = CompletionBatch(prompt, completions)
+
+        # Get all the reward results, tokenizing the completions in one batch.
         reward_events = [
-            self.reward(prompt, completion, name) for completion in completions
+            self.reward(prompt, completion, name, input_ids=input_ids)
+            for completion, input_ids in zip(
+                completions, completions.token_ids(self.tokenizer)
+            )
         ]
 
         return reward_events
@@ -20,6 +20,7 @@ import torch
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from prompting.validators.bundle import resolve_model_path
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
 
@@ -34,10 +35,10 @@ class OpenAssistantRewardModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            OpenAssistantRewardModel.reward_model_name
+            resolve_model_path(OpenAssistantRewardModel.reward_model_name)
         )
         self.model = AutoModelForSequenceClassification.from_pretrained(
-            OpenAssistantRewardModel.reward_model_name
+            resolve_model_path(OpenAssistantRewardModel.reward_model_name)
         ).to(self.device)
 
     def reward_single(self, prompt: str, completion: str, name: str) -> BaseRewardEvent:
@@ -22,6 +22,7 @@ import bittensor as bt
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from prompting.validators.bundle import resolve_model_path
 from prompting.validators.prompts import AugmentPrompt, FollowupPrompt, AnswerPrompt
 from transformers import AutoTokenizer, AutoModelForCausalLM
 
@@ -40,14 +41,15 @@ class PromptRewardModel(BaseRewardModel):
         # https://huggingface.co/VMware/open-llama-7b-open-instruct
         # Fast tokenizer results in incorrect encoding, set the use_fast = False parameter.
         self.tokenizer = AutoTokenizer.from_pretrained(
-            PromptRewardModel.reward_model_name, use_fast=False
+            resolve_model_path(PromptRewardModel.reward_model_name), use_fast=False
         )
         # Generative default expects most recent token on right-hand side with padding on left.
         # https://github.com/huggingface/transformers/pull/10552
         self.tokenizer.padding_side = "left"
 
         self.model = AutoModelForCausalLM.from_pretrained(
-            PromptRewardModel.reward_model_name, torch_dtype=torch.float16
+            resolve_model_path(PromptRewardModel.reward_model_name),
+            torch_dtype=torch.float16,
         ).to(self.device)
 
     def reward(self, prompt: str, completion: str, name: str) -> BaseRewardEvent:
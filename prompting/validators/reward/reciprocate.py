@@ -17,9 +17,11 @@
 # DEALINGS IN THE SOFTWARE.
 
 import torch
-from typing import List, Union
+from typing import List, Tuple, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from .batch import CompletionBatch
+from prompting.validators.bundle import resolve_model_path
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
 
@@ -35,35 +37,60 @@ class ReciprocateRewardModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            ReciprocateRewardModel.reward_model_path,
+            resolve_model_path(
+                ReciprocateRewardModel.reward_model_path,
+                ReciprocateRewardModel.revision,
+            ),
             revision=ReciprocateRewardModel.revision,
         )
         self.model = AutoModelForSequenceClassification.from_pretrained(
-            ReciprocateRewardModel.reward_model_path,
+            resolve_model_path(
+                ReciprocateRewardModel.reward_model_path,
+                ReciprocateRewardModel.revision,
+            ),
             revision=ReciprocateRewardModel.revision,
             torch_dtype=torch.float16,
         ).to(self.device)
 
-    def reward(self, prompt: str, completion: str, name: str) -> BaseRewardEvent:
+    @staticmethod
+    def template(prompt: str) -> Tuple[str, str]:
+        """Returns the text surrounding the completion in the message scored by the model."""
+        return f"<|prompter|>{prompt}</s><|assistant|>", "</s><|endoftext|>"
+
+    def reward(
+        self, prompt: str, completion: str, name: str, input_ids: List[int] = None
+    ) -> BaseRewardEvent:
         reward_event = BaseRewardEvent()
         with torch.no_grad():
-            message = (
-                f"<|prompter|>{prompt}</s><|assistant|>{completion}</s><|endoftext|>"
+            if input_ids is None:
+                prefix, suffix = self.template(prompt)
+                input_ids = self.tokenizer(
+                    prefix + completion + suffix, truncation=True
+                ).input_ids
+            input_ids = torch.tensor([input_ids], device=self.device)
+            reward_event.reward = float(
+                self.model(
+                    input_ids=input_ids, attention_mask=torch.ones_like(input_ids)
+                )[0].item()
             )
-            inputs = self.tokenizer(
-                message,
-                return_tensors="pt",
-                truncation=True,
-            ).to(self.device)
-            reward_event.reward = float(self.model(**inputs)[0].item())
             return reward_event
 
     def get_rewards(
         self, prompt: str, completions: List[str], name: str
     ) -> List[BaseRewardEvent]:
-        # Get all the reward results.
+        if not isinstance(completions, CompletionBatch):
+            completions = CompletionBatch(prompt, completions)
+
+        # Get all the reward results, tokenizing the messages in one batch.
+        prefix, suffix = self.template(prompt)
         reward_events = [
-            self.reward(prompt, completion, name) for completion in completions
+            self.reward(prompt, completion, name, input_ids=input_ids)
+            for completion, input_ids in zip(
+                completions,
+                completions.token_ids(
+                    self.tokenizer, prefix=prefix, suffix=suffix, truncation=True
+                ),
+            )
         ]
 
         return reward_events
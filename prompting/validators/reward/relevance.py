@@ -20,6 +20,8 @@ import torch
 from typing import List, Union
 from .config import RewardModelType
 from .reward import BaseRewardModel, BaseRewardEvent
+from .batch import CompletionBatch, length_buckets, pad_token_ids
+from prompting.validators.bundle import resolve_model_path
 from transformers import AutoTokenizer, AutoModel
 from torchmetrics.functional import pairwise_cosine_similarity
 import torch.nn.functional as F
@@ -71,34 +73,33 @@ class RelevanceRewardModel(BaseRewardModel):
     def get_rewards(
         self, prompt: str, completions: List[str], name: str
     ) -> List[RelevanceRewardEvent]:
-        # Get all the reward results.
-        reward_events = [
-            self.reward(prompt, completion, name) for completion in completions
-        ]
-        return reward_events
-
-    def normalize_rewards(self, rewards: torch.FloatTensor) -> torch.FloatTensor:
-        return rewards
-
-    def reward(self, prompt: str, completion: str, name: str) -> RelevanceRewardEvent:
-        reward_event = RelevanceRewardEvent()
+        if not isinstance(completions, CompletionBatch):
+            completions = CompletionBatch(prompt, completions)
 
+        reward_events = [RelevanceRewardEvent() for _ in completions]
         for i, model in enumerate(self.models):
             # rewards
-            diff = model.reward(prompt, completion)
+            diffs = model.batch_reward(completions)
 
-            # If a model returns 0, stop iterating and return 0
-            if diff < self.bounds[i]:
-                reward_event.reward = 0
+            for reward_event, diff in zip(reward_events, diffs):
+                # If a model returns 0, stop iterating and return 0
+                if diff < self.bounds[i]:
+                    reward_event.reward = 0
 
-            if model.name == "relevance_bert":
-                reward_event.bert_score = diff
+                if model.name == "relevance_bert":
+                    reward_event.bert_score = diff
 
-            elif model.name == "relevance_mpnet":
-                reward_event.mpnet_score = diff
+                elif model.name == "relevance_mpnet":
+                    reward_event.mpnet_score = diff
 
         # If none of the models returned 0, return 1
-        return reward_event
+        return reward_events
+
+    def normalize_rewards(self, rewards: torch.FloatTensor) -> torch.FloatTensor:
+        return rewards
+
+    def reward(self, prompt: str, completion: str, name: str) -> RelevanceRewardEvent:
+        return self.get_rewards(prompt, [completion], name)[0]
 
 
 class BertRelevanceRewardModel(BaseRewardModel):
@@ -112,10 +113,10 @@ class BertRelevanceRewardModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            BertRelevanceRewardModel.relevance_model_path
+            resolve_model_path(BertRelevanceRewardModel.relevance_model_path)
         )
         self.model = AutoModel.from_pretrained(
-            BertRelevanceRewardModel.relevance_model_path
+            resolve_model_path(BertRelevanceRewardModel.relevance_model_path)
         ).to(self.device)
 
     def get_embedding(self, message: str) -> "torch.FloatTensor":
@@ -148,6 +149,69 @@ class BertRelevanceRewardModel(BaseRewardModel):
         batch_representation = torch.mean(sentence_embeddings, dim=0)
         return batch_representation
 
+    def get_batch_embeddings(
+        self, completions: CompletionBatch, bucket_size: int = 16
+    ) -> "torch.FloatTensor":
+        """Embeds each completion as the mean of the embeddings of its chunks of at most `model_max_length` tokens,
+        like `get_embedding`, running the chunks of all completions in buckets of similar length.
+        """
+        max_tokens = (
+            self.tokenizer.model_max_length - self.tokenizer.num_special_tokens_to_add()
+        )
+        chunks, owners = [], []
+        for owner, token_ids in enumerate(
+            completions.token_ids(self.tokenizer, add_special_tokens=False)
+        ):
+            for start in range(0, max(len(token_ids), 1), max_tokens):
+                chunks.append(
+                    self.tokenizer.build_inputs_with_special_tokens(
+                        token_ids[start : start + max_tokens]
+                    )
+                )
+                owners.append(owner)
+
+        batch_representation = None
+        for indices in length_buckets([len(chunk) for chunk in chunks], bucket_size):
+            encoded_input = pad_token_ids(
+                self.tokenizer, [chunks[idx] for idx in indices]
+            ).to(self.device)
+
+            with torch.no_grad():
+                embeddings = self.model(**encoded_input)
+
+            sentence_embeddings = mean_pooling(
+                embeddings, encoded_input["attention_mask"]
+            )
+            sentence_embeddings = torch.nn.functional.normalize(
+                sentence_embeddings, p=2, dim=1
+            )
+            if batch_representation is None:
+                batch_representation = sentence_embeddings.new_zeros(
+                    (len(completions), sentence_embeddings.shape[1])
+                )
+            batch_representation.index_add_(
+                0,
+                torch.tensor([owners[idx] for idx in indices], device=self.device),
+                sentence_embeddings,
+            )
+
+        # Average the chunk embeddings of each completion.
+        counts = torch.bincount(torch.tensor(owners), minlength=len(completions))
+        return batch_representation / counts.unsqueeze(1).to(batch_representation)
+
+    def batch_reward(self, completions: CompletionBatch) -> List[float]:
+        if len(completions) == 0:
+            return []
+
+        completion_embeddings = self.get_batch_embeddings(completions)
+        prompt_embedding = self.get_embedding(completions.prompt)
+
+        # Calculate the RMSE distance between each completion and the prompt embedding.
+        diffs = ((completion_embeddings - prompt_embedding) ** 2).mean(dim=1) ** 0.5
+
+        # Return relevance scoring.
+        return (-diffs).tolist()
+
     def reward(self, prompt: str, completion: str) -> float:
         # Get the two bert embeddings.
         completion_embedding = self.get_embedding(completion)
@@ -171,10 +235,10 @@ class MpnetRelevenceModel(BaseRewardModel):
         super().__init__()
         self.device = device
         self.tokenizer = AutoTokenizer.from_pretrained(
-            MpnetRelevenceModel.diversity_model_path
+            resolve_model_path(MpnetRelevenceModel.diversity_model_path)
         )
         self.model = AutoModel.from_pretrained(
-            MpnetRelevenceModel.diversity_model_path
+            resolve_model_path(MpnetRelevenceModel.diversity_model_path)
         ).to(self.device)
         self.reward_quantile = torch.tensor(0.1).to(self.device)
 
@@ -207,6 +271,30 @@ class MpnetRelevenceModel(BaseRewardModel):
         sentence_embeddings = F.normalize(sentence_embeddings, p=2, dim=1)
         return sentence_embeddings
 
+    def batch_reward(self, completions: CompletionBatch) -> List[float]:
+        if len(completions) == 0:
+            return []
+
+        # Get embeddings for all completions, in buckets of similar length.
+        embeddings = None
+        for indices, encoded_input in completions.padded_buckets(
+            self.tokenizer, truncation=True
+        ):
+            encoded_input = encoded_input.to(self.device)
+            with torch.no_grad():
+                output = self.model(**encoded_input)
+            pooled = mean_pooling(output, encoded_input["attention_mask"])
+            if embeddings is None:
+                embeddings = pooled.new_empty((len(completions), pooled.shape[1]))
+            embeddings[indices] = pooled
+        embeddings = F.normalize(embeddings, p=2, dim=1)
+        prompt_embed = self.get_embeddings(completions.prompt)
+
+        # Calculate the pairwise cosine similarity.
+        similarity = pairwise_cosine_similarity(prompt_embed, embeddings)
+
+        return torch.abs(similarity)[0].tolist()
+
     def reward(self, prompt: str, completion: str) -> torch.FloatTensor:
         # Get embeddings for all completions.
         embeddings = self.get_embeddings(completion)
@@ -21,6 +21,7 @@ import bittensor as bt
 from typing import List, Union
 from abc import abstractmethod
 from dataclasses import dataclass, asdict, fields
+from .batch import CompletionBatch
 
 
 @dataclass
@@ -121,25 +122,24 @@ class BaseRewardModel:
         return rewards
 
     def apply(
-        self, prompt: str, responses: List[bt.Synapse], name: str
+        self,
+        prompt: str,
+        responses: List[bt.Synapse],
+        name: str,
+        batch: CompletionBatch = None,
     ) -> Union[torch.FloatTensor, dict]:
-        """Applies the reward model across each call. Unsuccessful responses are zeroed."""
-        # Get indices of correctly responding calls.
-
-        successful_completions_indices: List[int] = [
-            idx
-            for idx, resp in enumerate(responses)
-            if resp.dendrite.status_code == 200
-        ]
+        """Applies the reward model across each call. Unsuccessful responses are zeroed.
+        The completions of the successful responses are passed in `batch` when shared with other reward models.
+        """
+        if batch is None:
+            batch = CompletionBatch.from_responses(prompt, responses)
 
-        # Get all completions from responding calls.
-        successful_completions: List[str] = [
-            responses[idx].completion.strip() for idx in successful_completions_indices
-        ]
+        # Get indices of correctly responding calls.
+        successful_completions_indices: List[int] = batch.indices
 
         # Reward each completion.
         reward_events = BaseRewardEvent.parse_reward_events(
-            self.get_rewards(prompt, successful_completions, name)
+            self.get_rewards(prompt, batch, name)
         )
         successful_rewards = torch.tensor(
             reward_events.pop("reward"), dtype=torch.float32
@@ -0,0 +1,178 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import torch
+import random
+import bittensor as bt
+from typing import List, Union
+from torch.distributions import Beta
+from prompting.validators.metagraph_sync import replaced_uids
+
+
+class UidSampler:
+    """
+    Reliability-aware uid sampler which prefers miners that answer successfully and quickly.
+
+    Each uid keeps a discounted count of successful and failed queries, which defines a Beta posterior over its
+    success probability, and an exponential moving average of its latency as a fraction of the query timeout.
+    Sampling draws from the posteriors (Thompson sampling), discounts the draws by the latency estimate and takes
+    the top scoring uids. A small fraction of every sample, set by `exploration`, is drawn uniformly from the
+    remaining candidates so that uids which have been failing are still re-probed from time to time.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        exploration: float = 0.1,
+        decay: float = 0.99,
+        latency_weight: float = 0.1,
+        latency_alpha: float = 0.1,
+    ):
+        """
+        Args:
+            n (int): Number of uids in the metagraph.
+            exploration (float, optional): Fraction of each sample reserved for uniform re-probing. Defaults to 0.1.
+            decay (float, optional): Discount applied to all success/failure counts on every update, so that
+                old observations are slowly forgotten. Defaults to 0.99.
+            latency_weight (float, optional): How much a latency equal to the full timeout lowers a uid score.
+                Defaults to 0.1.
+            latency_alpha (float, optional): Moving average factor of the latency estimate. Defaults to 0.1.
+        """
+        self.exploration = exploration
+        self.decay = decay
+        self.latency_weight = latency_weight
+        self.latency_alpha = latency_alpha
+
+        self.successes = torch.zeros(n, dtype=torch.float32)
+        self.failures = torch.zeros(n, dtype=torch.float32)
+        self.latencies = torch.zeros(n, dtype=torch.float32)
+        self.queries = torch.zeros(n, dtype=torch.long)
+
+    def __len__(self) -> int:
+        return len(self.successes)
+
+    def scores(self, uids: List[int]) -> torch.FloatTensor:
+        """Draws a latency-discounted success probability for each uid from its posterior.
+        Args:
+            uids (List[int]): uids to score.
+        Returns:
+            scores (torch.FloatTensor): Sampled score for each uid, in the same order.
+        """
+        index = torch.tensor(uids, dtype=torch.long)
+        theta = Beta(1 + self.successes[index], 1 + self.failures[index]).sample()
+        return theta * (1 - self.latency_weight * self.latencies[index])
+
+    def sample(self, uids: List[int], k: int) -> List[int]:
+        """Samples k uids from the candidate uids.
+        Args:
+            uids (List[int]): Candidate uids to sample from.
+            k (int): Number of uids to return.
+        Returns:
+            sampled_uids (List[int]): The sampled uids, exploited uids first followed by re-probed uids.
+        Notes:
+            If `k` is larger than the number of candidate `uids`, all candidates are returned.
+        """
+        k = min(k, len(uids))
+        if k == 0:
+            return []
+
+        num_probe = min(k, math.floor(k * self.exploration))
+        num_exploit = k - num_probe
+
+        # Exploit: take the uids with the best posterior draws.
+        exploit_uids = []
+        if num_exploit > 0:
+            top_k = self.scores(uids).topk(num_exploit).indices.tolist()
+            exploit_uids = [uids[idx] for idx in top_k]
+
+        # Explore: re-probe uniformly among the candidates which were not selected.
+        selected = set(exploit_uids)
+        remaining_uids = [uid for uid in uids if uid not in selected]
+        probe_uids = random.sample(remaining_uids, num_probe)
+
+        return exploit_uids + probe_uids
+
+    def update(
+        self,
+        uids: List[int],
+        status_codes: List[str],
+        process_times: List[float],
+        timeout: float,
+    ):
+        """Updates the per uid statistics with the outcome of a query.
+        Args:
+            uids (List[int]): Queried uids.
+            status_codes (List[str]): Dendrite status code of each response.
+            process_times (List[float]): Dendrite process time of each response.
+            timeout (float): Timeout used for the query, used to normalize the latencies.
+        """
+        index = torch.tensor(uids, dtype=torch.long)
+        success = torch.tensor(
+            [str(code) == "200" for code in status_codes], dtype=torch.bool
+        )
+        latency = torch.tensor(
+            [min(float(t or 0) / timeout, 1.0) for t in process_times],
+            dtype=torch.float32,
+        )
+
+        # Discount old observations so that miners which recover are picked up again.
+        self.successes.mul_(self.decay)
+        self.failures.mul_(self.decay)
+
+        self.successes.index_add_(0, index, success.float())
+        self.failures.index_add_(0, index, (~success).float())
+        self.queries.index_add_(0, index, torch.ones_like(index))
+
+        # Only successful responses carry a meaningful process time.
+        successful_index = index[success]
+        self.latencies[successful_index] = (
+            self.latency_alpha * latency[success]
+            + (1 - self.latency_alpha) * self.latencies[successful_index]
+        )
+
+    def reset(self, uid: Union[int, torch.LongTensor]):
+        """Forgets all statistics of a uid or a tensor of uids, e.g. when their hotkey has been replaced."""
+        self.successes[uid] = 0
+        self.failures[uid] = 0
+        self.latencies[uid] = 0
+        self.queries[uid] = 0
+
+    def resize(self, n: int):
+        """Resizes the statistics to n uids, keeping the statistics of existing uids."""
+        min_len = min(n, len(self))
+        for attr in ("successes", "failures", "latencies", "queries"):
+            values = getattr(self, attr)
+            resized = torch.zeros(n, dtype=values.dtype)
+            resized[:min_len] = values[:min_len]
+            setattr(self, attr, resized)
+
+    def resync(
+        self,
+        previous_metagraph: "bt.metagraph.Metagraph",
+        metagraph: "bt.metagraph.Metagraph",
+    ):
+        """Resync the sampler with the latest state of the network
+        Args:
+            previous_metagraph (:obj: bt.metagraph.Metagraph):
+                Previous state of metagraph before updated resync
+            metagraph (:obj: bt.metagraph.Metagraph):
+                Latest state of the metagraph with updated uids and hotkeys
+        """
+        self.resize(len(metagraph.hotkeys))
+        self.reset(replaced_uids(previous_metagraph.hotkeys, metagraph.hotkeys))
@@ -0,0 +1,156 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+import torch
+from typing import Dict, List, Optional, Union
+from prompting.validators.metagraph_sync import replaced_uids
+
+
+class Scoreboard:
+    """
+    Per-uid moving average of the rewards, together with query, success and latency statistics.
+
+    The statistics are kept in preallocated tensors of the metagraph size. Each step only updates the uids it
+    queried, in place, instead of scattering the rewards into a tensor of the metagraph size and computing the moving
+    average of every uid. Updates, resizes and snapshots take a lock, so that concurrent forwards and the weight
+    setting never observe a partially updated scoreboard.
+    """
+
+    fields = ("scores", "queries", "successes", "latencies")
+
+    def __init__(
+        self,
+        n: int,
+        alpha: float = 0.05,
+        latency_alpha: float = 0.1,
+        device: Union[str, torch.device] = "cpu",
+    ):
+        """
+        Args:
+            n (int): Number of uids in the metagraph.
+            alpha (float, optional): Moving average factor of the scores, how much to add of a new reward.
+                Defaults to 0.05.
+            latency_alpha (float, optional): Moving average factor of the latencies. Defaults to 0.1.
+            device (Union[str, torch.device], optional): Device of the statistics. Defaults to "cpu".
+        """
+        self.alpha = alpha
+        self.latency_alpha = latency_alpha
+        self.device = torch.device(device)
+        self.lock = threading.Lock()
+
+        self.scores = torch.zeros(n, dtype=torch.float32, device=self.device)
+        self.queries = torch.zeros(n, dtype=torch.long, device=self.device)
+        self.successes = torch.zeros(n, dtype=torch.long, device=self.device)
+        self.latencies = torch.zeros(n, dtype=torch.float32, device=self.device)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def update(
+        self,
+        uids: torch.LongTensor,
+        rewards: torch.FloatTensor,
+        success: Optional[torch.BoolTensor] = None,
+        latency: Optional[torch.FloatTensor] = None,
+    ):
+        """Adds the rewards of the queried uids to their moving average and updates their statistics.
+        Args:
+            uids (torch.LongTensor): Queried uids, without duplicates.
+            rewards (torch.FloatTensor): Reward of each uid.
+            success (torch.BoolTensor, optional): Whether each uid answered successfully. Defaults to all.
+            latency (torch.FloatTensor, optional): Process time of each uid, in seconds.
+        """
+        index = uids.to(self.device, torch.long)
+        rewards = rewards.to(self.device, torch.float32)
+        success = (
+            torch.ones_like(index, dtype=torch.bool)
+            if success is None
+            else success.to(self.device, torch.bool)
+        )
+        with self.lock:
+            self.scores[index] = (
+                self.alpha * rewards + (1 - self.alpha) * self.scores[index]
+            )
+            self.queries.index_add_(0, index, torch.ones_like(index))
+            self.successes.index_add_(0, index, success.long())
+
+            # Only successful responses carry a meaningful process time.
+            if latency is not None:
+                latency = latency.to(self.device, torch.float32)[success]
+                successful_index = index[success]
+                previous = self.latencies[successful_index]
+                self.latencies[successful_index] = torch.where(
+                    self.successes[successful_index] == 1,
+                    latency,
+                    self.latency_alpha * latency + (1 - self.latency_alpha) * previous,
+                )
+
+    def snapshot(self) -> torch.FloatTensor:
+        """Returns a copy of the moving averaged scores."""
+        with self.lock:
+            return self.scores.clone()
+
+    def success_rates(self) -> torch.FloatTensor:
+        """Returns the fraction of successful queries of each uid, 0 for uids which were not queried."""
+        with self.lock:
+            return self.successes / self.queries.clamp(min=1)
+
+    def reset(self, uid: Union[int, torch.LongTensor]):
+        """Forgets all statistics of a uid or a tensor of uids, e.g. when their hotkey has been replaced."""
+        if isinstance(uid, torch.Tensor):
+            uid = uid.to(self.device)
+        with self.lock:
+            for field in self.fields:
+                getattr(self, field)[uid] = 0
+
+    def resize(self, n: int):
+        """Resizes the statistics to n uids, keeping the statistics of existing uids."""
+        with self.lock:
+            min_len = min(n, len(self))
+            for field in self.fields:
+                values = getattr(self, field)
+                resized = torch.zeros(n, dtype=values.dtype, device=self.device)
+                resized[:min_len] = values[:min_len]
+                setattr(self, field, resized)
+
+    def resync(self, previous_hotkeys: List[str], hotkeys: List[str]):
+        """Resets the uids whose hotkey has been replaced and resizes the statistics to the new hotkeys.
+        Args:
+            previous_hotkeys (List[str]): Hotkeys the statistics were collected for.
+            hotkeys (List[str]): Hotkeys of the latest metagraph.
+        """
+        replaced = replaced_uids(previous_hotkeys, hotkeys)
+        self.resize(len(hotkeys))
+        self.reset(replaced)
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        """Returns a copy of the statistics on the cpu."""
+        with self.lock:
+            return {field: getattr(self, field).cpu().clone() for field in self.fields}
+
+    def load_state_dict(self, state_dict: Dict[str, torch.Tensor]):
+        """Loads the given statistics, for as many uids as both have. Missing statistics are left unchanged."""
+        with self.lock:
+            for field, values in state_dict.items():
+                if field not in self.fields:
+                    continue
+                target = getattr(self, field)
+                values = torch.as_tensor(values)
+                min_len = min(len(values), len(target))
+                target[:min_len] = values[:min_len].to(self.device, target.dtype)
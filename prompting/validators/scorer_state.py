@@ -0,0 +1,309 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Warm-restart state of the stateful scorers: the normalization statistics of the reward models, the n-gram
+# counter of the blacklist and the reliability statistics of the uid sampler.
+#
+# The state file starts with a magic and a json header describing the version, the metadata and the dtype, shape
+# and offset of each array. Arrays follow, aligned to 64 bytes, so they are memory mapped on load.
+import os
+import json
+import struct
+import tempfile
+import itertools
+import numpy as np
+import torch
+import bittensor as bt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from prompting.validators.metagraph_sync import replaced_uids
+
+STATE_MAGIC = b"PRSTATE\0"
+STATE_VERSION = 1
+ALIGNMENT = 64
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_state_file(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Writes the arrays and the json metadata to a temporary file renamed over the path."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    # Offsets are relative to the end of the header, aligned.
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps(
+        {"version": STATE_VERSION, "meta": meta, "arrays": entries}
+    ).encode("utf-8")
+    data_start = _aligned(len(STATE_MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(STATE_MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in arrays.items():
+                f.write(b"\0" * (data_start + entries[name]["offset"] - f.tell()))
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_state_file(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Returns the memory mapped arrays and the metadata of a state file.
+    Raises:
+        ValueError: If the file is not a state file or was written by a newer version.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(STATE_MAGIC)) != STATE_MAGIC:
+            raise ValueError(f"{path} is not a scorer state file")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    if header["version"] > STATE_VERSION:
+        raise ValueError(
+            f"{path} has version {header['version']}, newer than the supported version {STATE_VERSION}"
+        )
+    data_start = _aligned(len(STATE_MAGIC) + 8 + header_len)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        shape = tuple(entry["shape"])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=entry["dtype"])
+            continue
+        arrays[name] = np.memmap(
+            path,
+            dtype=entry["dtype"],
+            mode="r",
+            offset=data_start + entry["offset"],
+            shape=shape,
+        )
+    return arrays, header["meta"]
+
+
+def capture_reward_stats(models: List[Any], pending: Dict[str, List[float]]) -> Dict:
+    """Returns the `count`, `mean` and `var` of the normalization of each reward model by name.
+    Models still loading in the background keep the `pending` statistics they will be restored with.
+    """
+    stats = {}
+    for model in models:
+        if getattr(model, "loaded", True) is False:
+            if model.name in pending:
+                stats[model.name] = pending[model.name]
+            continue
+        if not hasattr(model, "count"):
+            continue
+        stats[model.name] = [float(model.count), float(model.mean), float(model.var)]
+    return stats
+
+
+def restore_reward_stats(models: List[Any], stats: Dict, pending: Dict):
+    """Restores the normalization statistics of the reward models, once they are loaded."""
+
+    def restore(model, values):
+        count, mean, var = values
+        model.count = int(count)
+        model.mean = torch.tensor(mean)
+        model.var = torch.tensor(var)
+        pending.pop(model.name, None)
+
+    for model in models:
+        if model.name not in stats:
+            continue
+        if getattr(model, "loaded", True) is False:
+            pending[model.name] = stats[model.name]
+            model.when_loaded(lambda m, values=stats[model.name]: restore(m, values))
+        elif hasattr(model, "count"):
+            restore(model, stats[model.name])
+
+
+def capture_blacklist(blacklist) -> Dict:
+    """Returns a copy of the counter and significance table of the blacklist. The counts are copied, since
+    `Blacklist.add` updates them in place. Copying up to `memory_lim` entries takes a while, so this runs on the
+    checkpointer thread, holding the lock the blacklist takes while it updates the counter.
+    """
+    with blacklist.lock:
+        return {
+            "counter": [
+                (ngram, tuple(count)) for ngram, count in blacklist.counter.items()
+            ],
+            "significance_scores": dict(blacklist.significance_scores),
+            "scalars": {
+                "num_ngram": blacklist.num_ngram,
+                "num_completion": blacklist.num_completion,
+                "w_current": blacklist.w_current,
+                "last_update": blacklist._last_update,
+            },
+        }
+
+
+def encode_blacklist(state: Dict) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Encodes the counter as arrays of the n-grams and their (frequency, max error) grouped by n-gram length,
+    and the significance table as utf-8 bytes with offsets."""
+    arrays = {}
+    by_length: Dict[int, List] = {}
+    for ngram, count in state["counter"]:
+        by_length.setdefault(len(ngram), []).append((ngram, count))
+    for length, items in by_length.items():
+        arrays[f"blacklist/ngrams/{length}"] = np.fromiter(
+            itertools.chain.from_iterable(ngram for ngram, _ in items),
+            dtype=np.int32,
+            count=len(items) * length,
+        ).reshape(len(items), length)
+        arrays[f"blacklist/counts/{length}"] = np.fromiter(
+            itertools.chain.from_iterable(count[:2] for _, count in items),
+            dtype=np.int64,
+            count=len(items) * 2,
+        ).reshape(len(items), 2)
+
+    phrases = [phrase.encode("utf-8") for phrase in state["significance_scores"]]
+    arrays["blacklist/significance/offsets"] = np.cumsum(
+        [0] + [len(phrase) for phrase in phrases], dtype=np.int64
+    )
+    arrays["blacklist/significance/phrases"] = np.frombuffer(
+        b"".join(phrases), dtype=np.uint8
+    )
+    arrays["blacklist/significance/scores"] = np.array(
+        list(state["significance_scores"].values()), dtype=np.float64
+    )
+    return arrays, state["scalars"]
+
+
+def restore_blacklist(blacklist, arrays: Dict[str, np.ndarray], scalars: Dict):
+    """Restores the counter and significance table of the blacklist."""
+    counter = {}
+    for name, ngrams in arrays.items():
+        if not name.startswith("blacklist/ngrams/"):
+            continue
+        counts = arrays["blacklist/counts/" + name.rsplit("/", 1)[1]]
+        counter.update(zip(map(tuple, ngrams.tolist()), counts.tolist()))
+
+    offsets = arrays["blacklist/significance/offsets"].tolist()
+    phrases = arrays["blacklist/significance/phrases"].tobytes()
+    significance_scores = {
+        phrases[start:end].decode("utf-8"): score
+        for start, end, score in zip(
+            offsets[:-1], offsets[1:], arrays["blacklist/significance/scores"].tolist()
+        )
+    }
+
+    with blacklist.lock:
+        blacklist.counter = counter
+        blacklist.significance_scores = significance_scores
+        blacklist.num_ngram = scalars["num_ngram"]
+        blacklist.num_completion = scalars["num_completion"]
+        blacklist.w_current = scalars["w_current"]
+        blacklist._last_update = scalars["last_update"]
+
+
+SAMPLER_STATS = ("successes", "failures", "latencies", "queries")
+
+
+def capture_sampler(uid_sampler, hotkeys: List[str]) -> Dict:
+    """Returns copies of the per uid statistics of the sampler and the hotkeys they belong to."""
+    return {
+        "arrays": {
+            f"sampler/{attr}": getattr(uid_sampler, attr).clone().numpy()
+            for attr in SAMPLER_STATS
+        },
+        "hotkeys": list(hotkeys),
+    }
+
+
+def restore_sampler(
+    uid_sampler, arrays: Dict[str, np.ndarray], hotkeys: List[str], metagraph
+):
+    """Restores the statistics of the sampler, forgetting uids whose hotkey has changed since they were saved."""
+    n = len(uid_sampler)
+    for attr in SAMPLER_STATS:
+        values = torch.from_numpy(np.array(arrays[f"sampler/{attr}"]))
+        restored = torch.zeros(n, dtype=getattr(uid_sampler, attr).dtype)
+        min_len = min(n, len(values))
+        restored[:min_len] = values[:min_len].to(restored.dtype)
+        setattr(uid_sampler, attr, restored)
+    replaced = replaced_uids(hotkeys, metagraph.hotkeys)
+    uid_sampler.reset(replaced[replaced < n])
+
+
+def scorer_state_path(self) -> str:
+    return os.path.join(self.config.neuron.full_path, "scorer_state.bin")
+
+
+def capture_scorer_state(self) -> Callable[[], None]:
+    """Captures the state of the scorers on the main loop and returns the function writing it, run by the
+    checkpointer."""
+    models = self.reward_functions + self.masking_functions
+    reward_stats = capture_reward_stats(models, self.pending_reward_stats)
+    # The blacklist counter is copied by the checkpointer, only the reference is taken here.
+    blacklist = self.blacklist if hasattr(self.blacklist, "counter") else None
+    sampler = capture_sampler(self.uid_sampler, self.metagraph.hotkeys)
+    path = scorer_state_path(self)
+
+    def write():
+        arrays = dict(sampler["arrays"])
+        meta = {"reward_stats": reward_stats, "sampler_hotkeys": sampler["hotkeys"]}
+        if blacklist is not None:
+            blacklist_arrays, meta["blacklist"] = encode_blacklist(
+                capture_blacklist(blacklist)
+            )
+            arrays.update(blacklist_arrays)
+        write_state_file(path, arrays, meta)
+        bt.logging.success(prefix="Saved scorer state", sufix=f"<blue>{path}</blue>")
+
+    return write
+
+
+def load_scorer_state(self):
+    """Restores the state of the scorers saved by `capture_scorer_state`, each scorer in its own thread."""
+    path = scorer_state_path(self)
+    if not os.path.exists(path):
+        return
+    arrays, meta = read_state_file(path)
+
+    jobs = [
+        lambda: restore_reward_stats(
+            self.reward_functions + self.masking_functions,
+            meta.get("reward_stats", {}),
+            self.pending_reward_stats,
+        ),
+        lambda: restore_sampler(
+            self.uid_sampler, arrays, meta.get("sampler_hotkeys", []), self.metagraph
+        ),
+    ]
+    if "blacklist" in meta and hasattr(self.blacklist, "counter"):
+        jobs.append(
+            lambda: restore_blacklist(self.blacklist, arrays, meta["blacklist"])
+        )
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        for future in [executor.submit(job) for job in jobs]:
+            future.result()
+    bt.logging.success(prefix="Reloaded scorer state", sufix=f"<blue>{path}</blue>")
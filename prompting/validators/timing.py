@@ -0,0 +1,137 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import functools
+from contextlib import nullcontext
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable
+
+
+class _Stage:
+    """Context manager measuring one execution of a stage."""
+
+    __slots__ = ("timer", "name", "timings", "wall_start", "cpu_start")
+
+    def __init__(self, timer: "StageTimer", name: str, timings: Dict[str, float]):
+        self.timer = timer
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.wall_start
+        cpu_time = time.thread_time() - self.cpu_start
+        self.timer.record(self.name, wall_time, cpu_time, self.timings)
+        return False
+
+
+class StageTimer:
+    """
+    Lightweight timer for the stages of the validator step.
+
+    Each stage records its wall time and the cpu time of the calling thread. Note that coroutines share the event
+    loop thread, so the cpu time of a stage which awaits (e.g. the dendrite query) includes work done by other
+    concurrent forwards in the meantime. Times are written into an optional per step `timings` dictionary and kept
+    in a rolling window per stage from which percentiles are computed. When disabled, `stage` returns a shared
+    no-op context manager and nothing is recorded.
+    """
+
+    _null_stage = nullcontext()
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        window: int = 100,
+        histogram: "prompting.metrics.Histogram" = None,
+    ):
+        """
+        Args:
+            enabled (bool, optional): Whether stages are timed. Defaults to True.
+            window (int, optional): Number of most recent measurements per stage kept for percentiles. Defaults to 100.
+            histogram (prompting.metrics.Histogram, optional): Histogram with a `stage` label also receiving the
+                wall times, e.g. to export them on the metrics endpoint.
+        """
+        self.enabled = enabled
+        self.window = window
+        self.histogram = histogram
+        self.wall_times = defaultdict(lambda: deque(maxlen=self.window))
+        self.cpu_times = defaultdict(lambda: deque(maxlen=self.window))
+
+    def stage(self, name: str, timings: Dict[str, float] = None):
+        """Returns a context manager timing the stage `name`.
+        Args:
+            name (str): Name of the stage, e.g. `query` or `reward/dpo_reward_model`.
+            timings (Dict[str, float], optional): Per step dictionary receiving `name` (wall time) and
+                `name + "_cpu"` (cpu time) in seconds.
+        """
+        if not self.enabled:
+            return self._null_stage
+        return _Stage(self, name, timings)
+
+    def timed(self, name: str = None) -> Callable:
+        """Decorator timing every call of the decorated function as the stage `name` (defaults to its qualname)."""
+
+        def decorator(func: Callable) -> Callable:
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapped(*args, **kwargs):
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+
+            return wrapped
+
+        return decorator
+
+    def record(
+        self,
+        name: str,
+        wall_time: float,
+        cpu_time: float,
+        timings: Dict[str, float] = None,
+    ):
+        """Records a measurement of a stage."""
+        self.wall_times[name].append(wall_time)
+        self.cpu_times[name].append(cpu_time)
+        if self.histogram is not None:
+            self.histogram.observe(wall_time, stage=name)
+        if timings is not None:
+            timings[name] = wall_time
+            timings[name + "_cpu"] = cpu_time
+
+    def percentiles(self, qs: Iterable[int] = (50, 90, 99)) -> Dict[str, float]:
+        """Returns the rolling wall time percentiles of every stage, keyed by `name + "_p" + q`."""
+        result = {}
+        for name, values in self.wall_times.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            for q in qs:
+                index = min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))
+                result[f"{name}_p{q}"] = ordered[index]
+        return result
+
+    def reset(self):
+        """Clears all recorded measurements."""
+        self.wall_times.clear()
+        self.cpu_times.clear()
@@ -17,12 +17,18 @@
 # DEALINGS IN THE SOFTWARE.
 
 # Utils for checkpointing and saving the model.
+import os
+import math
 import torch
-import wandb
 import copy
 import bittensor as bt
 import prompting.validators as validators
-from prompting.validators.misc import ttl_get_block
+from prompting.validators.metagraph_sync import (
+    MetagraphUpdate,
+    replaced_uids,
+    sync_new_metagraph,
+)
+from prompting.validators.scorer_state import capture_scorer_state, load_scorer_state
 
 
 def should_reinit_wandb(self):
@@ -36,6 +42,8 @@ def should_reinit_wandb(self):
 
 def init_wandb(self, reinit=False):
     """Starts a new wandb run."""
+    import wandb
+
     tags = [
         self.wallet.hotkey.ss58_address,
         validators.__version__,
@@ -72,6 +80,7 @@ def init_wandb(self, reinit=False):
         tags=tags,
         notes=self.config.wandb.notes,
     )
+    self.wandb_logger.set_sink(self.wandb)
     bt.logging.success(
         prefix="Started a new wandb run",
         sufix=f"<blue> {self.wandb.name} </blue>",
@@ -80,6 +89,9 @@ def init_wandb(self, reinit=False):
 
 def reinit_wandb(self):
     """Reinitializes wandb, rolling over the run."""
+    # Log the pending records to the current run before finishing it.
+    if not self.wandb_logger.flush(timeout=60):
+        bt.logging.warning("Timed out logging pending records before wandb rollover")
     self.wandb.finish()
     init_wandb(self, reinit=True)
 
@@ -87,7 +99,7 @@ def reinit_wandb(self):
 def should_checkpoint(self):
     # Check if enough epoch blocks have elapsed since the last checkpoint.
     return (
-        ttl_get_block(self) % self.config.neuron.checkpoint_block_length
+        self.block_clock.block % self.config.neuron.checkpoint_block_length
         < self.prev_block % self.config.neuron.checkpoint_block_length
     )
 
@@ -100,43 +112,48 @@ def checkpoint(self):
 
 
 def resync_metagraph(self: "validators.neuron.neuron"):
-    """Resyncs the metagraph and updates the hotkeys and moving averages based on the new metagraph."""
-    bt.logging.info("resync_metagraph()")
+    """Resyncs the metagraph and updates the hotkeys and moving averages based on the new metagraph.
+    With a background `self.metagraph_syncer`, swaps in the latest metagraph it synced, if any, without blocking.
+    """
+    if getattr(self, "metagraph_syncer", None) is not None:
+        update = self.metagraph_syncer.pop()
+        if update is not None:
+            bt.logging.info(
+                "resync_metagraph() swapping in the background synced metagraph"
+            )
+    else:
+        bt.logging.info("resync_metagraph()")
+        metagraph = sync_new_metagraph(self.metagraph.netuid, self.subtensor)
+        update = MetagraphUpdate.diff(self.metagraph, metagraph)
 
-    # Copies state of metagraph before syncing.
-    previous_metagraph = copy.deepcopy(self.metagraph)
+    if update is not None:
+        apply_metagraph_update(self, update)
 
-    # Sync the metagraph.
-    self.metagraph.sync(subtensor=self.subtensor)
 
-    # Check if the metagraph axon info has changed.
-    metagraph_axon_info_updated = previous_metagraph.axons != self.metagraph.axons
+def apply_metagraph_update(self: "validators.neuron.neuron", update: MetagraphUpdate):
+    """Swaps in the synced metagraph, together with the moving averages, gating model and uid sampler."""
+    previous_metagraph = self.metagraph
+    self.metagraph = update.metagraph
 
-    if metagraph_axon_info_updated:
+    if update.axons_changed:
         bt.logging.info(
             "Metagraph updated, re-syncing hotkeys, dendrite pool and moving averages"
         )
 
-        # Zero out all hotkeys that have been replaced.
-        for uid, hotkey in enumerate(self.hotkeys):
-            if hotkey != self.metagraph.hotkeys[uid]:
-                self.moving_averaged_scores[uid] = 0  # hotkey has been replaced
-
-        # Check to see if the metagraph has changed size.
-        # If so, we need to add new hotkeys and moving averages.
-        if len(self.hotkeys) < len(self.metagraph.hotkeys):
-            # Update the size of the moving average scores.
-            new_moving_average = torch.zeros((self.metagraph.n)).to(self.device)
-            min_len = min(len(self.hotkeys), len(self.moving_averaged_scores))
-            new_moving_average[:min_len] = self.moving_averaged_scores[:min_len]
-            self.moving_averaged_scores = new_moving_average
+        # Reset the scores of the hotkeys that have been replaced, and add the new hotkeys.
+        self.scoreboard.resync(self.hotkeys, self.metagraph.hotkeys)
 
         # Resize the gating model.
         bt.logging.info("Re-syncing gating model")
         self.gating_model.resync(previous_metagraph, self.metagraph)
+        if self.gating_trainer is not None:
+            self.gating_trainer.resync(previous_metagraph, self.metagraph)
+
+        # Resize the uid sampler and forget replaced hotkeys.
+        self.uid_sampler.resync(previous_metagraph, self.metagraph)
 
         # Update the hotkeys.
-        self.hotkeys = copy.deepcopy(self.metagraph.hotkeys)
+        self.hotkeys = list(self.metagraph.hotkeys)
 
 
 def resync_linear_layer(
@@ -152,28 +169,23 @@ def resync_linear_layer(
          metagraph (:obj: bt.metagraph.Metagraph):
              Latest state of the metagraph with updated uids and hotkeys
     """
-    uids_hotkeys_state_dict = dict(
-        zip(previous_metagraph.uids.tolist(), previous_metagraph.hotkeys)
-    )
-    latest_uids_hotkeys_state_dict = dict(
-        zip(metagraph.uids.tolist(), metagraph.hotkeys)
-    )
-
-    updated_uids_indices = []
-    for uid, latest_hotkey in latest_uids_hotkeys_state_dict.items():
-        if uids_hotkeys_state_dict.get(uid) != latest_hotkey:
-            updated_uids_indices.append(uid)
-
-    for index in updated_uids_indices:
-        # Reinitialize the bias of the selected index of the linear layer
-        torch.nn.init.zeros_(linear_layer.bias[index])
-        # Clone the weights of the selected index of the linear layer
-        weights = linear_layer.weight[index].clone()
-        # Adds a dimension to the weights tensor to make it compatible with the xavier_uniform_ function
-        torch.nn.init.xavier_uniform_(weights.unsqueeze(0))
-        reinitialized_weights = weights.squeeze(0)
-        # Copy the reinitialized weights back to the selected index of the linear layer
-        linear_layer.weight[index].data.copy_(reinitialized_weights)
+    updated_uids_indices = replaced_uids(previous_metagraph.hotkeys, metagraph.hotkeys)
+    updated_uids_indices = updated_uids_indices[
+        updated_uids_indices < linear_layer.out_features
+    ].to(linear_layer.weight.device)
+    if len(updated_uids_indices) == 0:
+        return
+
+    with torch.no_grad():
+        # Reinitialize the bias of the selected indices of the linear layer
+        linear_layer.bias[updated_uids_indices] = 0
+        # Reinitialize the weights of each selected index as xavier_uniform_ does for a single row
+        bound = math.sqrt(6.0 / (1 + linear_layer.in_features))
+        linear_layer.weight[updated_uids_indices] = torch.empty(
+            (len(updated_uids_indices), linear_layer.in_features),
+            dtype=linear_layer.weight.dtype,
+            device=linear_layer.weight.device,
+        ).uniform_(-bound, bound)
 
 
 def check_uid_availability(
@@ -198,64 +210,103 @@ def check_uid_availability(
     return True
 
 
+def gating_linear_layer_path(directory: str, model_name: str) -> str:
+    """Returns the path the linear layer of the gating model with the given encoder is saved to."""
+    return os.path.join(
+        directory, f"{model_name.replace('/', '_')}_gating_linear_layer.pth"
+    )
+
+
 def save_state(self):
-    r"""Save hotkeys, gating model, neuron model and moving average scores to filesystem."""
+    r"""Snapshot hotkeys, gating model, neuron model and moving average scores, written to filesystem by the checkpointer."""
     bt.logging.info("save_state()")
+    from prompting.validators.checkpoint import Snapshot
+
+    snapshot = Snapshot()
     try:
         neuron_state_dict = {
-            "neuron_weights": self.moving_averaged_scores.to("cpu").tolist(),
-            "neuron_hotkeys": self.hotkeys,
+            "neuron_weights": self.scoreboard.snapshot().to("cpu").tolist(),
+            "neuron_hotkeys": list(self.hotkeys),
         }
-        torch.save(neuron_state_dict, f"{self.config.neuron.full_path}/model.torch")
-        bt.logging.success(
-            prefix="Saved model",
-            sufix=f"<blue>{ self.config.neuron.full_path }/model.torch</blue>",
+        model_file_path = f"{self.config.neuron.full_path}/model.torch"
+        snapshot.files[model_file_path] = {
+            **neuron_state_dict,
+            "neuron_scoreboard": self.scoreboard.state_dict(),
+        }
+        snapshot.callbacks.append(
+            lambda: bt.logging.success(
+                prefix="Saved model", sufix=f"<blue>{model_file_path}</blue>"
+            )
         )
     except Exception as e:
         bt.logging.warning(f"Failed to save model with error: {e}")
 
     try:
-        # Save the gating model.
-        gating_model_linear_layer_dict = self.gating_model.linear.state_dict()
+        # Save the gating model, cloned so the trainer can keep updating it while it is written.
+        gating_model_linear_layer_dict = {
+            name: tensor.detach().clone()
+            for name, tensor in self.gating_model.linear.state_dict().items()
+        }
         gating_model_name = self.config.gating.model_name.replace("/", "_")
-        gating_model_file_path = f"{self.config.neuron.full_path}/{gating_model_name}_gating_linear_layer.pth"
-        torch.save(gating_model_linear_layer_dict, gating_model_file_path)
+        gating_model_file_path = gating_linear_layer_path(
+            self.config.neuron.full_path, self.config.gating.model_name
+        )
+        snapshot.files[gating_model_file_path] = gating_model_linear_layer_dict
 
         if not self.config.wandb.off:
-            wandb.log(
-                {"step": self.step, "block": ttl_get_block(self), **neuron_state_dict}
+            self.wandb_logger.log(
+                {
+                    "step": self.step,
+                    "block": self.block_clock.block,
+                    **neuron_state_dict,
+                }
             )
         if not self.config.wandb.off and self.config.wandb.track_gating_model:
-            model_artifact = wandb.Artifact(
-                f"{gating_model_name}_gating_linear_layer", type="model"
-            )
-            model_artifact.add_file(gating_model_file_path)
-            self.wandb.log_artifact(model_artifact)
 
-        bt.logging.success(
-            prefix="Saved gating model", sufix=f"<blue>{gating_model_file_path}</blue>"
+            def log_gating_model_artifact():
+                import wandb
+
+                model_artifact = wandb.Artifact(
+                    f"{gating_model_name}_gating_linear_layer", type="model"
+                )
+                model_artifact.add_file(gating_model_file_path)
+                self.wandb_logger.log_artifact(model_artifact)
+
+            snapshot.callbacks.append(log_gating_model_artifact)
+
+        snapshot.callbacks.append(
+            lambda: bt.logging.success(
+                prefix="Saved gating model",
+                sufix=f"<blue>{gating_model_file_path}</blue>",
+            )
         )
     except Exception as e:
         bt.logging.warning(f"Failed to save gating model with error: {e}")
 
     try:
-        # Save diversity model.
-        diversity_model_dict = {
-            "historic_embeddings": self.diversity_model.historic_embeddings.to("cpu")
-        }
-        diversity_model_file_path = (
-            f"{self.config.neuron.full_path}/diversity_model.pth"
+        # Save the historic embeddings of the diversity model added since the last checkpoint.
+        self.checkpointer.snapshot_embeddings(
+            snapshot,
+            self.diversity_model.historic_embeddings,
+            self.diversity_model.historic_count,
         )
-        torch.save(diversity_model_dict, diversity_model_file_path)
-        bt.logging.success(
-            prefix="Saved diversity model",
-            sufix=f"<blue>{diversity_model_file_path}</blue> {list(self.diversity_model.historic_embeddings.shape)}",
+        num_embeddings = len(snapshot.embeddings)
+        snapshot.callbacks.append(
+            lambda: bt.logging.success(
+                prefix="Saved diversity model",
+                sufix=f"<blue>{self.checkpointer.embeddings.path}</blue> {num_embeddings} new embeddings",
+            )
         )
     except Exception as e:
         bt.logging.warning(f"Failed to save diversity model with error: {e}")
 
-    # empty cache
-    torch.cuda.empty_cache()
+    try:
+        # Save the normalization statistics of the reward models, the blacklist counter and the uid sampler.
+        snapshot.writes.append(capture_scorer_state(self))
+    except Exception as e:
+        bt.logging.warning(f"Failed to save scorer state with error: {e}")
+
+    self.checkpointer.submit(snapshot)
 
 
 def load_state(self):
@@ -264,18 +315,20 @@ def load_state(self):
     try:
         state_dict = torch.load(f"{self.config.neuron.full_path}/model.torch")
         neuron_weights = torch.tensor(state_dict["neuron_weights"])
+        scoreboard_state = {
+            **state_dict.get("neuron_scoreboard", {}),
+            "scores": neuron_weights,
+        }
         # Check to ensure that the size of the neruon weights matches the metagraph size.
         if neuron_weights.shape != (self.metagraph.n,):
             bt.logging.warning(
                 f"Neuron weights shape {neuron_weights.shape} does not match metagraph n {self.metagraph.n}"
                 "Populating new moving_averaged_scores IDs with zeros"
             )
-            self.moving_averaged_scores[: len(neuron_weights)] = neuron_weights.to(
-                self.device
-            )
+            self.scoreboard.load_state_dict(scoreboard_state)
         # Check for nans in saved state dict
         elif not torch.isnan(neuron_weights).any():
-            self.moving_averaged_scores = neuron_weights.to(self.device)
+            self.scoreboard.load_state_dict(scoreboard_state)
         self.hotkeys = state_dict["neuron_hotkeys"]
         bt.logging.success(
             prefix="Reloaded model",
@@ -285,17 +338,72 @@ def load_state(self):
         bt.logging.warning(f"Failed to load model with error: {e}")
 
     try:
-        # Load diversity model.
-        diversity_model_file_path = (
-            f"{self.config.neuron.full_path}/diversity_model.pth"
+        # Load the linear layer of the gating model, saved by save_state or the offline gating trainer.
+        gating_model_file_path = gating_linear_layer_path(
+            self.config.neuron.full_path, self.config.gating.model_name
         )
-        diversity_model_dict = torch.load(diversity_model_file_path)
-        self.diversity_model.historic_embeddings = diversity_model_dict[
-            "historic_embeddings"
-        ].to(self.device)
+        if os.path.exists(gating_model_file_path):
+            gating_model_linear_layer_dict = torch.load(
+                gating_model_file_path, map_location=self.device
+            )
+            self.gating_model.linear.load_state_dict(gating_model_linear_layer_dict)
+            if self.gating_trainer is not None:
+                self.gating_trainer.load_head(gating_model_linear_layer_dict)
+            bt.logging.success(
+                prefix="Reloaded gating model",
+                sufix=f"<blue>{gating_model_file_path}</blue>",
+            )
+    except Exception as e:
+        bt.logging.warning(f"Failed to load gating model with error: {e}")
+
+    try:
+        # Load diversity model, from the embeddings segment or from the checkpoint of a previous version.
+        diversity_model_file_path = self.checkpointer.embeddings.path
+        historic_embeddings = self.checkpointer.embeddings.load()
+        if historic_embeddings is None:
+            diversity_model_file_path = (
+                f"{self.config.neuron.full_path}/diversity_model.pth"
+            )
+            historic_embeddings = torch.load(diversity_model_file_path)[
+                "historic_embeddings"
+            ]
+        else:
+            self.checkpointer.mark_loaded(len(historic_embeddings))
+        self.diversity_model.historic_embeddings = historic_embeddings.to(self.device)
+        self.diversity_model.historic_count = len(historic_embeddings)
         bt.logging.success(
             prefix="Reloaded diversity model",
             sufix=f"<blue>{diversity_model_file_path}</blue> {list(self.diversity_model.historic_embeddings.shape)}",
         )
     except Exception as e:
         bt.logging.warning(f"Failed to load diversity model with error: {e}")
+
+    try:
+        load_scorer_state(self)
+    except Exception as e:
+        bt.logging.warning(f"Failed to load scorer state with error: {e}")
+
+
+# Background queues exported by `queue_collector`, as (queue label, attribute of the neuron).
+QUEUES = (
+    ("event_store", "event_store"),
+    ("wandb", "wandb_logger"),
+    ("dataset_prefetch", "dataset"),
+)
+
+
+def queue_collector(self):
+    """Returns a metrics collector reading the number of items waiting in the background queues of the neuron."""
+
+    def collect(registry: "prompting.metrics.MetricsRegistry"):
+        queue_size = registry.gauge(
+            "validator_queue_size",
+            "Number of items waiting in a background queue.",
+            ["queue"],
+        )
+        for name, attr in QUEUES:
+            component = getattr(self, attr, None)
+            if hasattr(component, "qsize"):
+                queue_size.set(component.qsize(), queue=name)
+
+    return collect
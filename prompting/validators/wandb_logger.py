@@ -0,0 +1,160 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import queue
+import threading
+import bittensor as bt
+from dataclasses import asdict
+from typing import Any, Dict, List
+from prompting.validators.event import EventSchema
+
+
+class LocalSink:
+    """Sink keeping the logged records and artifacts in memory, e.g. for tests or runs without wandb."""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.artifacts: List[Any] = []
+
+    def log(self, data: Dict):
+        self.records.append(data)
+
+    def log_artifact(self, artifact: Any):
+        self.artifacts.append(artifact)
+
+
+class WandbLogger:
+    """
+    Logs to wandb from a background thread so that the forward loop never waits on wandb.
+
+    Records are passed through a bounded queue and the worker drains up to `batch_size` of them per wake up,
+    converting the step events with `EventSchema.from_dict` off the forward path. Drained records are not merged,
+    each step event stays its own wandb step. Instead, when the queue is full new records are dropped and
+    summarized: the next logged record carries the number of records dropped so far as `dropped_wandb_events`,
+    and the number and mean of the rewards of the step events dropped since the previous report as
+    `dropped_wandb_rewards_count` and `dropped_wandb_rewards_mean`. The sink is any object with `log` and
+    `log_artifact` methods, the wandb run by default.
+    """
+
+    def __init__(
+        self, sink: Any = None, max_queue_size: int = 256, batch_size: int = 32
+    ):
+        """
+        Args:
+            sink (Any, optional): Object receiving the records, e.g. a `wandb.Run` or a `LocalSink`.
+            max_queue_size (int, optional): Number of pending records above which records are dropped.
+            batch_size (int, optional): Maximum number of records handled per wake up of the worker.
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._dropped_rewards_sum = 0.0
+        self._dropped_rewards_count = 0
+        self._dropped_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name="wandb-logger", daemon=True
+        )
+        self._thread.start()
+
+    def set_sink(self, sink: Any):
+        """Replaces the sink, e.g. after rolling over to a new wandb run. Call `flush` first to keep the order."""
+        self.sink = sink
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            kind, payload, _ = item
+            rewards = (payload.get("rewards") or []) if kind == "event" else []
+            rewards = [float(reward) for reward in rewards if reward is not None]
+            with self._dropped_lock:
+                self.dropped += 1
+                self._dropped_rewards_sum += sum(rewards)
+                self._dropped_rewards_count += len(rewards)
+
+    def log_event(self, event: Dict, disable_log_rewards: bool = False):
+        """Enqueues a step event, converted to the wandb `EventSchema` by the worker."""
+        self._put(("event", event, disable_log_rewards))
+
+    def log(self, data: Dict):
+        """Enqueues a record logged as is."""
+        self._put(("log", data, None))
+
+    def log_artifact(self, artifact: Any):
+        """Enqueues an artifact."""
+        self._put(("artifact", artifact, None))
+
+    def qsize(self) -> int:
+        """Returns the number of records waiting to be handled."""
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until the records enqueued so far are handled. Returns False on timeout."""
+        done = threading.Event()
+        self._queue.put(("flush", done, None), timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = None):
+        """Handles the pending records and stops the worker."""
+        self._queue.put(("close", None, None), timeout=timeout)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for kind, payload, option in items:
+                if kind == "flush":
+                    payload.set()
+                elif kind == "close":
+                    return
+                else:
+                    self._handle(kind, payload, option)
+
+    def _handle(self, kind: str, payload: Any, disable_log_rewards: bool):
+        try:
+            if kind == "artifact":
+                self.sink.log_artifact(payload)
+                return
+            if kind == "event":
+                payload = asdict(EventSchema.from_dict(payload, disable_log_rewards))
+            if self.dropped != self._reported_dropped:
+                payload = {**payload, **self._dropped_summary()}
+            self.sink.log(payload)
+        except Exception as e:
+            bt.logging.warning(f"Failed to log {kind} to wandb with error: {e}")
+
+    def _dropped_summary(self) -> Dict:
+        """Returns the summary of the records dropped since the previous report and starts a new one."""
+        with self._dropped_lock:
+            summary = {"dropped_wandb_events": self.dropped}
+            if self._dropped_rewards_count:
+                summary["dropped_wandb_rewards_count"] = self._dropped_rewards_count
+                summary["dropped_wandb_rewards_mean"] = (
+                    self._dropped_rewards_sum / self._dropped_rewards_count
+                )
+            self._reported_dropped = self.dropped
+            self._dropped_rewards_sum = 0.0
+            self._dropped_rewards_count = 0
+        return summary
@@ -18,11 +18,8 @@
 
 # Utils for weights setting on chain.
 
-import wandb
 import torch
 import bittensor as bt
-from prompting.validators.misc import ttl_get_block
-import prompting.validators as validators
 
 
 def should_set_weights(self) -> bool:
@@ -31,39 +28,22 @@ def should_set_weights(self) -> bool:
         return False
 
     return (
-        ttl_get_block(self) % self.config.neuron.epoch_length
+        self.block_clock.block % self.config.neuron.epoch_length
         < self.prev_block % self.config.neuron.epoch_length
     )
 
 
 def set_weights(self):
+    """Submits the normalized moving averaged scores to `self.weight_setter`, which processes them for the subnet
+    limits and sets them on chain from its worker thread."""
     # Calculate the average reward for each uid across non-zero values.
     # Replace any NaN values with 0.
-    raw_weights = torch.nn.functional.normalize(self.moving_averaged_scores, p=1, dim=0)
+    raw_weights = torch.nn.functional.normalize(self.scoreboard.snapshot(), p=1, dim=0)
     bt.logging.trace("raw_weights", raw_weights)
     bt.logging.trace("top10 values", raw_weights.sort()[0])
     bt.logging.trace("top10 uids", raw_weights.sort()[1])
 
-    # Process the raw weights to final_weights via subtensor limitations.
-    (
-        processed_weight_uids,
-        processed_weights,
-    ) = bt.utils.weight_utils.process_weights_for_netuid(
-        uids=self.metagraph.uids.to("cpu"),
-        weights=raw_weights.to("cpu"),
-        netuid=self.config.netuid,
-        subtensor=self.subtensor,
-        metagraph=self.metagraph,
-    )
-    bt.logging.trace("processed_weights", processed_weights)
-    bt.logging.trace("processed_weight_uids", processed_weight_uids)
-
-    # Set the weights on chain via our subtensor connection.
-    self.subtensor.set_weights(
-        wallet=self.wallet,
-        netuid=self.config.netuid,
-        uids=processed_weight_uids,
-        weights=processed_weights,
-        wait_for_finalization=False,
-        version_key=validators.__spec_version__,
+    # The metagraph is replaced rather than modified when it is synced, so the worker can process the weights on it.
+    self.weight_setter.submit(
+        uids=self.metagraph.uids, weights=raw_weights, metagraph=self.metagraph
     )
@@ -0,0 +1,296 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import threading
+import torch
+import bittensor as bt
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+@dataclass(frozen=True)
+class WeightsRequest:
+    """Weights to set on chain, captured when submitted.
+    Args:
+        uids (torch.LongTensor): Uids of the weights.
+        weights (torch.FloatTensor): Weights, processed for the subnet limits first when `metagraph` is given.
+        metagraph (bt.metagraph): Metagraph the weights were computed on.
+        submitted_at (float): Time of the submission.
+    """
+
+    uids: torch.LongTensor
+    weights: torch.FloatTensor
+    metagraph: Optional["bt.metagraph"]
+    submitted_at: float
+
+
+@dataclass(frozen=True)
+class WeightsResult:
+    """Outcome of setting a request on chain.
+    Args:
+        success (bool): Whether the extrinsic was submitted, or included when waiting for inclusion.
+        attempts (int): Number of attempts made.
+        latency (float): Seconds from the submission of the request to the outcome.
+        error (str): Error of the last failed attempt.
+        superseded (bool): Whether the request was dropped for a newer one before it succeeded.
+    """
+
+    success: bool
+    attempts: int
+    latency: float
+    error: Optional[str] = None
+    superseded: bool = False
+
+
+class WeightSetter:
+    """Sets weights on chain from a worker thread, so slow chain requests do not stall the caller.
+
+    `submit` copies the weights and returns right away. The worker processes them for the subnet limits, sets them
+    with a timeout per attempt and retries failed attempts with an exponential backoff. Only the latest weights
+    matter, so a request still waiting or retrying is dropped when newer weights are submitted. The outcome of each
+    request is kept in `results` and exported to the metrics registry when one is given.
+    """
+
+    def __init__(
+        self,
+        subtensor_factory: Callable[[], "bt.subtensor"],
+        wallet: "bt.wallet",
+        netuid: int,
+        version_key: int,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 2.0,
+        max_backoff: float = 60.0,
+        wait_for_inclusion: bool = False,
+        metrics: Any = None,
+    ):
+        """
+        Args:
+            subtensor_factory (Callable[[], bt.subtensor]): Creates the subtensor of the worker. It is created again
+                after an attempt times out, as the timed out request may still be using its websocket.
+            wallet (bt.wallet): Wallet signing the extrinsics.
+            netuid (int): Subnet of the weights.
+            version_key (int): Version key of the weights.
+            timeout (float): Seconds before an attempt is abandoned.
+            retries (int): Number of retries after the first attempt.
+            backoff (float): Seconds before the first retry, doubled for every following retry.
+            max_backoff (float): Maximum seconds between retries.
+            wait_for_inclusion (bool): Wait for the extrinsic to be included in a block, so that the outcome
+                tracks the inclusion rather than the submission.
+            metrics (prompting.metrics.MetricsRegistry, optional): Registry the outcomes are exported to.
+        """
+        self.subtensor_factory = subtensor_factory
+        self.wallet = wallet
+        self.netuid = netuid
+        self.version_key = version_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.wait_for_inclusion = wait_for_inclusion
+        self.metrics = metrics
+
+        self.subtensor = None
+        self.pending: Optional[WeightsRequest] = None
+        self.results = deque(maxlen=100)
+        self.busy = False
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(
+            target=self._run, name="WeightSetter", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def last_result(self) -> Optional[WeightsResult]:
+        return self.results[-1] if self.results else None
+
+    def submit(
+        self,
+        uids: torch.Tensor,
+        weights: torch.Tensor,
+        metagraph: "bt.metagraph" = None,
+    ):
+        """Queues the weights, replacing the weights not set yet.
+        Args:
+            uids (torch.Tensor): Uids of the weights.
+            weights (torch.Tensor): Weights of the uids.
+            metagraph (bt.metagraph, optional): Metagraph of the uids, to process the weights for the subnet
+                limits with `process_weights_for_netuid`. The weights are set as given without it.
+        """
+        request = WeightsRequest(
+            uids=uids.detach().to("cpu", copy=True),
+            weights=weights.detach().to("cpu", copy=True),
+            metagraph=metagraph,
+            submitted_at=time.time(),
+        )
+        with self._condition:
+            if self.pending is not None:
+                self._record(self.pending, False, 0, "superseded", superseded=True)
+            self.pending = request
+            self._condition.notify_all()
+
+    def _record(
+        self,
+        request: WeightsRequest,
+        success: bool,
+        attempts: int,
+        error: str = None,
+        superseded: bool = False,
+    ) -> WeightsResult:
+        result = WeightsResult(
+            success=success,
+            attempts=attempts,
+            latency=time.time() - request.submitted_at,
+            error=error,
+            superseded=superseded,
+        )
+        self.results.append(result)
+        if self.metrics is not None:
+            outcome = (
+                "superseded" if superseded else "success" if success else "failure"
+            )
+            self.metrics.counter(
+                "set_weights_total",
+                "Number of weight requests by outcome.",
+                ["outcome"],
+            ).inc(outcome=outcome)
+            if not superseded:
+                self.metrics.histogram(
+                    "set_weights_seconds",
+                    "Seconds from the submission of weights to their outcome.",
+                ).observe(result.latency)
+        return result
+
+    def _call(self, fn: Callable[[], Any]) -> Any:
+        """Calls fn from a separate thread and raises a TimeoutError if it does not return within the timeout."""
+        outcome = {}
+
+        def target():
+            try:
+                outcome["value"] = fn()
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=target, name="WeightSetterCall", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise TimeoutError(f"Setting weights timed out after {self.timeout}s")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+
+    def _set(self, request: WeightsRequest) -> bool:
+        """Processes and sets the weights of the request once."""
+        if self.subtensor is None:
+            self.subtensor = self.subtensor_factory()
+        subtensor = self.subtensor
+
+        def set_weights() -> bool:
+            uids, weights = request.uids, request.weights
+            if request.metagraph is not None:
+                # Process the raw weights to final_weights via subtensor limitations.
+                uids, weights = bt.utils.weight_utils.process_weights_for_netuid(
+                    uids=uids,
+                    weights=weights,
+                    netuid=self.netuid,
+                    subtensor=subtensor,
+                    metagraph=request.metagraph,
+                )
+                bt.logging.trace("processed_weights", weights)
+                bt.logging.trace("processed_weight_uids", uids)
+            result = subtensor.set_weights(
+                wallet=self.wallet,
+                netuid=self.netuid,
+                uids=uids,
+                weights=weights,
+                wait_for_inclusion=self.wait_for_inclusion,
+                wait_for_finalization=False,
+                version_key=self.version_key,
+            )
+            # Newer versions of bittensor return the success with a message.
+            return bool(result[0] if isinstance(result, tuple) else result)
+
+        try:
+            return self._call(set_weights)
+        except TimeoutError:
+            # The abandoned request may still be using the websocket of the subtensor.
+            self.subtensor = None
+            raise
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._stop or self.pending is not None)
+                if self._stop:
+                    return
+                request, self.pending = self.pending, None
+                self.busy = True
+
+            attempts, error = 0, None
+            while True:
+                attempts += 1
+                try:
+                    if self._set(request):
+                        self._record(request, True, attempts)
+                        bt.logging.info(
+                            f"Set weights in {attempts} attempt(s), {time.time() - request.submitted_at:.1f}s"
+                        )
+                        break
+                    error = "set_weights returned False"
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                bt.logging.warning(
+                    f"Failed to set weights (attempt {attempts}): {error}"
+                )
+
+                if attempts > self.retries:
+                    self._record(request, False, attempts, error)
+                    bt.logging.error(
+                        f"Failed to set weights after {attempts} attempts: {error}"
+                    )
+                    break
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                with self._condition:
+                    # Newer weights replace the request instead of retrying it.
+                    if self._condition.wait_for(
+                        lambda: self._stop or self.pending is not None, delay
+                    ):
+                        self._record(
+                            request, False, attempts, error, superseded=not self._stop
+                        )
+                        break
+
+            with self._condition:
+                self.busy = False
+                self._condition.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until the submitted weights are set or given up on. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.pending is None and not self.busy, timeout
+            )
+
+    def stop(self):
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
@@ -0,0 +1,86 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Measures the import time of the prompting packages using `python -X importtime`.
+#
+# Example:
+#   python scripts/import_benchmark.py --top 10
+#   python scripts/import_benchmark.py prompting.validators.reward
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+DEFAULT_MODULES = ["prompting", "prompting.baseminer", "prompting.validators"]
+
+
+def import_times(module: str):
+    """Imports `module` in a fresh interpreter and returns the parsed importtime report
+    as a list of (cumulative_us, self_us, module_name) tuples."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def top_packages(rows, top: int):
+    """Sums the self time of every module per top level package."""
+    totals = defaultdict(int)
+    for _, self_us, name in rows:
+        totals[name.split(".")[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the prompting packages."
+    )
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Number of heaviest top level packages to list per module.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of runs, the fastest is kept."
+    )
+    args = parser.parse_args(args)
+
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(max(args.repeat, 1))]
+        rows = min(runs, key=lambda rows: rows[-1][0])
+        # The last line of the report is the requested module itself.
+        print(f"{module:<32} {rows[-1][0] / 1e6:8.3f}s")
+        for package, self_us in top_packages(rows, args.top):
+            print(f"    {package:<28} {self_us / 1e6:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
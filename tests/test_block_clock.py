@@ -0,0 +1,124 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+from prompting.block_clock import BlockClock
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BlockClockTestCase(unittest.TestCase):
+    def make_clock(self, **kwargs):
+        clock = BlockClock(subtensor_factory=MagicMock(), **kwargs)
+        self.addCleanup(clock.stop)
+        return clock
+
+    def test_estimate_counts_blocks_since_the_observation(self):
+        timer = FakeTimer()
+        clock = self.make_clock(block=100, resync_interval=0, timer=timer)
+        self.assertEqual(clock.block, 100)
+        timer.now += 11.9
+        self.assertEqual(clock.block, 100)
+        timer.now += 0.1
+        self.assertEqual(clock.block, 101)
+        timer.now += 120
+        self.assertEqual(clock.block, 111)
+        self.assertAlmostEqual(clock.seconds_until(112), 12.0)
+        self.assertEqual(clock.seconds_until(105), 0.0)
+
+    def test_observations_reanchor_the_estimate(self):
+        timer = FakeTimer()
+        clock = self.make_clock(block=100, resync_interval=0, timer=timer)
+        timer.now += 30
+        # Matching observations keep the block boundaries.
+        clock.observe(102)
+        self.assertEqual(clock.anchor_time, 1000.0)
+        # The chain is ahead.
+        clock.observe(104)
+        self.assertEqual(clock.block, 104)
+        timer.now += 12
+        self.assertEqual(clock.block, 105)
+        # The chain is behind, the estimate holds until it catches up.
+        clock.observe(103)
+        self.assertEqual(clock.block, 105)
+        timer.now += 24
+        self.assertEqual(clock.block, 105)
+        timer.now += 12
+        self.assertEqual(clock.block, 106)
+
+    def test_sync_requests_the_block(self):
+        subtensor = MagicMock()
+        subtensor.get_current_block.return_value = 42
+        factory = MagicMock(return_value=subtensor)
+        clock = BlockClock(subtensor_factory=factory, resync_interval=0)
+        self.assertEqual(clock.block, 42)
+        factory.assert_called_once()
+
+    def test_background_resync(self):
+        subtensor = MagicMock()
+        subtensor.get_current_block.side_effect = [ConnectionError("closed"), 500]
+        factory = MagicMock(return_value=subtensor)
+        clock = self.make_clock(block=1, resync_interval=0.01)
+        clock.subtensor_factory = factory
+        deadline = time.time() + 5
+        while clock.block < 500 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(clock.block, 500)
+        # The subtensor is recreated after a failed resync.
+        self.assertEqual(factory.call_count, 2)
+
+    def test_next_block_and_wait_until(self):
+        clock = self.make_clock(block=10, block_time=0.05, resync_interval=0)
+
+        async def wait():
+            first = await clock.next_block()
+            second = await clock.wait_until(first + 2)
+            return first, second
+
+        start = time.monotonic()
+        first, second = asyncio.run(wait())
+        self.assertEqual((first, second), (11, 13))
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+
+    def test_wait_until_blocking(self):
+        clock = self.make_clock(block=10, block_time=0.05, resync_interval=0)
+        self.assertEqual(clock.wait_until_blocking(12), 12)
+        self.assertIsNone(clock.wait_until_blocking(1000, timeout=0.05))
+
+        waiting = threading.Thread(
+            target=lambda: setattr(self, "result", clock.wait_until_blocking(1000))
+        )
+        waiting.start()
+        clock.stop()
+        waiting.join(1)
+        self.assertFalse(waiting.is_alive())
+        self.assertIsNone(self.result)
+
+
+if __name__ == "__main__":
+    unittest.main()
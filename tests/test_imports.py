@@ -0,0 +1,58 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import sys
+import unittest
+import subprocess
+
+HEAVY_MODULES = ["transformers", "datasets", "wandb"]
+
+
+def imported_modules(statement: str):
+    """Runs `statement` in a fresh interpreter and returns the heavy modules it loaded."""
+    check = f"import sys; {statement}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+class ImportTestCase(unittest.TestCase):
+    def test_validators_import_is_lazy(self):
+        self.assertEqual(imported_modules("import prompting.validators"), [])
+
+    def test_baseminer_import_is_lazy(self):
+        self.assertEqual(imported_modules("import prompting.baseminer"), [])
+
+    def test_submodules_resolve_on_access(self):
+        loaded = imported_modules(
+            "import prompting.validators as v; v.reward.RewardModelType; v.dataset.Dataset"
+        )
+        self.assertEqual(loaded, [])
+
+    def test_reward_models_resolve_on_access(self):
+        import prompting.validators as validators
+        from prompting.validators.reward.blacklist import Blacklist
+
+        self.assertIs(validators.reward.Blacklist, Blacklist)
+        with self.assertRaises(AttributeError):
+            validators.reward.NotARewardModel
+
+
+if __name__ == "__main__":
+    unittest.main()
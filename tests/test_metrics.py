@@ -0,0 +1,128 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import unittest
+import urllib.request
+import queue
+from types import SimpleNamespace
+from prompting.metrics import MetricsRegistry, MetricsServer, process_collector
+from prompting.validators.utils import queue_collector
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_exposition(self):
+        counter = self.registry.counter(
+            "responses_total", "Responses by status code.", ["status_code"]
+        )
+        counter.inc(status_code=200)
+        counter.inc(2, status_code=408)
+
+        text = self.registry.expose()
+        self.assertIn("# TYPE responses_total counter", text)
+        self.assertIn('responses_total{status_code="200"} 1.0', text)
+        self.assertIn('responses_total{status_code="408"} 2.0', text)
+
+    def test_counter_rejects_negative_increments_and_wrong_labels(self):
+        counter = self.registry.counter("requests_total", "Requests.", ["result"])
+        with self.assertRaises(ValueError):
+            counter.inc(-1, result="hit")
+        with self.assertRaises(ValueError):
+            counter.inc(other="hit")
+
+    def test_counter_totals_only_increase(self):
+        counter = self.registry.counter("cpu_seconds_total", "Cpu time.")
+        counter.set_total(2.5)
+        counter.set_total(1.0)
+        self.assertEqual(counter.get(), 2.5)
+
+    def test_process_cpu_time_is_a_counter(self):
+        try:
+            import psutil
+        except ImportError:
+            self.skipTest("psutil is not installed")
+        process_collector(self.registry)
+        self.assertIn(
+            "# TYPE process_cpu_seconds_total counter", self.registry.expose()
+        )
+
+    def test_queue_sizes(self):
+        event_store = queue.Queue()
+        event_store.put("event")
+        neuron = SimpleNamespace(event_store=event_store, dataset=object())
+        self.registry.add_collector(queue_collector(neuron))
+        text = self.registry.expose()
+        self.assertIn('validator_queue_size{queue="event_store"} 1.0', text)
+        self.assertNotIn('queue="wandb"', text)
+        self.assertNotIn('queue="dataset_prefetch"', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram(
+            "step_seconds", "Step latency.", buckets=(1.0, 5.0)
+        )
+        for value in (0.5, 1.0, 3.0, 10.0):
+            histogram.observe(value)
+
+        text = self.registry.expose()
+        self.assertIn('step_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('step_seconds_bucket{le="5.0"} 3', text)
+        self.assertIn('step_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("step_seconds_count 4", text)
+        self.assertIn("step_seconds_sum 14.5", text)
+        self.assertEqual(histogram.get(), (4, 14.5))
+
+    def test_get_or_create_returns_same_metric(self):
+        gauge = self.registry.gauge("in_flight", "In flight.")
+        self.assertIs(gauge, self.registry.gauge("in_flight", "In flight."))
+        with self.assertRaises(ValueError):
+            self.registry.counter("in_flight", "In flight.")
+
+    def test_collectors_run_at_scrape_and_failures_are_ignored(self):
+        def collector(registry):
+            registry.gauge("memory_bytes", "Memory.").set(42)
+
+        def failing_collector(registry):
+            raise RuntimeError("no gpu")
+
+        self.registry.add_collector(failing_collector)
+        self.registry.add_collector(collector)
+        self.assertIn("memory_bytes 42.0", self.registry.expose())
+
+
+class MetricsServerTestCase(unittest.TestCase):
+    def test_scrape(self):
+        registry = MetricsRegistry()
+        registry.counter(
+            "blacklist_total", "Blacklist decisions.", ["blacklisted"]
+        ).inc(blacklisted="true")
+        server = MetricsServer(registry, port=0, host="127.0.0.1").start()
+        try:
+            with urllib.request.urlopen(
+                f"http://127.0.0.1:{server.port}/metrics", timeout=5
+            ) as response:
+                self.assertEqual(response.status, 200)
+                body = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn('blacklist_total{blacklisted="true"} 1.0', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import asyncio
+import unittest
+from types import SimpleNamespace
+from prompting.protocol import StreamPrompting
+
+
+class MockContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class StreamPromptingTestCase(unittest.TestCase):
+    def process(self, chunks):
+        synapse = StreamPrompting(roles=["user"], messages=["test"])
+        response = SimpleNamespace(content=MockContent(chunks))
+
+        async def consume():
+            return [
+                tokens async for tokens in synapse.process_streaming_response(response)
+            ]
+
+        return synapse, asyncio.run(consume())
+
+    def test_tokens_are_accumulated_into_completion(self):
+        synapse, yielded = self.process([b"Hello\n", b" world\n", b"!"])
+
+        self.assertEqual(yielded, [["Hello", ""], [" world", ""], ["!"]])
+        self.assertEqual(synapse.completion, "Hello world!")
+
+    def test_multibyte_characters_split_across_chunks(self):
+        encoded = "héllo wörld".encode("utf-8")
+        # Split inside the two byte encodings of "é" and "ö".
+        chunks = [encoded[:2], encoded[2:9], encoded[9:]]
+
+        synapse, yielded = self.process(chunks)
+
+        self.assertEqual(synapse.completion, "héllo wörld")
+        self.assertEqual(
+            "".join(token for tokens in yielded for token in tokens), "héllo wörld"
+        )
+
+    def test_completion_is_materialized_when_stream_is_closed_early(self):
+        synapse = StreamPrompting(roles=["user"], messages=["test"])
+        response = SimpleNamespace(content=MockContent([b"a", b"b", b"c"]))
+
+        async def consume_first():
+            stream = synapse.process_streaming_response(response)
+            first = await stream.__anext__()
+            await stream.aclose()
+            return first
+
+        self.assertEqual(asyncio.run(consume_first()), ["a"])
+        self.assertEqual(synapse.completion, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
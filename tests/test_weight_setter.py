@@ -0,0 +1,161 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import torch
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from prompting.metrics import MetricsRegistry
+from prompting.weight_setter import WeightSetter
+from prompting.baseminer.set_weights import submit_weights
+
+
+class WeightSetterTestCase(unittest.TestCase):
+    def make_setter(self, subtensor, **kwargs):
+        self.metrics = MetricsRegistry()
+        factory = MagicMock(return_value=subtensor)
+        kwargs = {"timeout": 1.0, "retries": 2, "backoff": 0.01, **kwargs}
+        setter = WeightSetter(
+            subtensor_factory=factory,
+            wallet="wallet",
+            netuid=1,
+            version_key=7,
+            metrics=self.metrics,
+            **kwargs,
+        )
+        self.addCleanup(setter.stop)
+        return setter, factory
+
+    def test_submit_returns_before_the_weights_are_set(self):
+        release = threading.Event()
+        subtensor = MagicMock()
+        subtensor.set_weights.side_effect = lambda **kwargs: release.wait(5)
+        setter, _ = self.make_setter(subtensor, timeout=10.0)
+
+        weights = torch.tensor([0.25, 0.75])
+        start = time.time()
+        setter.submit(uids=torch.tensor([0, 1]), weights=weights)
+        self.assertLess(time.time() - start, 0.5)
+        # The submitted weights are a snapshot.
+        weights.zero_()
+
+        release.set()
+        self.assertTrue(setter.flush(timeout=5))
+        kwargs = subtensor.set_weights.call_args.kwargs
+        self.assertEqual(kwargs["weights"].tolist(), [0.25, 0.75])
+        self.assertEqual((kwargs["netuid"], kwargs["version_key"]), (1, 7))
+        self.assertTrue(setter.last_result.success)
+        self.assertEqual(setter.last_result.attempts, 1)
+        self.assertEqual(
+            self.metrics.counter("set_weights_total", "", ["outcome"]).get(
+                outcome="success"
+            ),
+            1,
+        )
+
+    def test_failures_are_retried_with_backoff(self):
+        subtensor = MagicMock()
+        subtensor.set_weights.side_effect = [ConnectionError("closed"), False, True]
+        setter, _ = self.make_setter(subtensor)
+        setter.submit(uids=torch.tensor([0]), weights=torch.tensor([1.0]))
+        self.assertTrue(setter.flush(timeout=5))
+        self.assertEqual(subtensor.set_weights.call_count, 3)
+        self.assertTrue(setter.last_result.success)
+        self.assertEqual(setter.last_result.attempts, 3)
+
+    def test_gives_up_after_the_retries(self):
+        subtensor = MagicMock()
+        subtensor.set_weights.side_effect = ConnectionError("closed")
+        setter, _ = self.make_setter(subtensor, retries=1)
+        setter.submit(uids=torch.tensor([0]), weights=torch.tensor([1.0]))
+        self.assertTrue(setter.flush(timeout=5))
+        result = setter.last_result
+        self.assertFalse(result.success)
+        self.assertEqual(result.attempts, 2)
+        self.assertIn("ConnectionError", result.error)
+
+    def test_timed_out_attempts_reconnect(self):
+        hung, fresh = MagicMock(), MagicMock()
+        hung.set_weights.side_effect = lambda **kwargs: time.sleep(5)
+        fresh.set_weights.return_value = True
+        setter, factory = self.make_setter(hung, timeout=0.1)
+        factory.side_effect = [hung, fresh]
+
+        setter.submit(uids=torch.tensor([0]), weights=torch.tensor([1.0]))
+        self.assertTrue(setter.flush(timeout=5))
+        self.assertEqual(factory.call_count, 2)
+        self.assertTrue(setter.last_result.success)
+        self.assertEqual(setter.last_result.attempts, 2)
+
+    def test_newer_weights_replace_pending_ones(self):
+        release = threading.Event()
+        calls = []
+
+        def set_weights(**kwargs):
+            calls.append(kwargs["weights"].tolist())
+            release.wait(5)
+            return True
+
+        subtensor = MagicMock()
+        subtensor.set_weights.side_effect = set_weights
+        setter, _ = self.make_setter(subtensor, timeout=10.0)
+        for value in (1.0, 2.0, 3.0):
+            setter.submit(uids=torch.tensor([0]), weights=torch.tensor([value]))
+            time.sleep(0.05)
+        release.set()
+        self.assertTrue(setter.flush(timeout=5))
+        # The first request was being set, the second was replaced by the third.
+        self.assertEqual(calls, [[1.0], [3.0]])
+        self.assertEqual(
+            [result.superseded for result in setter.results], [True, False, False]
+        )
+
+    def test_weights_are_processed_on_the_metagraph(self):
+        subtensor = MagicMock()
+        subtensor.set_weights.return_value = True
+        setter, _ = self.make_setter(subtensor)
+        metagraph = SimpleNamespace(uids=torch.tensor([0, 1]))
+        with patch(
+            "bittensor.utils.weight_utils.process_weights_for_netuid",
+            return_value=(torch.tensor([1]), torch.tensor([1.0])),
+        ) as process:
+            setter.submit(
+                uids=metagraph.uids,
+                weights=torch.tensor([0.0, 1.0]),
+                metagraph=metagraph,
+            )
+            self.assertTrue(setter.flush(timeout=5))
+        self.assertIs(process.call_args.kwargs["metagraph"], metagraph)
+        self.assertIs(process.call_args.kwargs["subtensor"], subtensor)
+        self.assertEqual(subtensor.set_weights.call_args.kwargs["uids"].tolist(), [1])
+
+    def test_miner_weights(self):
+        subtensor = MagicMock()
+        subtensor.set_weights.return_value = True
+        setter, _ = self.make_setter(subtensor)
+        submit_weights(setter, SimpleNamespace(n=torch.tensor(4)), uid=2)
+        self.assertTrue(setter.flush(timeout=5))
+        kwargs = subtensor.set_weights.call_args.kwargs
+        self.assertEqual(kwargs["uids"].tolist(), [0, 1, 2, 3])
+        self.assertEqual(kwargs["weights"].tolist(), [0, 0, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
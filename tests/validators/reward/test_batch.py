@@ -0,0 +1,171 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import torch
+import tempfile
+import unittest
+from types import SimpleNamespace
+from transformers import BertConfig, BertModel, BertTokenizerFast
+from prompting.validators.reward.batch import CompletionBatch, length_buckets
+from prompting.validators.reward.diversity import DiversityRewardModel
+from prompting.validators.reward.relevance import BertRelevanceRewardModel
+
+WORDS = "the a cat dog sat on mat ran far away quickly slowly and then".split()
+
+
+def tiny_tokenizer(path: str, model_max_length: int = 512) -> BertTokenizerFast:
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS
+    with open(os.path.join(path, "vocab.txt"), "w") as f:
+        f.write("\n".join(vocab))
+    return BertTokenizerFast(
+        os.path.join(path, "vocab.txt"), model_max_length=model_max_length
+    )
+
+
+def tiny_model() -> BertModel:
+    torch.manual_seed(0)
+    return BertModel(
+        BertConfig(
+            vocab_size=len(WORDS) + 5,
+            hidden_size=16,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+    ).eval()
+
+
+class CountingTokenizer:
+    """Wraps a tokenizer, counting the texts it tokenizes."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.name_or_path = tokenizer.name_or_path
+        self.texts = 0
+
+    def __call__(self, texts, **kwargs):
+        self.texts += len(texts)
+        return self.tokenizer(texts, **kwargs)
+
+
+class CompletionBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tokenizer = tiny_tokenizer(self.directory.name)
+        self.completions = [
+            " the cat sat ",
+            "a dog ran far away quickly and then slowly",
+            "the mat",
+            "",
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_completions_are_normalized(self):
+        batch = CompletionBatch("prompt", self.completions)
+        self.assertEqual(batch[0], "the cat sat")
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(list(batch), [c.strip() for c in self.completions])
+
+    def test_from_responses_keeps_successful_completions(self):
+        responses = [
+            SimpleNamespace(
+                completion=" ok ", dendrite=SimpleNamespace(status_code=200)
+            ),
+            SimpleNamespace(
+                completion="late", dendrite=SimpleNamespace(status_code=408)
+            ),
+            SimpleNamespace(
+                completion="fine", dendrite=SimpleNamespace(status_code=200)
+            ),
+        ]
+        batch = CompletionBatch.from_responses("prompt", responses)
+        self.assertEqual(batch.indices, [0, 2])
+        self.assertEqual(list(batch), ["ok", "fine"])
+
+    def test_token_ids_are_memoized_per_tokenizer_and_arguments(self):
+        batch = CompletionBatch("the cat", self.completions)
+        first = CountingTokenizer(self.tokenizer)
+        # A second instance of the same tokenizer shares the cached tokens.
+        second = CountingTokenizer(self.tokenizer)
+
+        token_ids = batch.token_ids(first, truncation=True)
+        self.assertIs(batch.token_ids(second, truncation=True), token_ids)
+        self.assertEqual(first.texts + second.texts, len(self.completions))
+        self.assertEqual(token_ids[0], self.tokenizer("the cat sat")["input_ids"])
+
+        # Other arguments, prefixes and transforms are tokenized separately.
+        batch.token_ids(first)
+        prefixed = batch.token_ids(first, prefix="the ")
+        self.assertEqual(prefixed[2], self.tokenizer("the the mat")["input_ids"])
+        batch.token_ids(first, transform=str.upper)
+        self.assertEqual(first.texts, 4 * len(self.completions))
+
+        self.assertEqual(
+            batch.prompt_token_ids(first), self.tokenizer("the cat")["input_ids"]
+        )
+
+    def test_length_buckets(self):
+        self.assertEqual(length_buckets([3, 9, 1, 5, 7], 2), [[1, 4], [3, 0], [2]])
+        self.assertEqual(length_buckets([], 2), [])
+
+    def test_padded_buckets_cover_every_completion(self):
+        batch = CompletionBatch("", self.completions)
+        seen = []
+        for indices, inputs in batch.padded_buckets(self.tokenizer, bucket_size=2):
+            seen.extend(indices)
+            lengths = inputs["attention_mask"].sum(1).tolist()
+            self.assertEqual(inputs["input_ids"].shape[1], max(lengths))
+        self.assertEqual(sorted(seen), list(range(len(self.completions))))
+
+    def test_bucketed_embeddings_match_a_single_padded_batch(self):
+        model = DiversityRewardModel.__new__(DiversityRewardModel)
+        model.device, model.tokenizer, model.model = "cpu", self.tokenizer, tiny_model()
+        completions = self.completions[:3]
+
+        encoded = self.tokenizer(
+            completions, padding=True, truncation=True, return_tensors="pt"
+        )
+        with torch.no_grad():
+            output = model.model(**encoded)[0]
+        mask = encoded["attention_mask"].unsqueeze(-1).float()
+        expected = torch.nn.functional.normalize(
+            (output * mask).sum(1) / mask.sum(1), dim=1
+        )
+
+        embeddings = model.get_embeddings(CompletionBatch("", completions))
+        self.assertTrue(torch.allclose(embeddings, expected, atol=1e-5))
+
+    def test_chunked_relevance_embeddings_match_overflowing_tokenization(self):
+        model = BertRelevanceRewardModel.__new__(BertRelevanceRewardModel)
+        model.device, model.model = "cpu", tiny_model()
+        # Short sequences, so that completions are split into several chunks.
+        model.tokenizer = tiny_tokenizer(self.directory.name, model_max_length=5)
+        batch = CompletionBatch("the cat", self.completions)
+
+        expected = torch.stack([model.get_embedding(c) for c in batch])
+        embeddings = model.get_batch_embeddings(batch, bucket_size=3)
+        self.assertTrue(torch.allclose(embeddings, expected, atol=1e-5))
+        for reward, completion in zip(model.batch_reward(batch), batch):
+            self.assertAlmostEqual(reward, model.reward(batch.prompt, completion), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
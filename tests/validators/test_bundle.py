@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import os
+import json
+import torch
+import shutil
+import tempfile
+import unittest
+from safetensors.torch import load_file
+from prompting.validators import bundle
+
+
+class BundleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.manifest = {
+            "version": bundle.MANIFEST_VERSION,
+            "created": 0,
+            "models": {
+                "org/model": {
+                    "revision": "main",
+                    "commit": "0123456789abcdef",
+                    "path": "models/org--model",
+                    "weights": True,
+                }
+            },
+            "files": {
+                "org/checkpoint/ckpt.pt": {
+                    "revision": "main",
+                    "commit": "fedcba",
+                    "path": "files/org--checkpoint/ckpt.pt",
+                }
+            },
+        }
+        with open(os.path.join(self.path, bundle.MANIFEST_FILE), "w") as f:
+            json.dump(self.manifest, f)
+
+    def tearDown(self):
+        bundle._manifest = bundle._bundle_path = None
+        shutil.rmtree(self.path)
+
+    def test_without_bundle_models_load_from_the_hub(self):
+        self.assertEqual(bundle.resolve_model_path("org/model"), "org/model")
+        self.assertIsNone(bundle.resolve_file("org/checkpoint", "ckpt.pt"))
+
+    def test_resolve_bundled_models_and_files(self):
+        bundle.use_bundle(self.path)
+
+        self.assertEqual(
+            bundle.resolve_model_path("org/model"),
+            os.path.join(os.path.abspath(self.path), "models/org--model"),
+        )
+        self.assertEqual(
+            bundle.resolve_model_path("org/model", revision="0123456"),
+            os.path.join(os.path.abspath(self.path), "models/org--model"),
+        )
+        self.assertEqual(
+            bundle.resolve_file("org/checkpoint", "ckpt.pt"),
+            os.path.join(os.path.abspath(self.path), "files/org--checkpoint/ckpt.pt"),
+        )
+
+    def test_missing_or_mismatching_models_load_from_the_hub(self):
+        bundle.use_bundle(self.path)
+
+        self.assertEqual(bundle.resolve_model_path("org/other"), "org/other")
+        self.assertEqual(
+            bundle.resolve_model_path("org/model", revision="v2"), "org/model"
+        )
+
+    def test_unsupported_version(self):
+        self.manifest["version"] = 0
+        with open(os.path.join(self.path, bundle.MANIFEST_FILE), "w") as f:
+            json.dump(self.manifest, f)
+        with self.assertRaises(ValueError):
+            bundle.use_bundle(self.path)
+
+    def test_convert_to_safetensors(self):
+        embedding = torch.randn(4, 2)
+        torch.save(
+            {"embed.weight": embedding, "head.weight": embedding},
+            os.path.join(self.path, "pytorch_model-00001-of-00002.bin"),
+        )
+        torch.save(
+            {"bias": torch.zeros(2)},
+            os.path.join(self.path, "pytorch_model-00002-of-00002.bin"),
+        )
+        with open(os.path.join(self.path, "pytorch_model.bin.index.json"), "w") as f:
+            json.dump(
+                {
+                    "metadata": {},
+                    "weight_map": {
+                        "embed.weight": "pytorch_model-00001-of-00002.bin",
+                        "head.weight": "pytorch_model-00001-of-00002.bin",
+                        "bias": "pytorch_model-00002-of-00002.bin",
+                    },
+                },
+                f,
+            )
+
+        bundle.convert_to_safetensors(self.path)
+
+        with open(os.path.join(self.path, "model.safetensors.index.json")) as f:
+            weight_map = json.load(f)["weight_map"]
+        self.assertEqual(weight_map["bias"], "model-00002-of-00002.safetensors")
+        first = load_file(os.path.join(self.path, "model-00001-of-00002.safetensors"))
+        self.assertTrue(torch.equal(first["embed.weight"], embedding))
+        self.assertTrue(torch.equal(first["head.weight"], embedding))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.path, "pytorch_model-00001-of-00002.bin"))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import torch
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from prompting.validators.checkpoint import (
+    Checkpointer,
+    EmbeddingSegment,
+    Snapshot,
+    atomic_save,
+)
+from prompting.validators.scoreboard import Scoreboard
+from prompting.validators.utils import load_state, save_state
+
+
+class FakeDiversityModel:
+    def __init__(self):
+        self.historic_embeddings = torch.tensor([])
+        self.historic_count = 0
+
+    def add(self, embeddings: torch.FloatTensor, max_rows: int):
+        self.historic_count += len(embeddings)
+        self.historic_embeddings = torch.cat([self.historic_embeddings, embeddings])[
+            -max_rows:
+        ]
+
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_atomic_save_leaves_no_temporary_files(self):
+        path = os.path.join(self.path, "model.torch")
+        atomic_save({"a": 1}, path)
+        atomic_save({"a": 2}, path)
+        self.assertEqual(torch.load(path), {"a": 2})
+        self.assertEqual(os.listdir(self.path), ["model.torch"])
+
+    def test_segment_appends_and_ignores_interrupted_appends(self):
+        segment = EmbeddingSegment(os.path.join(self.path, "embeddings"), max_rows=10)
+        self.assertIsNone(segment.load())
+        rows = torch.randn(6, 4)
+        segment.append(rows[:4])
+        segment.append(rows[4:])
+
+        # Bytes of an append interrupted before its rows were committed.
+        with open(segment.data_path(0), "ab") as f:
+            f.write(b"\x00" * 5)
+        loaded = segment.load()
+        self.assertEqual(loaded.dtype, torch.float32)
+        torch.testing.assert_close(loaded, rows.half().float())
+
+        segment.append(rows[:1])
+        torch.testing.assert_close(
+            segment.load(), torch.cat([rows, rows[:1]]).half().float()
+        )
+
+    def test_segment_is_compacted_to_the_last_rows(self):
+        segment = EmbeddingSegment(os.path.join(self.path, "embeddings"), max_rows=4)
+        rows = torch.randn(9, 2)
+        for start in range(0, 9, 3):
+            segment.append(rows[start : start + 3])
+
+        self.assertEqual(segment.index()["generation"], 1)
+        self.assertEqual(
+            sorted(os.listdir(self.path)), ["embeddings.1.f16", "embeddings.json"]
+        )
+        torch.testing.assert_close(segment.load(), rows[-4:].half().float())
+
+    def test_snapshots_only_hold_new_embeddings(self):
+        segment = EmbeddingSegment(os.path.join(self.path, "embeddings"), max_rows=8)
+        checkpointer = Checkpointer(segment)
+        model = FakeDiversityModel()
+        sizes = []
+        for step in range(5):
+            model.add(torch.randn(3, 4), max_rows=8)
+            snapshot = Snapshot()
+            checkpointer.snapshot_embeddings(
+                snapshot, model.historic_embeddings, model.historic_count
+            )
+            sizes.append(len(snapshot.embeddings))
+            checkpointer.submit(snapshot)
+
+        self.assertEqual(sizes, [3, 3, 3, 3, 3])
+        self.assertTrue(checkpointer.close(timeout=10))
+        torch.testing.assert_close(
+            segment.load(), model.historic_embeddings.half().float()
+        )
+
+    def test_failed_writes_rewrite_the_segment(self):
+        segment = EmbeddingSegment(os.path.join(self.path, "embeddings"), max_rows=8)
+        checkpointer = Checkpointer(segment, background=False)
+        model = FakeDiversityModel()
+
+        model.add(torch.randn(3, 4), max_rows=8)
+        snapshot = Snapshot()
+        checkpointer.snapshot_embeddings(
+            snapshot, model.historic_embeddings, model.historic_count
+        )
+        segment.path = os.path.join(self.path, "missing", "embeddings")
+        checkpointer.submit(snapshot)
+        segment.path = os.path.join(self.path, "embeddings")
+
+        model.add(torch.randn(2, 4), max_rows=8)
+        snapshot = Snapshot()
+        checkpointer.snapshot_embeddings(
+            snapshot, model.historic_embeddings, model.historic_count
+        )
+        self.assertTrue(snapshot.rewrite)
+        checkpointer.submit(snapshot)
+        torch.testing.assert_close(
+            segment.load(), model.historic_embeddings.half().float()
+        )
+
+    def make_neuron(self):
+        config = SimpleNamespace(
+            neuron=SimpleNamespace(full_path=self.path),
+            gating=SimpleNamespace(model_name="EleutherAI/gpt-neo-125m"),
+            wandb=SimpleNamespace(off=True),
+        )
+        return SimpleNamespace(
+            config=config,
+            device="cpu",
+            metagraph=SimpleNamespace(n=torch.tensor(4)),
+            scoreboard=Scoreboard(4),
+            hotkeys=["a", "b", "c", "d"],
+            gating_model=SimpleNamespace(linear=torch.nn.Linear(8, 4)),
+            gating_trainer=None,
+            diversity_model=FakeDiversityModel(),
+            checkpointer=Checkpointer(
+                EmbeddingSegment(
+                    os.path.join(self.path, "diversity_embeddings"), max_rows=8
+                )
+            ),
+        )
+
+    def test_save_state_is_written_in_the_background_and_reloaded(self):
+        neuron = self.make_neuron()
+        neuron.scoreboard.update(
+            torch.tensor([0, 1, 2, 3]), torch.tensor([2.0, 4.0, 6.0, 8.0])
+        )
+        neuron.diversity_model.add(torch.randn(5, 8), max_rows=8)
+        save_state(neuron)
+        # The saved state is a snapshot, later updates are not written.
+        neuron.gating_model.linear.weight.data.add_(1.0)
+        neuron.diversity_model.add(torch.randn(2, 8), max_rows=8)
+        self.assertTrue(neuron.checkpointer.close(timeout=10))
+
+        restored = self.make_neuron()
+        load_state(restored)
+        torch.testing.assert_close(
+            restored.scoreboard.scores, torch.tensor([0.1, 0.2, 0.3, 0.4])
+        )
+        self.assertEqual(restored.scoreboard.queries.tolist(), [1, 1, 1, 1])
+        torch.testing.assert_close(
+            restored.gating_model.linear.weight,
+            neuron.gating_model.linear.weight - 1.0,
+        )
+        torch.testing.assert_close(
+            restored.diversity_model.historic_embeddings,
+            neuron.diversity_model.historic_embeddings[:5].half().float(),
+        )
+        self.assertEqual(restored.diversity_model.historic_count, 5)
+
+        # Only the embeddings added since the reload are written.
+        restored.diversity_model.add(torch.randn(2, 8), max_rows=8)
+        snapshot = Snapshot()
+        restored.checkpointer.snapshot_embeddings(
+            snapshot,
+            restored.diversity_model.historic_embeddings,
+            restored.diversity_model.historic_count,
+        )
+        self.assertEqual(len(snapshot.embeddings), 2)
+        self.assertFalse(snapshot.rewrite)
+
+    def test_previous_diversity_checkpoint_is_loaded(self):
+        embeddings = torch.randn(3, 8)
+        torch.save(
+            {"historic_embeddings": embeddings},
+            os.path.join(self.path, "diversity_model.pth"),
+        )
+        neuron = self.make_neuron()
+        load_state(neuron)
+        torch.testing.assert_close(
+            neuron.diversity_model.historic_embeddings, embeddings
+        )
+        # The first snapshot writes the whole history to the segment.
+        snapshot = Snapshot()
+        neuron.checkpointer.snapshot_embeddings(
+            snapshot,
+            neuron.diversity_model.historic_embeddings,
+            neuron.diversity_model.historic_count,
+        )
+        self.assertTrue(snapshot.rewrite)
+        self.assertEqual(len(snapshot.embeddings), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import os
+import shutil
+import tempfile
+import unittest
+from prompting.validators.corpus import CorpusDataset, build_corpus, main
+
+
+class CorpusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        texts = ["First document.", "", "Dőcument with ünicode. ✓", "\n", "Last."]
+        count = build_corpus(texts, os.path.join(self.path, "corpus"))
+
+        corpus = CorpusDataset(os.path.join(self.path, "corpus"))
+        self.assertEqual(count, 3)
+        self.assertEqual(len(corpus), 3)
+        self.assertEqual(
+            [corpus[i] for i in range(len(corpus))],
+            ["First document.", "Dőcument with ünicode. ✓", "Last."],
+        )
+
+    def test_sampling_is_reproducible(self):
+        build_corpus([f"Document {i}." for i in range(100)], self.path)
+
+        samples = [
+            item["text"] for _, item in zip(range(20), CorpusDataset(self.path, seed=1))
+        ]
+        again = [
+            item["text"] for _, item in zip(range(20), CorpusDataset(self.path, seed=1))
+        ]
+        self.assertEqual(samples, again)
+        self.assertGreater(len(set(samples)), 1)
+
+    def test_build_limits(self):
+        text = " ".join(f"Sentence {i}." for i in range(50))
+        count = build_corpus([text] * 10, self.path, max_documents=4, max_sentences=31)
+
+        corpus = CorpusDataset(self.path)
+        self.assertEqual(count, 4)
+        self.assertEqual(corpus[0].count("."), 31)
+
+    def test_cli_from_text_files(self):
+        source = os.path.join(self.path, "source")
+        os.makedirs(os.path.join(source, "nested"))
+        for name, text in [("a.txt", "Alpha."), ("nested/b.txt", "Beta.")]:
+            with open(os.path.join(source, name), "w") as f:
+                f.write(text)
+
+        output = os.path.join(self.path, "corpus")
+        main([output, "--dir", source])
+
+        corpus = CorpusDataset(output)
+        self.assertEqual(
+            sorted(corpus[i] for i in range(len(corpus))), ["Alpha.", "Beta."]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
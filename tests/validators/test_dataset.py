@@ -16,8 +16,14 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import shutil
+import tempfile
 import unittest
-from prompting.validators.dataset import Dataset
+from prompting.validators.dataset import (
+    Dataset,
+    PrefetchDataset,
+    truncate_sentences,
+)
 
 
 class DatasetTestCase(unittest.TestCase):
@@ -40,5 +46,70 @@ class DatasetTestCase(unittest.TestCase):
         self.assertEqual(dataset.__next__(), {"text": "Non-empty text"})
 
 
+class PrefetchDatasetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_path)
+
+    def test_truncation_preserves_the_flow_context(self):
+        text = " ".join(f"Sentence {i}." for i in range(50))
+        truncated = truncate_sentences(text, 31)
+
+        self.assertEqual(truncated.count("."), 31)
+        for cutoff in range(15, 31):
+            self.assertEqual(
+                ".".join(truncated.split(".", maxsplit=cutoff)[:-1]),
+                ".".join(text.split(".", maxsplit=cutoff)[:-1]),
+            )
+        self.assertEqual(truncate_sentences("Short text. ", 31), "Short text. ")
+
+    def test_prefetch_filters_and_stops_at_end_of_source(self):
+        texts = [
+            {"text": ""},
+            {"text": "\n\n"},
+            {"text": "First."},
+            {"text": "Second."},
+        ]
+        dataset = PrefetchDataset(source_factory=lambda: iter(texts))
+
+        self.assertEqual(list(dataset), [{"text": "First."}, {"text": "Second."}])
+        with self.assertRaises(StopIteration):
+            next(dataset)
+
+    def test_source_is_recreated_after_errors(self):
+        calls = []
+
+        def source_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("dataset unreachable")
+            return iter([{"text": "Recovered."}])
+
+        dataset = PrefetchDataset(source_factory=source_factory, retry_interval=0)
+        self.assertEqual(next(dataset), {"text": "Recovered."})
+
+    def test_cache_is_served_after_restart(self):
+        texts = [{"text": f"Document {i}."} for i in range(10)]
+        dataset = PrefetchDataset(
+            source_factory=lambda: iter(texts),
+            cache_path=self.cache_path,
+            cache_size=6,
+        )
+        list(dataset)
+        dataset.close()
+
+        # The restarted dataset serves the most recent documents while the source is unavailable.
+        restarted = PrefetchDataset(
+            source_factory=lambda: iter([]),
+            cache_path=self.cache_path,
+            cache_size=6,
+        )
+        cached = [item["text"] for item in restarted]
+        self.assertTrue(4 <= len(cached) <= 6)
+        self.assertTrue(set(cached).issubset({item["text"] for item in texts[4:]}))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -31,6 +31,10 @@ class EventTestCase(unittest.TestCase):
             "completion_times": [0.123],
             "completion_status_messages": ["Success"],
             "completion_status_codes": ["1"],
+            "completion_first_token_times": [0.01],
+            "completion_tokens_per_second": [100.0],
+            "stage_times": {"query": 1.0, "query_cpu": 0.1},
+            "stage_time_percentiles": {"query_p50": 1.0},
             "name": "test-name",
             "block": 1.0,
             "gating_loss": 1.0,
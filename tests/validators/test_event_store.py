@@ -0,0 +1,116 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import os
+import shutil
+import tempfile
+import unittest
+from prompting.validators.event_store import EventStore, EventReader
+
+
+def make_event(i):
+    return {
+        "name": "augment",
+        "block": i,
+        "prompt": "Summarize the following context. " * 50,
+        "uids": [1, 2, 3],
+        "completions": ["the same answer", "another answer", "the same answer"],
+        "completion_times": [0.5, 1.0, 0],
+        "rewards": [0.1 * i, 0.0, 1.0],
+        "stage_times": {"query": 1.0, "query_cpu": 0.1},
+    }
+
+
+class EventStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        store = EventStore(self.path, batch_size=4, flush_interval=0.1)
+        events = [make_event(i) for i in range(10)]
+        for event in events:
+            store.log(event)
+        store.close()
+
+        self.assertEqual(list(EventReader(self.path).iter_events()), events)
+
+    def test_a_bad_event_does_not_lose_its_batch(self):
+        store = EventStore(self.path, batch_size=4, flush_interval=0.1)
+        events = [make_event(i) for i in range(4)]
+        bad_event = {**make_event(4), "unserializable": object()}
+        for event in events[:2] + [bad_event] + events[2:]:
+            store.log(event)
+        store.close()
+
+        self.assertEqual(list(EventReader(self.path).iter_events()), events)
+        self.assertEqual(store.dropped, 1)
+
+    def test_strings_are_stored_once_per_segment(self):
+        store = EventStore(self.path, batch_size=4, flush_interval=0.1)
+        for i in range(10):
+            store.log(make_event(i))
+        store.close()
+
+        reader = EventReader(self.path)
+        (segment,) = reader.segments()
+        strings = reader.strings(segment)
+        self.assertEqual(
+            sorted(strings.values()),
+            sorted(
+                {
+                    "augment",
+                    make_event(0)["prompt"],
+                    "the same answer",
+                    "another answer",
+                }
+            ),
+        )
+
+    def test_events_readable_before_close(self):
+        store = EventStore(self.path, batch_size=64, flush_interval=10)
+        store.log(make_event(0))
+        store.flush()
+
+        self.assertEqual(list(EventReader(self.path).iter_events()), [make_event(0)])
+        store.close()
+
+    def test_rotation_by_size_and_schema(self):
+        store = EventStore(
+            self.path, max_segment_bytes=1, batch_size=1, flush_interval=0.1
+        )
+        store.log(make_event(0))
+        store.log(make_event(1))
+        store.close()
+        self.assertEqual(len(EventReader(self.path).segments()), 2)
+
+        shutil.rmtree(self.path)
+        store = EventStore(self.path, batch_size=1, flush_interval=0.1)
+        store.log(make_event(0))
+        store.log({"name": "augment", "new_column": [1.0]})
+        store.close()
+
+        reader = EventReader(self.path)
+        self.assertEqual(len(reader.segments()), 2)
+        self.assertEqual(list(reader.iter_events())[-1]["new_column"], [1.0])
+        self.assertEqual(len(reader.strings(reader.segments()[-1])), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import time
+import asyncio
+import unittest
+import bittensor as bt
+from aiohttp import web
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from prompting.protocol import StreamPrompting
+from prompting.validators.dataset import Dataset
+from prompting.validators.forward import (
+    questions_and_answers_around_summary_flow,
+    stream_response,
+)
+
+
+class FakeStreamingDendrite:
+    """Mimics `bt.dendrite.call_stream`: yields token lists, then the synapse from its `finally` block."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def call_stream(self, target_axon, synapse, timeout, deserialize=True):
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(0)
+                yield chunk
+            synapse.completion = "".join("".join(chunk) for chunk in self.chunks)
+            synapse.dendrite.status_code = 200
+        except GeneratorExit:
+            self.closed = True
+            raise
+        finally:
+            yield synapse
+
+
+class StreamResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.synapse = StreamPrompting(roles=["user"], messages=["test"])
+
+    def stream(self, dendrite, **kwargs):
+        neuron = SimpleNamespace(dendrite=dendrite)
+        return asyncio.run(
+            stream_response(
+                neuron, axon=None, synapse=self.synapse, timeout=1, **kwargs
+            )
+        )
+
+    def test_full_stream_returns_final_synapse(self):
+        dendrite = FakeStreamingDendrite([["Hello", " "], ["world"]])
+
+        response, stats = self.stream(dendrite)
+
+        self.assertEqual(response.completion, "Hello world")
+        self.assertEqual(response.dendrite.status_code, 200)
+        self.assertFalse(dendrite.closed)
+        self.assertGreater(stats["tokens_per_second"], 0)
+
+    def test_stream_is_cut_off_at_token_budget(self):
+        dendrite = FakeStreamingDendrite([["a", "b"], ["c", "d"], ["e"]])
+
+        response, stats = self.stream(dendrite, token_budget=3)
+
+        self.assertEqual(response.completion, "abc")
+        self.assertEqual(response.dendrite.status_code, 200)
+        self.assertTrue(dendrite.closed)
+        self.assertGreaterEqual(stats["first_token_time"], 0)
+
+    def test_stream_is_cut_off_at_byte_budget(self):
+        dendrite = FakeStreamingDendrite([["é", "é"], ["é"]])
+
+        response, _ = self.stream(dendrite, byte_budget=5)
+
+        self.assertEqual(response.completion, "éé")
+        self.assertTrue(dendrite.closed)
+
+    def test_cut_off_streams_do_not_share_terminal_infos(self):
+        async def stream_all():
+            return await asyncio.gather(
+                *[
+                    stream_response(
+                        SimpleNamespace(dendrite=FakeStreamingDendrite([["a", "b"]])),
+                        axon=None,
+                        synapse=self.synapse,
+                        timeout=1,
+                        token_budget=1,
+                    )
+                    for _ in range(2)
+                ]
+            )
+
+        (first, _), (second, _) = asyncio.run(stream_all())
+        self.assertEqual(first.dendrite.status_code, 200)
+        self.assertIsNot(first.dendrite, second.dendrite)
+        self.assertIsNone(self.synapse.dendrite.status_code)
+
+
+class SlowStream:
+    """Streaming dataset whose generator takes a while per item, like the shuffle buffer of a HF dataset."""
+
+    def shuffle(self, seed, buffer_size):
+        return self
+
+    def __iter__(self):
+        while True:
+            time.sleep(0.05)
+            yield {"text": "Sentence. " * 40}
+
+
+class StepDone(Exception):
+    pass
+
+
+class FlowTestCase(unittest.TestCase):
+    def test_concurrent_forwards_read_a_streaming_dataset(self):
+        with patch("datasets.load_dataset", return_value=SlowStream()):
+            neuron = SimpleNamespace(dataset=Dataset(), config=MagicMock())
+
+        async def run_forwards():
+            return await asyncio.gather(
+                *[questions_and_answers_around_summary_flow(neuron) for _ in range(4)],
+                return_exceptions=True,
+            )
+
+        # The step following the read is not under test.
+        with patch(
+            "prompting.validators.forward.run_step", side_effect=StepDone
+        ) as run_step:
+            results = asyncio.run(run_forwards())
+        self.assertTrue(all(isinstance(result, StepDone) for result in results))
+        self.assertEqual(run_step.call_count, 4)
+
+    def test_exhausted_dataset_is_reported(self):
+        neuron = SimpleNamespace(dataset=iter([]))
+        with self.assertRaisesRegex(RuntimeError, "exhausted"):
+            asyncio.run(questions_and_answers_around_summary_flow(neuron))
+
+
+class DendriteStreamTestCase(unittest.TestCase):
+    """Streams from a local http server with the bittensor 6.1.0 dendrite, which has no `call_stream`."""
+
+    chunks = [b"Hello\n", b" world\n", b"!\n"]
+
+    async def handler(self, request):
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "bt_header_axon_status_code": "200",
+                "bt_header_axon_status_message": "Success",
+            }
+        )
+        await response.prepare(request)
+        try:
+            for chunk in self.chunks:
+                await response.write(chunk)
+                await asyncio.sleep(0.01)
+            await response.write_eof()
+        except ConnectionResetError:
+            # The stream was cut off by the dendrite.
+            pass
+        return response
+
+    def stream(self, **kwargs):
+        async def run():
+            app = web.Application()
+            app.router.add_post("/StreamPrompting", self.handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            with patch(
+                "bittensor.utils.networking.get_external_ip", return_value="10.0.0.1"
+            ):
+                dendrite = bt.dendrite(
+                    wallet=bt.Keypair.create_from_mnemonic(
+                        bt.Keypair.generate_mnemonic()
+                    )
+                )
+            self.assertFalse(hasattr(dendrite, "call_stream"))
+            axon = bt.AxonInfo(
+                version=1,
+                ip="127.0.0.1",
+                port=port,
+                ip_type=4,
+                hotkey="hotkey",
+                coldkey="coldkey",
+            )
+            try:
+                return await stream_response(
+                    SimpleNamespace(dendrite=dendrite),
+                    axon=axon,
+                    synapse=StreamPrompting(roles=["user"], messages=["test"]),
+                    timeout=5,
+                    **kwargs,
+                )
+            finally:
+                await dendrite.close_session()
+                await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_full_stream(self):
+        response, stats = self.stream()
+        self.assertEqual(response.completion, "Hello world!")
+        self.assertEqual(response.dendrite.status_code, 200)
+        self.assertIsNotNone(response.dendrite.process_time)
+        self.assertGreater(stats["tokens_per_second"], 0)
+
+    def test_stream_is_cut_off_at_token_budget(self):
+        response, _ = self.stream(token_budget=1)
+        self.assertEqual(response.completion, "Hello")
+        self.assertEqual(response.dendrite.status_message, "Stream cut off at budget")
+
+
+if __name__ == "__main__":
+    unittest.main()
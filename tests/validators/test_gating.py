@@ -0,0 +1,136 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import torch
+import tempfile
+import unittest
+from transformers import BertTokenizerFast, GPTNeoConfig, GPTNeoModel
+from prompting.validators.gating import BaseGatingModel, GatingModel
+
+WORDS = "the a cat dog sat on mat ran far away".split()
+
+
+class CountingGatingModel(BaseGatingModel):
+    def __init__(self, feature_cache_size: int):
+        super().__init__(feature_cache_size=feature_cache_size)
+        self.linear = torch.nn.Linear(2, 3)
+        self.encoded = []
+
+    def encode(self, message: str) -> torch.FloatTensor:
+        self.encoded.append(message)
+        return torch.tensor([float(len(message)), 1.0])
+
+    def forward(self, message: str) -> torch.FloatTensor:
+        return self.linear(self.features(message))
+
+    def backward(self, scores, rewards):
+        pass
+
+    def resync(self, previous_metagraph, metagraph):
+        pass
+
+
+class GatingModelTestCase(unittest.TestCase):
+    def test_features_are_cached_per_message(self):
+        model = CountingGatingModel(feature_cache_size=2)
+        first = model("the cat")
+        self.assertTrue(torch.equal(model("the cat"), first))
+        self.assertEqual(model.encoded, ["the cat"])
+        self.assertEqual((model.feature_cache_hits, model.feature_cache_misses), (1, 1))
+
+    def test_least_recently_used_features_are_evicted(self):
+        model = CountingGatingModel(feature_cache_size=2)
+        for message in ["a", "b", "a", "c", "a", "b"]:
+            model(message)
+        # b was evicted by c, a stayed in the cache.
+        self.assertEqual(model.encoded, ["a", "b", "c", "b"])
+        self.assertEqual(len(model.feature_cache), 2)
+
+    def test_disabled_cache_encodes_every_call(self):
+        model = CountingGatingModel(feature_cache_size=0)
+        model("a")
+        model("a")
+        self.assertEqual(model.encoded, ["a", "a"])
+
+    def test_cached_features_still_train_the_linear_layer(self):
+        model = CountingGatingModel(feature_cache_size=2)
+        model("the cat")
+        scores = model("the cat")
+        scores.sum().backward()
+        self.assertIsNotNone(model.linear.weight.grad)
+
+    def tiny_gating_model(self) -> GatingModel:
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "vocab.txt"), "w") as f:
+                f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + WORDS))
+            tokenizer = BertTokenizerFast(
+                os.path.join(path, "vocab.txt"), model_max_length=6
+            )
+
+        torch.manual_seed(0)
+        model = GatingModel.__new__(GatingModel)
+        BaseGatingModel.__init__(model, feature_cache_size=4)
+        model.device = torch.device("cpu")
+        model.tokenizer = tokenizer
+        model.model = GPTNeoModel(
+            GPTNeoConfig(
+                vocab_size=len(WORDS) + 4,
+                hidden_size=8,
+                num_layers=2,
+                num_heads=2,
+                attention_types=[[["global"], 2]],
+                max_position_embeddings=16,
+            )
+        ).eval()
+        model.linear = torch.nn.Linear(8, 3)
+        return model
+
+    def test_encode_reads_the_first_chunk(self):
+        model = self.tiny_gating_model()
+        tokenizer = model.tokenizer
+        message = "the cat sat on the mat and the dog ran far away"
+        # Features read by the gating model before encoding only the first chunk.
+        encoded_input = tokenizer(
+            message,
+            truncation=True,
+            padding=True,
+            return_overflowing_tokens=True,
+            return_tensors="pt",
+        )
+        encoded_input.pop("overflow_to_sample_mapping")
+        self.assertGreater(encoded_input["input_ids"].shape[0], 1)
+        with torch.no_grad():
+            expected = model.model(**encoded_input).last_hidden_state[0, -1, :]
+
+        self.assertTrue(torch.allclose(model.encode(message), expected, atol=1e-6))
+        self.assertTrue(
+            torch.allclose(model(message), model.linear(expected), atol=1e-6)
+        )
+
+    def test_encode_batch_matches_encode(self):
+        model = self.tiny_gating_model()
+        messages = ["the cat", "the dog sat on the mat and ran far away", "a"]
+        expected = torch.stack([model.encode(message) for message in messages])
+        self.assertTrue(
+            torch.allclose(model.encode_batch(messages), expected, atol=1e-5)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import math
+import torch
+import shutil
+import tempfile
+import unittest
+from loguru import logger
+from prompting.validators.event_store import EventStore
+from prompting.validators.gating import BaseGatingModel
+from prompting.validators.gating_offline import load_steps, read_log_steps, train
+from prompting.validators.utils import gating_linear_layer_path
+
+
+def make_event(i):
+    return {
+        "name": "augment",
+        "prompt": f"prompt {i % 3}",
+        "uids": [0, 1, 2],
+        # The uid matching the prompt gets the reward.
+        "rewards": [float(i % 3 == uid) for uid in range(3)],
+        "completions": ["a", "b", "c"],
+    }
+
+
+class PromptGatingModel(BaseGatingModel):
+    """Encodes `prompt <n>` as the one-hot vector of n."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.linear = torch.nn.Linear(3, 4)
+
+    def encode(self, message: str) -> torch.FloatTensor:
+        return torch.nn.functional.one_hot(
+            torch.tensor(int(message.split()[-1])), 3
+        ).float()
+
+    def forward(self, message: str) -> torch.FloatTensor:
+        return self.linear(self.features(message))
+
+    def backward(self, scores, rewards):
+        pass
+
+    def resync(self, previous_metagraph, metagraph):
+        pass
+
+
+class GatingOfflineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_log(self, name: str, events):
+        path = os.path.join(self.path, name)
+        try:
+            logger.level("EVENTS", no=38, icon="📝")
+        except (TypeError, ValueError):
+            pass
+        sink = logger.add(
+            path,
+            serialize=True,
+            level="EVENTS",
+            filter=lambda record: record["level"].name == "EVENTS",
+        )
+        for event in events:
+            logger.log("EVENTS", "events", **event)
+        logger.remove(sink)
+        return path
+
+    def test_log_steps_are_read_from_the_record_extra(self):
+        events = [make_event(i) for i in range(4)]
+        events.append({**make_event(4), "rewards": [float("nan"), 0.0, 1.0]})
+        events.append({**make_event(5), "uids": [0, 1]})
+        path = self.write_log("completions.log", events)
+
+        steps = read_log_steps(path)
+        self.assertEqual(len(steps), 4)
+        self.assertEqual(steps[1], ("prompt 1", [0, 1, 2], [0.0, 1.0, 0.0]))
+
+    def test_logs_and_event_store_are_read_in_parallel(self):
+        logs = [
+            self.write_log(f"completions.{i}.log", [make_event(i) for i in range(3)])
+            for i in range(2)
+        ]
+        store = EventStore(os.path.join(self.path, "events"), flush_interval=0.1)
+        for i in range(5):
+            store.log(make_event(i))
+        store.close()
+
+        steps = load_steps(logs, os.path.join(self.path, "events"), workers=2)
+        self.assertEqual(len(steps), 11)
+        self.assertIn(("prompt 2", [0, 1, 2], [0.0, 0.0, 1.0]), steps)
+
+    def test_train_fits_the_head(self):
+        model = PromptGatingModel()
+        steps = [
+            (event["prompt"], event["uids"], event["rewards"])
+            for event in map(make_event, range(30))
+        ]
+        losses = train(
+            model, steps, epochs=30, batch_size=8, learning_rate=1.0, momentum=0.9
+        )
+        self.assertLess(losses[-1], losses[0] / 2)
+        self.assertTrue(all(math.isfinite(loss) for loss in losses))
+        # The head favours the rewarded uid of each prompt.
+        for n in range(3):
+            self.assertEqual(model(f"prompt {n}")[:3].argmax().item(), n)
+
+    def test_head_is_saved_where_save_state_writes_it(self):
+        self.assertEqual(
+            gating_linear_layer_path("/validator", "EleutherAI/gpt-neo-125m"),
+            "/validator/EleutherAI_gpt-neo-125m_gating_linear_layer.pth",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
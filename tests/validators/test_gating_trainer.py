@@ -0,0 +1,127 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import torch
+import unittest
+from types import SimpleNamespace
+from prompting.validators.gating_trainer import GatingTrainer, ReplayBuffer
+
+
+class LinearGatingModel(torch.nn.Module):
+    def __init__(self, num_features: int = 4, num_uids: int = 8):
+        super().__init__()
+        torch.manual_seed(0)
+        self.linear = torch.nn.Linear(num_features, num_uids)
+
+    def forward(self, features: torch.FloatTensor) -> torch.FloatTensor:
+        return self.linear(features)
+
+
+class ReplayBufferTestCase(unittest.TestCase):
+    def test_buffer_keeps_the_most_recent_samples(self):
+        buffer = ReplayBuffer(capacity=3)
+        for i in range(5):
+            buffer.push(
+                torch.tensor([float(i)]), torch.tensor([i]), torch.tensor([1.0])
+            )
+        self.assertEqual(len(buffer), 3)
+        sampled = sorted(int(features.item()) for features, _, _ in buffer.sample(10))
+        self.assertEqual(sampled, [2, 3, 4])
+        self.assertEqual(len(buffer.sample(2)), 2)
+
+
+class GatingTrainerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.model = LinearGatingModel()
+        # A long interval, the tests call train_step themselves.
+        self.trainer = GatingTrainer(
+            self.model, buffer_size=16, batch_size=4, interval=60, learning_rate=0.5
+        )
+
+    def tearDown(self):
+        self.trainer.stop(timeout=1)
+
+    def push_steps(self, n: int):
+        features = torch.ones(4)
+        uids = torch.tensor([0, 1, 2])
+        rewards = torch.tensor([5.0, 0.0, 0.0])
+        return [self.trainer.push(features, uids, rewards) for _ in range(n)]
+
+    def test_push_does_not_update_the_model(self):
+        before = self.model.linear.weight.clone()
+        loss = self.push_steps(1)[0]
+        self.assertGreater(loss.item(), 0)
+        self.assertTrue(torch.equal(self.model.linear.weight, before))
+        self.assertEqual(len(self.trainer.buffer), 1)
+
+    def test_train_step_publishes_a_new_head(self):
+        self.assertIsNone(self.trainer.train_step())
+        first_loss = self.push_steps(4)[0]
+        published = self.model.linear
+
+        for _ in range(20):
+            self.trainer.train_step()
+
+        self.assertIsNot(self.model.linear, published)
+        self.assertIsNot(self.model.linear, self.trainer.head)
+        self.assertTrue(torch.equal(self.model.linear.weight, self.trainer.head.weight))
+        self.assertLess(self.push_steps(1)[0].item(), first_loss.item())
+
+    def test_gradients_do_not_accumulate_across_updates(self):
+        self.push_steps(1)
+        self.trainer.train_step()
+
+        # Gradient of the single sample at the current weights.
+        head = torch.nn.Linear(4, 8)
+        head.load_state_dict(self.trainer.head.state_dict())
+        scores = torch.nn.functional.softmax(head(torch.ones(4))[[0, 1, 2]], dim=0)
+        rewards = torch.nn.functional.softmax(torch.tensor([5.0, 0.0, 0.0]), dim=0)
+        torch.nn.functional.mse_loss(scores, rewards).backward()
+
+        self.trainer.train_step()
+        self.assertTrue(torch.allclose(self.trainer.head.weight.grad, head.weight.grad))
+
+    def test_background_thread_trains_on_new_steps(self):
+        trainer = GatingTrainer(self.model, batch_size=4, interval=0.01)
+        try:
+            published = self.model.linear
+            trainer.push(torch.ones(4), torch.tensor([0, 1]), torch.tensor([1.0, 0.0]))
+            deadline = time.time() + 5
+            while trainer.steps == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(trainer.steps, 1)
+            self.assertIsNot(self.model.linear, published)
+            # No new steps, no further updates.
+            time.sleep(0.05)
+            self.assertEqual(trainer.steps, 1)
+        finally:
+            trainer.stop(timeout=1)
+
+    def test_resync_reinitializes_replaced_uids_and_clears_the_buffer(self):
+        self.push_steps(2)
+        previous = SimpleNamespace(uids=torch.arange(8), hotkeys=list("abcdefgh"))
+        metagraph = SimpleNamespace(uids=torch.arange(8), hotkeys=list("abcdefgz"))
+        self.trainer.resync(previous, metagraph)
+        self.assertEqual(len(self.trainer.buffer), 0)
+        self.assertEqual(self.model.linear.bias[7].item(), 0)
+        self.assertTrue(torch.equal(self.model.linear.weight, self.trainer.head.weight))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import time
+import unittest
+from prompting.validators.loader import LazyModel, ModelLoader
+
+
+class SlowModel:
+    def __init__(self, name: str, delay: float):
+        time.sleep(delay)
+        self.name = name
+        self.calls = 0
+
+    def apply(self):
+        self.calls += 1
+        return self.name
+
+
+class ModelLoaderTestCase(unittest.TestCase):
+    def test_models_load_concurrently(self):
+        loader = ModelLoader(max_workers=4)
+        start = time.perf_counter()
+        models = [
+            loader.load(f"model_{i}", lambda i=i: SlowModel(f"model_{i}", 0.2))
+            for i in range(4)
+        ]
+        loader.close()
+        models = loader.resolve(models)
+
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual(
+            [model.name for model in models], [f"model_{i}" for i in range(4)]
+        )
+        self.assertTrue(all(isinstance(model, SlowModel) for model in models))
+        self.assertEqual(set(loader.timings), {f"model_{i}" for i in range(4)})
+        self.assertIn("total (sequential)", loader.report())
+
+    def test_lazy_model_forwards_to_the_model(self):
+        loader = ModelLoader()
+        model = loader.load("slow", lambda: SlowModel("slow", 0.1))
+
+        # The name is known before the model is loaded.
+        self.assertIsInstance(model, LazyModel)
+        self.assertEqual(str(model), "slow")
+
+        self.assertEqual(model.apply(), "slow")
+        model.calls = 10
+        self.assertEqual(model.model.calls, 10)
+        self.assertTrue(model.loaded)
+
+    def test_resolve_keeps_plain_models_and_raises_load_errors(self):
+        def fail():
+            raise RuntimeError("missing weights")
+
+        loader = ModelLoader()
+        plain = SlowModel("plain", 0)
+        failing = loader.load("failing", fail)
+        loader.close()
+
+        self.assertIs(loader.resolve([plain])[0], plain)
+        with self.assertRaises(RuntimeError):
+            loader.resolve([failing])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+import torch
+import bittensor as bt
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from prompting.validators.metagraph_sync import (
+    MetagraphSyncer,
+    MetagraphUpdate,
+    axon_hashes,
+    replaced_uids,
+)
+from prompting.validators.sampler import UidSampler
+from prompting.validators.scoreboard import Scoreboard
+from prompting.validators.utils import resync_metagraph
+
+
+def make_metagraph(hotkeys, axons=None):
+    return SimpleNamespace(
+        netuid=1,
+        hotkeys=list(hotkeys),
+        axons=[
+            bt.AxonInfo(
+                version=1,
+                ip="127.0.0.1",
+                port=8091,
+                ip_type=4,
+                hotkey=axon,
+                coldkey="coldkey",
+            )
+            for axon in (axons if axons is not None else hotkeys)
+        ],
+        n=torch.tensor(len(hotkeys)),
+        uids=torch.arange(len(hotkeys)),
+    )
+
+
+class MetagraphSyncTestCase(unittest.TestCase):
+    def test_replaced_uids_include_new_uids(self):
+        self.assertEqual(
+            replaced_uids(["a", "b", "c"], ["a", "x", "c", "d", "e"]).tolist(),
+            [1, 3, 4],
+        )
+        self.assertEqual(replaced_uids(["a", "b"], ["a"]).tolist(), [])
+
+    def test_axon_changes_are_detected(self):
+        previous = make_metagraph("abc")
+        self.assertFalse(
+            MetagraphUpdate.diff(previous, make_metagraph("abc")).axons_changed
+        )
+        self.assertTrue(
+            MetagraphUpdate.diff(previous, make_metagraph("abcd")).axons_changed
+        )
+        moved = make_metagraph("abc")
+        moved.axons[1].port = 8092
+        update = MetagraphUpdate.diff(
+            previous, moved, previous_axon_hashes=axon_hashes(previous)
+        )
+        self.assertTrue(update.axons_changed)
+        self.assertEqual(update.replaced_uids.tolist(), [])
+
+    def test_syncer_diffs_against_the_metagraph_in_use(self):
+        synced = [make_metagraph("abx"), make_metagraph("ayx")]
+        factory = MagicMock()
+        with patch(
+            "prompting.validators.metagraph_sync.sync_new_metagraph",
+            side_effect=lambda netuid, subtensor: synced.pop(0),
+        ):
+            syncer = MetagraphSyncer(make_metagraph("abc"), factory, interval=60)
+            syncer.stop()
+            self.assertIsNone(syncer.pop())
+
+            syncer.sync()
+            syncer.sync()
+            update = syncer.pop()
+        # The second sync replaces the first, both are diffed against the metagraph in use.
+        self.assertEqual(update.metagraph.hotkeys, list("ayx"))
+        self.assertEqual(update.replaced_uids.tolist(), [1, 2])
+        self.assertIsNone(syncer.pop())
+        self.assertIs(syncer.metagraph, update.metagraph)
+        # The subtensor of the thread is created once.
+        factory.assert_called_once()
+
+    def test_syncer_reconnects_after_a_failure(self):
+        calls = []
+
+        def sync_new_metagraph(netuid, subtensor):
+            calls.append(subtensor)
+            if len(calls) == 1:
+                raise ConnectionError("websocket closed")
+            return make_metagraph("abd")
+
+        factory = MagicMock(side_effect=["first", "second"])
+        with patch(
+            "prompting.validators.metagraph_sync.sync_new_metagraph",
+            side_effect=sync_new_metagraph,
+        ):
+            syncer = MetagraphSyncer(make_metagraph("abc"), factory, interval=0.01)
+            deadline = time.time() + 5
+            while syncer.pending is None and time.time() < deadline:
+                time.sleep(0.01)
+            syncer.stop()
+        self.assertEqual(calls[:2], ["first", "second"])
+        self.assertEqual(syncer.pop().replaced_uids.tolist(), [2])
+
+    def make_neuron(self, metagraph):
+        neuron = SimpleNamespace(
+            metagraph=metagraph,
+            hotkeys=list(metagraph.hotkeys),
+            device="cpu",
+            scoreboard=Scoreboard(len(metagraph.hotkeys)),
+            gating_model=MagicMock(),
+            gating_trainer=None,
+            uid_sampler=UidSampler(len(metagraph.hotkeys)),
+            metagraph_syncer=MagicMock(),
+        )
+        neuron.scoreboard.scores += 1
+        return neuron
+
+    def test_background_update_is_swapped_in(self):
+        previous = make_metagraph("abc")
+        metagraph = make_metagraph("axcd")
+        neuron = self.make_neuron(previous)
+        neuron.uid_sampler.successes += 1
+        neuron.metagraph_syncer.pop.return_value = MetagraphUpdate.diff(
+            previous, metagraph
+        )
+
+        resync_metagraph(neuron)
+        self.assertIs(neuron.metagraph, metagraph)
+        self.assertEqual(neuron.hotkeys, list("axcd"))
+        self.assertEqual(neuron.scoreboard.scores.tolist(), [1, 0, 1, 0])
+        self.assertEqual(neuron.uid_sampler.successes.tolist(), [1, 0, 1, 0])
+        neuron.gating_model.resync.assert_called_once_with(previous, metagraph)
+
+        # Nothing changes without a new update.
+        neuron.metagraph_syncer.pop.return_value = None
+        resync_metagraph(neuron)
+        self.assertIs(neuron.metagraph, metagraph)
+        neuron.gating_model.resync.assert_called_once()
+
+    def test_unchanged_axons_only_swap_the_metagraph(self):
+        previous = make_metagraph("abc")
+        metagraph = make_metagraph("abc")
+        neuron = self.make_neuron(previous)
+        neuron.metagraph_syncer.pop.return_value = MetagraphUpdate.diff(
+            previous, metagraph
+        )
+        resync_metagraph(neuron)
+        self.assertIs(neuron.metagraph, metagraph)
+        neuron.gating_model.resync.assert_not_called()
+
+    def test_main_loop_sync_without_a_syncer(self):
+        neuron = self.make_neuron(make_metagraph("abc"))
+        neuron.metagraph_syncer = None
+        neuron.subtensor = MagicMock()
+        with patch(
+            "prompting.validators.utils.sync_new_metagraph",
+            return_value=make_metagraph("abd"),
+        ) as sync:
+            resync_metagraph(neuron)
+        sync.assert_called_once_with(1, neuron.subtensor)
+        self.assertEqual(neuron.scoreboard.scores.tolist(), [1, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+import unittest
+from types import SimpleNamespace
+from transformers import BertConfig, BertModel, BertForSequenceClassification
+from prompting.validators.quantize import (
+    maybe_quantize,
+    quantize_reward_model,
+    set_cpu_threads,
+)
+
+
+class FakeTokenizer:
+    """Maps each character to a token id, enough to drive a tiny bert."""
+
+    def __call__(self, sample, padding, truncation, return_tensors):
+        length = max(len(text) for text in sample)
+        input_ids = torch.zeros((len(sample), length), dtype=torch.long)
+        attention_mask = torch.zeros((len(sample), length), dtype=torch.long)
+        for i, text in enumerate(sample):
+            input_ids[i, : len(text)] = torch.tensor([ord(c) % 100 for c in text])
+            attention_mask[i, : len(text)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def tiny_config():
+    torch.manual_seed(0)
+    return BertConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=128,
+    )
+
+
+class FakeEncoder:
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.tokenizer = FakeTokenizer()
+
+
+class QuantizeTestCase(unittest.TestCase):
+    def test_encoder_linear_layers_are_quantized(self):
+        encoder = FakeEncoder("diversity", BertModel(tiny_config()))
+
+        deltas = quantize_reward_model(encoder)
+
+        modules = list(encoder.model.modules())
+        self.assertFalse(any(type(m) is torch.nn.Linear for m in modules))
+        self.assertTrue(
+            any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in modules)
+        )
+        self.assertGreater(deltas["diversity"]["cosine_similarity"], 0.95)
+        self.assertGreaterEqual(
+            deltas["diversity"]["max_abs_delta"], deltas["diversity"]["mean_abs_delta"]
+        )
+
+    def test_each_wrapped_encoder_is_quantized(self):
+        reward_model = SimpleNamespace(
+            name="relevance",
+            models=[
+                FakeEncoder("relevance_bert", BertModel(tiny_config())),
+                FakeEncoder(
+                    "relevance_nsfw", BertForSequenceClassification(tiny_config())
+                ),
+            ],
+        )
+
+        deltas = quantize_reward_model(reward_model)
+
+        self.assertEqual(set(deltas), {"relevance_bert", "relevance_nsfw"})
+
+    def test_quantization_is_skipped_off_cpu_or_when_disabled(self):
+        model = BertModel(tiny_config())
+        encoder = FakeEncoder("nsfw", model)
+        for cpu_quantize, device in [(False, "cpu"), (True, "cuda")]:
+            neuron = SimpleNamespace(
+                config=SimpleNamespace(
+                    neuron=SimpleNamespace(cpu_quantize=cpu_quantize)
+                ),
+                device=device,
+            )
+            self.assertIs(maybe_quantize(neuron, encoder), encoder)
+            self.assertIs(encoder.model, model)
+
+    def test_set_cpu_threads(self):
+        previous = torch.get_num_threads()
+        try:
+            self.assertEqual(set_cpu_threads(2), 2)
+            self.assertEqual(torch.get_num_threads(), 2)
+            self.assertGreaterEqual(set_cpu_threads(0), 1)
+        finally:
+            torch.set_num_threads(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
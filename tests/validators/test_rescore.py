@@ -0,0 +1,160 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from loguru import logger
+from prompting.validators.rescore import (
+    Rescorer,
+    iter_rescored,
+    load_events,
+    main,
+    moving_average,
+    rescore,
+)
+from prompting.validators.tasks import create_summarization_task
+
+
+def make_event(i):
+    task = create_summarization_task(f"Base text {i}.")
+    return {
+        "block": i,
+        "name": task.task_name,
+        "task_type": task.task_type,
+        "prompt": task.compose_prompt(),
+        "uids": [i % 4, (i + 1) % 4, (i + 2) % 4],
+        "completions": ["A summary.", "Here is a task: summarize.", ""],
+        "completion_status_codes": ["200", "200", "408"],
+        "rewards": [0.5, 0.25, 0.0],
+        "task_validation_penalty_applied": [0.5, 1.0, 1.0],
+    }
+
+
+MOCK_KWARGS = dict(
+    weights={"dpo_reward_model": 0.6, "reciprocate_reward_model": 0.4},
+    masks=["blacklist_filter", "nsfw_filter"],
+    mock=True,
+    recorded_penalties=["task_validation_penalty"],
+)
+
+
+class RescoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_log(self, name: str, events):
+        path = os.path.join(self.path, name)
+        try:
+            logger.level("EVENTS", no=38, icon="📝")
+        except (TypeError, ValueError):
+            pass
+        sink = logger.add(
+            path,
+            serialize=True,
+            level="EVENTS",
+            filter=lambda record: record["level"].name == "EVENTS",
+        )
+        for event in events:
+            logger.log("EVENTS", "events", **event)
+        logger.remove(sink)
+        return path
+
+    def test_rescore_applies_recorded_and_recomputed_penalties(self):
+        rescorer = Rescorer(**MOCK_KWARGS)
+        result = rescorer.rescore(make_event(0))
+
+        self.assertEqual(result["task_validation_penalty_applied"], [0.5, 1.0, 1.0])
+        # The second completion matches a system message and is penalized.
+        self.assertAlmostEqual(result["sentence_match_penalty_applied"][1], 0.9)
+        np.testing.assert_allclose(result["rewards"], [0.5, 0.9, 1.0], rtol=1e-6)
+        self.assertEqual(result["dpo_reward_model_normalized"], [1.0, 1.0, 1.0])
+
+    def test_penalties_are_recomputed_without_recorded_values(self):
+        rescorer = Rescorer(**{**MOCK_KWARGS, "recorded_penalties": []})
+        result = rescorer.rescore(make_event(0))
+        # The recorded task has no criteria.
+        self.assertEqual(result["task_validation_penalty_applied"], [1.0, 1.0, 1.0])
+
+    def test_workers_match_the_main_process(self):
+        events = [make_event(i) for i in range(7)]
+        expected = list(iter_rescored(events, MOCK_KWARGS, batch_size=3))
+        rescored = list(iter_rescored(events, MOCK_KWARGS, batch_size=3, workers=2))
+        self.assertEqual(rescored, expected)
+
+    def test_rescore_writes_rewards_and_trajectories(self):
+        events = [make_event(i) for i in range(5)]
+        output = os.path.join(self.path, "rescored")
+        events_per_second = rescore(
+            events, output, MOCK_KWARGS, num_uids=4, alpha=0.1, batch_size=2
+        )
+        self.assertGreater(events_per_second, 0)
+
+        with open(os.path.join(output, "rescored.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record["block"] for record in records], list(range(5)))
+        self.assertEqual(records[0]["recorded_rewards"], [0.5, 0.25, 0.0])
+
+        trajectory = np.load(os.path.join(output, "moving_averaged_scores.npy"))
+        recorded = np.load(os.path.join(output, "recorded_moving_averaged_scores.npy"))
+        self.assertEqual(trajectory.shape, (5, 4))
+        scores = recorded_scores = np.zeros(4, dtype=np.float32)
+        for i, (event, record) in enumerate(zip(events, records)):
+            scores = moving_average(scores, event["uids"], record["rewards"], 0.1)
+            recorded_scores = moving_average(
+                recorded_scores, event["uids"], event["rewards"], 0.1
+            )
+            np.testing.assert_allclose(trajectory[i], scores, rtol=1e-6)
+            np.testing.assert_allclose(recorded[i], recorded_scores, rtol=1e-6)
+
+    def test_main_rescores_logs_in_block_order(self):
+        path = self.write_log(
+            "completions.log", [make_event(i) for i in reversed(range(3))]
+        )
+        self.assertEqual([event["block"] for event in load_events([path])], [0, 1, 2])
+
+        output = os.path.join(self.path, "out")
+        main(
+            [
+                "--output",
+                output,
+                "--log",
+                path,
+                "--neuron.mock_reward_models",
+                "--neuron.relevance_off",
+            ]
+        )
+        with open(os.path.join(output, "rescored.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 3)
+        self.assertIn("diversity_reward_model_normalized", records[0])
+        self.assertNotIn("relevance_filter_normalized", records[0])
+        # The largest uid of the events is 3.
+        self.assertEqual(
+            np.load(os.path.join(output, "moving_averaged_scores.npy")).shape, (3, 4)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
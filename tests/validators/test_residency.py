@@ -0,0 +1,167 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+import tempfile
+import unittest
+from prompting.metrics import MetricsRegistry
+from prompting.validators.residency import (
+    ResidencyManager,
+    find_modules,
+    module_footprint,
+)
+
+
+class TiedModule(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embedding = torch.nn.Embedding(16, 8)
+        self.head = torch.nn.Linear(8, 16, bias=False)
+        self.head.weight = self.embedding.weight
+        self.register_buffer("positions", torch.arange(16), persistent=False)
+
+
+class FakeRewardModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.model = torch.nn.Linear(64, 64)  # 64 * 64 * 4 + 64 * 4 bytes
+
+
+class FakeWrapperModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.models = [FakeRewardModel(f"{name}_a"), FakeRewardModel(f"{name}_b")]
+        self.bounds = [0.1, 0.2]
+
+
+class FakeNestedModel:
+    """Holds a module and one of its submodules, like the dahoas model holds its model and transformer."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.model = torch.nn.Sequential(torch.nn.Linear(64, 64))
+        self.transformer = self.model[0]
+        self.also_model = self.model
+
+
+def device_of(model) -> str:
+    return next(model.model.parameters()).device.type
+
+
+class ResidencyManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.footprint = module_footprint(torch.nn.Linear(64, 64))
+
+    def test_footprint_counts_tied_tensors_once(self):
+        module = TiedModule()
+        self.assertEqual(module_footprint(module), 16 * 8 * 4 + 16 * 8)
+
+    def test_nested_modules_are_counted_once(self):
+        model = FakeNestedModel("nested")
+        self.assertEqual(find_modules(model), [model.model])
+
+        with tempfile.TemporaryDirectory() as path:
+            manager = ResidencyManager(
+                "cpu", budget=self.footprint, offload="disk", offload_path=path
+            )
+            manager.register(model)
+            self.assertEqual(manager.used_bytes(), self.footprint)
+            manager.register(FakeRewardModel("other"))
+            self.assertEqual(model.transformer.weight.device.type, "meta")
+            with manager.use(model):
+                self.assertEqual(model.transformer.weight.device.type, "cpu")
+
+    def test_disabled_manager_does_nothing(self):
+        manager = ResidencyManager("cpu", budget=0)
+        model = FakeRewardModel("a")
+        with manager.use(model):
+            pass
+        self.assertEqual(manager.stats(), {})
+
+    def test_least_recently_used_models_are_offloaded(self):
+        with tempfile.TemporaryDirectory() as path:
+            manager = ResidencyManager(
+                "cpu",
+                budget=2 * self.footprint,
+                offload="disk",
+                offload_path=path,
+                metrics=MetricsRegistry(),
+            )
+            a, b, c = [FakeRewardModel(name) for name in "abc"]
+            for model in (a, b, c):
+                manager.register(model)
+
+            # Registering c offloads a, the least recently used model.
+            self.assertEqual(device_of(a), "meta")
+            self.assertEqual(manager.used_bytes(), 2 * self.footprint)
+
+            with manager.use(a):
+                self.assertEqual(device_of(a), "cpu")
+            # b was the least recently used model when a was paged in.
+            self.assertEqual(device_of(b), "meta")
+            self.assertEqual(device_of(c), "cpu")
+
+            stats = manager.stats()
+            self.assertEqual(stats["a"]["swaps_in"], 1)
+            self.assertEqual(stats["a"]["swaps_out"], 1)
+            self.assertEqual(stats["b"]["swaps_out"], 1)
+            self.assertFalse(stats["b"]["resident"])
+
+    def test_models_in_use_are_not_offloaded(self):
+        manager = ResidencyManager("cpu", budget=self.footprint, offload="cpu")
+        a, b = FakeRewardModel("a"), FakeRewardModel("b")
+        with manager.use(a):
+            with manager.use(b):
+                self.assertTrue(manager.stats()["a"]["resident"])
+                self.assertTrue(manager.stats()["b"]["resident"])
+        with manager.use(a):
+            self.assertFalse(manager.stats()["b"]["resident"])
+
+    def test_wrapped_models_are_offloaded_together(self):
+        manager = ResidencyManager("cpu", budget=2 * self.footprint)
+        wrapper = FakeWrapperModel("relevance")
+        manager.register(wrapper)
+        self.assertEqual(manager.stats()["relevance"]["bytes"], 2 * self.footprint)
+
+    def test_disk_offload_restores_the_weights(self):
+        with tempfile.TemporaryDirectory() as path:
+            manager = ResidencyManager(
+                "cpu",
+                budget=module_footprint(TiedModule()),
+                offload="disk",
+                offload_path=path,
+            )
+            a = FakeRewardModel("a")
+            a.model = TiedModule()
+            b = FakeRewardModel("b")
+            b.model = TiedModule()
+            expected = a.model.embedding.weight.clone()
+
+            manager.register(a)
+            manager.register(b)
+            self.assertEqual(a.model.embedding.weight.device.type, "meta")
+
+            with manager.use(a):
+                self.assertTrue(torch.equal(a.model.embedding.weight, expected))
+                self.assertTrue(torch.equal(a.model.head.weight, expected))
+                self.assertTrue(torch.equal(a.model.positions, torch.arange(16)))
+            self.assertEqual(b.model.embedding.weight.device.type, "meta")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import torch
+import unittest
+from unittest.mock import MagicMock
+from prompting.validators.sampler import UidSampler
+
+
+class UidSamplerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sampler = UidSampler(n=16, exploration=0.25)
+
+    def test_sample_returns_k_unique_candidates(self):
+        candidates = [1, 3, 5, 7, 9, 11]
+        uids = self.sampler.sample(candidates, k=4)
+
+        self.assertEqual(len(uids), 4)
+        self.assertEqual(len(set(uids)), 4)
+        self.assertTrue(set(uids).issubset(candidates))
+
+    def test_sample_caps_k_to_number_of_candidates(self):
+        uids = self.sampler.sample([2, 4], k=10)
+        self.assertEqual(sorted(uids), [2, 4])
+
+    def test_failing_uids_are_only_reprobed(self):
+        # Arrange: uids 0-7 always fail, uids 8-15 always succeed.
+        uids = list(range(16))
+        status_codes = ["408"] * 8 + ["200"] * 8
+        for _ in range(50):
+            self.sampler.update(uids, status_codes, [0] * 8 + [1.0] * 8, timeout=10)
+
+        # Act
+        sampled = self.sampler.sample(uids, k=8)
+
+        # Assert: the exploited part of the sample only contains reliable uids and at most
+        # the exploration budget goes to failing uids.
+        self.assertTrue(all(uid >= 8 for uid in sampled[:6]))
+        self.assertLessEqual(sum(uid < 8 for uid in sampled), 2)
+
+    def test_update_tracks_latency_of_successful_responses_only(self):
+        self.sampler.update([0, 1], ["200", "408"], [5.0, 0], timeout=10)
+
+        self.assertAlmostEqual(self.sampler.latencies[0].item(), 0.05)
+        self.assertEqual(self.sampler.latencies[1].item(), 0)
+        self.assertEqual(self.sampler.queries[:2].tolist(), [1, 1])
+
+    def test_resync_resets_replaced_hotkeys_and_resizes(self):
+        self.sampler.update([0, 1], ["200", "200"], [1.0, 1.0], timeout=10)
+        previous_metagraph = MagicMock(hotkeys=[str(uid) for uid in range(16)])
+        metagraph = MagicMock(hotkeys=["new"] + [str(uid) for uid in range(1, 20)])
+
+        self.sampler.resync(previous_metagraph, metagraph)
+
+        self.assertEqual(len(self.sampler), 20)
+        self.assertEqual(self.sampler.successes[0].item(), 0)
+        self.assertGreater(self.sampler.successes[1].item(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
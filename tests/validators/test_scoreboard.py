@@ -0,0 +1,109 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import torch
+import threading
+import unittest
+from prompting.validators.scoreboard import Scoreboard
+
+
+class ScoreboardTestCase(unittest.TestCase):
+    def test_update_matches_the_dense_moving_average(self):
+        scoreboard = Scoreboard(5, alpha=0.1)
+        dense = torch.zeros(5)
+        for uids, rewards in [
+            ([0, 2], [1.0, 0.5]),
+            ([2, 3, 4], [0.2, 0.7, 1.0]),
+            ([0], [0.0]),
+        ]:
+            uids, rewards = torch.tensor(uids), torch.tensor(rewards)
+            dense = 0.1 * dense.scatter(0, uids, rewards) + 0.9 * dense
+            scoreboard.update(uids, rewards)
+        torch.testing.assert_close(scoreboard.scores, dense)
+        self.assertEqual(scoreboard.queries.tolist(), [2, 0, 2, 1, 1])
+
+    def test_update_is_in_place(self):
+        scoreboard = Scoreboard(3)
+        scores = scoreboard.scores
+        scoreboard.update(torch.tensor([1]), torch.tensor([1.0]))
+        self.assertIs(scoreboard.scores, scores)
+        snapshot = scoreboard.snapshot()
+        scoreboard.update(torch.tensor([1]), torch.tensor([1.0]))
+        self.assertLess(snapshot[1], scoreboard.scores[1])
+
+    def test_success_and_latency_statistics(self):
+        scoreboard = Scoreboard(3, latency_alpha=0.5)
+        scoreboard.update(
+            torch.tensor([0, 1]),
+            torch.tensor([1.0, 0.0]),
+            success=torch.tensor([True, False]),
+            latency=torch.tensor([2.0, 9.0]),
+        )
+        scoreboard.update(
+            torch.tensor([0, 1]),
+            torch.tensor([1.0, 1.0]),
+            success=torch.tensor([True, True]),
+            latency=torch.tensor([4.0, 1.0]),
+        )
+        self.assertEqual(scoreboard.successes.tolist(), [2, 1, 0])
+        # The first successful latency is taken as is, failed responses have none.
+        self.assertEqual(scoreboard.latencies.tolist(), [3.0, 1.0, 0.0])
+        self.assertEqual(scoreboard.success_rates().tolist(), [1.0, 0.5, 0.0])
+
+    def test_resync_resets_replaced_hotkeys_and_grows(self):
+        scoreboard = Scoreboard(3)
+        scoreboard.update(torch.tensor([0, 1, 2]), torch.tensor([1.0, 1.0, 1.0]))
+        scoreboard.resync(list("abc"), list("axcd"))
+        self.assertEqual(len(scoreboard), 4)
+        self.assertEqual(scoreboard.queries.tolist(), [1, 0, 1, 0])
+        torch.testing.assert_close(
+            scoreboard.scores, torch.tensor([0.05, 0.0, 0.05, 0.0])
+        )
+
+    def test_state_dict_round_trip_across_sizes(self):
+        scoreboard = Scoreboard(4)
+        scoreboard.update(torch.tensor([1, 3]), torch.tensor([1.0, 2.0]))
+        state = scoreboard.state_dict()
+
+        smaller = Scoreboard(2)
+        smaller.load_state_dict(state)
+        self.assertEqual(smaller.queries.tolist(), [0, 1])
+
+        larger = Scoreboard(6)
+        larger.load_state_dict({"scores": state["scores"], "unknown": [1]})
+        torch.testing.assert_close(larger.scores[:4], state["scores"])
+        self.assertEqual(larger.queries.tolist(), [0] * 6)
+
+    def test_concurrent_updates(self):
+        scoreboard = Scoreboard(2, alpha=0.5)
+        uids, rewards = torch.tensor([0, 1]), torch.tensor([1.0, 1.0])
+
+        def update():
+            for _ in range(200):
+                scoreboard.update(uids, rewards)
+
+        threads = [threading.Thread(target=update) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(scoreboard.queries.tolist(), [800, 800])
+
+
+if __name__ == "__main__":
+    unittest.main()
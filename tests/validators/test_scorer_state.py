@@ -0,0 +1,206 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import torch
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from concurrent.futures import Future
+from types import SimpleNamespace
+from prompting.validators.loader import LazyModel
+from prompting.validators.mock import MockRewardModel
+from prompting.validators.reward.blacklist import Blacklist
+from prompting.validators.sampler import UidSampler
+from prompting.validators.scorer_state import (
+    ALIGNMENT,
+    STATE_VERSION,
+    capture_scorer_state,
+    load_scorer_state,
+    read_state_file,
+    scorer_state_path,
+    write_state_file,
+)
+
+
+def make_blacklist():
+    """Blacklist without its tokenizer, which only decodes the n-grams of the significance table."""
+    blacklist = Blacklist.__new__(Blacklist)
+    blacklist.counter = {}
+    blacklist.significance_scores = {}
+    blacklist.num_ngram = 0
+    blacklist.num_completion = 0
+    blacklist.w_current = 1
+    blacklist._last_update = 0
+    blacklist.lock = threading.Lock()
+    return blacklist
+
+
+class ScorerStateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_state_file_arrays_are_aligned_and_memory_mapped(self):
+        path = os.path.join(self.path, "state.bin")
+        arrays = {
+            "a": np.arange(5, dtype=np.int32),
+            "b": np.random.rand(3, 7),
+            "empty": np.zeros((0, 4), dtype=np.float32),
+        }
+        write_state_file(path, arrays, {"key": "value"})
+
+        loaded, meta = read_state_file(path)
+        self.assertEqual(meta, {"key": "value"})
+        self.assertIsInstance(loaded["b"], np.memmap)
+        self.assertEqual(loaded["b"].offset % ALIGNMENT, 0)
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(loaded[name], array)
+        self.assertEqual(os.listdir(self.path), ["state.bin"])
+
+    def test_newer_versions_are_rejected(self):
+        path = os.path.join(self.path, "state.bin")
+        write_state_file(path, {}, {})
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(
+                data.replace(
+                    f'"version": {STATE_VERSION}'.encode(),
+                    f'"version": {STATE_VERSION + 1}'.encode(),
+                )
+            )
+        with self.assertRaises(ValueError):
+            read_state_file(path)
+
+    def make_neuron(self, hotkeys=("a", "b", "c", "d")):
+        future = Future()
+        self.future = future
+        hotkeys = list(hotkeys)
+        return SimpleNamespace(
+            config=SimpleNamespace(neuron=SimpleNamespace(full_path=self.path)),
+            reward_functions=[
+                MockRewardModel("dpo_reward_model"),
+                LazyModel("lazy_reward_model", future),
+            ],
+            masking_functions=[MockRewardModel("nsfw_filter")],
+            blacklist=make_blacklist(),
+            uid_sampler=UidSampler(len(hotkeys)),
+            metagraph=SimpleNamespace(hotkeys=hotkeys),
+            pending_reward_stats={},
+        )
+
+    def test_scorer_state_is_restored(self):
+        neuron = self.make_neuron()
+        dpo = neuron.reward_functions[0]
+        dpo.normalize_rewards(torch.tensor([0.1, 0.5, 0.9]))
+        neuron.masking_functions[0].normalize_rewards(torch.tensor([1.0, 3.0]))
+        lazy_model = MockRewardModel("lazy_reward_model")
+        lazy_model.normalize_rewards(torch.tensor([2.0, 4.0, 8.0]))
+        self.future.set_result(lazy_model)
+
+        blacklist = neuron.blacklist
+        blacklist.counter = {
+            (1, 2, 3, 4, 5): [7, 0],
+            (1, 2, 3, 4, 5, 6): [3, 1],
+            (9, 8, 7, 6, 5): [2, 2],
+        }
+        blacklist.significance_scores = {"über phrase": 12.5, "other": 1.0}
+        blacklist.num_ngram, blacklist.num_completion = 12, 4
+        blacklist.w_current, blacklist._last_update = 2, 3
+        neuron.uid_sampler.update(
+            [0, 1, 2], ["200", "408", "200"], [1.0, 12.0, 2.0], 12.0
+        )
+        capture_scorer_state(neuron)()
+
+        restored = self.make_neuron()
+        load_scorer_state(restored)
+
+        restored_dpo = restored.reward_functions[0]
+        self.assertEqual(restored_dpo.count, dpo.count)
+        self.assertAlmostEqual(float(restored_dpo.mean), float(dpo.mean), places=6)
+        self.assertAlmostEqual(float(restored_dpo.var), float(dpo.var), places=6)
+        self.assertEqual(restored.masking_functions[0].count, 2)
+        self.assertEqual(restored.blacklist.counter, blacklist.counter)
+        self.assertEqual(
+            restored.blacklist.significance_scores, blacklist.significance_scores
+        )
+        self.assertEqual(
+            (restored.blacklist.num_completion, restored.blacklist._last_update), (4, 3)
+        )
+        for attr in ("successes", "failures", "latencies", "queries"):
+            torch.testing.assert_close(
+                getattr(restored.uid_sampler, attr), getattr(neuron.uid_sampler, attr)
+            )
+
+        # The model loading in the background is restored once it is loaded, and keeps its statistics until then.
+        self.assertIn("lazy_reward_model", restored.pending_reward_stats)
+        capture_scorer_state(restored)()
+        _, meta = read_state_file(scorer_state_path(restored))
+        self.assertEqual(meta["reward_stats"]["lazy_reward_model"][0], 3)
+        restored_lazy = MockRewardModel("lazy_reward_model")
+        self.future.set_result(restored_lazy)
+        self.assertEqual(restored_lazy.count, 3)
+        self.assertAlmostEqual(float(restored_lazy.mean), 14 / 3, places=5)
+        self.assertEqual(restored.pending_reward_stats, {})
+
+    def test_blacklist_is_copied_by_the_writer(self):
+        neuron = self.make_neuron()
+        neuron.blacklist.counter = {(i, i + 1): [2, 0] for i in range(1_000_000)}
+        start = time.perf_counter()
+        write = capture_scorer_state(neuron)
+        capture_time = time.perf_counter() - start
+        # Only a reference is taken on the main loop, the counter is copied by the checkpointer.
+        self.assertLess(capture_time, 0.05)
+
+        # The copy waits for the updates holding the lock, and sees the counter and the scalars consistently.
+        neuron.blacklist.counter = {(1, 2): [3, 0]}
+        with neuron.blacklist.lock:
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.1)
+            self.assertTrue(writer.is_alive())
+            neuron.blacklist.counter[(1, 2)][0] += 1
+            neuron.blacklist.num_ngram += 1
+        writer.join()
+
+        restored = self.make_neuron()
+        load_scorer_state(restored)
+        self.assertEqual(list(restored.blacklist.counter[(1, 2)]), [4, 0])
+        self.assertEqual(restored.blacklist.num_ngram, 1)
+
+    def test_sampler_forgets_replaced_hotkeys(self):
+        neuron = self.make_neuron()
+        neuron.uid_sampler.update([0, 1], ["200", "200"], [1.0, 1.0], 12.0)
+        capture_scorer_state(neuron)()
+
+        restored = self.make_neuron(hotkeys=("a", "x", "c", "d", "e"))
+        load_scorer_state(restored)
+        self.assertEqual(len(restored.uid_sampler), 5)
+        self.assertGreater(restored.uid_sampler.successes[0], 0)
+        self.assertEqual(restored.uid_sampler.successes[1], 0)
+        self.assertEqual(restored.uid_sampler.queries[1], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import time
+import unittest
+from prompting.validators.timing import StageTimer
+
+
+class StageTimerTestCase(unittest.TestCase):
+    def test_stage_records_wall_and_cpu_time(self):
+        timer = StageTimer()
+        timings = {}
+        with timer.stage("query", timings):
+            time.sleep(0.01)
+
+        self.assertGreaterEqual(timings["query"], 0.01)
+        self.assertIn("query_cpu", timings)
+        self.assertLess(timings["query_cpu"], timings["query"])
+
+    def test_stage_records_on_exception(self):
+        timer = StageTimer()
+        timings = {}
+        with self.assertRaises(ValueError):
+            with timer.stage("reward/failing", timings):
+                raise ValueError()
+
+        self.assertIn("reward/failing", timings)
+
+    def test_disabled_timer_records_nothing(self):
+        timer = StageTimer(enabled=False)
+        timings = {}
+        with timer.stage("query", timings):
+            pass
+
+        self.assertEqual(timings, {})
+        self.assertEqual(timer.percentiles(), {})
+
+    def test_percentiles_use_rolling_window(self):
+        timer = StageTimer(window=10)
+        for i in range(20):
+            timer.record("query", float(i), 0.0)
+
+        percentiles = timer.percentiles(qs=(50, 99))
+        self.assertEqual(percentiles["query_p50"], 14.0)
+        self.assertEqual(percentiles["query_p99"], 19.0)
+
+    def test_timed_decorator(self):
+        timer = StageTimer()
+
+        @timer.timed("tokenize")
+        def tokenize(text):
+            return text.split()
+
+        self.assertEqual(tokenize("a b"), ["a", "b"])
+        self.assertIn("tokenize_p50", timer.percentiles())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# The MIT License (MIT)
+# Copyright © 2023 Yuma Rao
+# Copyright © 2023 Opentensor Foundation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+import time
+import threading
+import unittest
+from prompting.validators.wandb_logger import LocalSink, WandbLogger
+
+
+class BlockingSink(LocalSink):
+    """Sink blocking until released, standing in for an unresponsive wandb."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def log(self, data):
+        self.release.wait()
+        super().log(data)
+
+
+class WandbLoggerTestCase(unittest.TestCase):
+    def test_records_are_logged_in_order(self):
+        sink = LocalSink()
+        logger = WandbLogger(sink=sink)
+        for i in range(10):
+            logger.log({"step": i})
+        logger.log_artifact("artifact")
+        self.assertTrue(logger.flush(timeout=5))
+        logger.close()
+
+        self.assertEqual([record["step"] for record in sink.records], list(range(10)))
+        self.assertEqual(sink.artifacts, ["artifact"])
+
+    def test_events_are_converted_by_the_worker(self):
+        sink = LocalSink()
+        logger = WandbLogger(sink=sink)
+        logger.log_event({"not": "an event"})
+        logger.log({"step": 1})
+        self.assertTrue(logger.flush(timeout=5))
+
+        # The invalid event is reported by the worker and does not stop it.
+        self.assertEqual(sink.records, [{"step": 1}])
+
+    def test_slow_sink_does_not_block_and_drops_are_counted(self):
+        sink = BlockingSink()
+        logger = WandbLogger(sink=sink, max_queue_size=4, batch_size=1)
+
+        start = time.time()
+        for i in range(20):
+            logger.log({"step": i})
+        self.assertLess(time.time() - start, 1)
+        self.assertGreater(logger.dropped, 0)
+
+        sink.release.set()
+        self.assertTrue(logger.flush(timeout=5))
+        logger.log({"step": 20})
+        self.assertTrue(logger.flush(timeout=5))
+        self.assertEqual(sink.records[-1]["step"], 20)
+        reported = [
+            r["dropped_wandb_events"]
+            for r in sink.records
+            if "dropped_wandb_events" in r
+        ]
+        self.assertEqual(reported[-1], logger.dropped)
+        self.assertEqual(len(sink.records) + logger.dropped, 21)
+
+    def test_dropped_events_are_summarized(self):
+        sink = BlockingSink()
+        logger = WandbLogger(sink=sink, max_queue_size=1, batch_size=1)
+        logger.log({"step": 0})
+        # Wait for the worker to block on the sink, then fill the queue.
+        while logger.qsize():
+            time.sleep(0.01)
+        logger.log({"step": 1})
+        logger.log_event({"rewards": [1.0, 2.0]})
+        logger.log_event({"rewards": [3.0, None]})
+        logger.log({"step": 2})
+        self.assertEqual(logger.dropped, 3)
+
+        sink.release.set()
+        self.assertTrue(logger.flush(timeout=5))
+        logger.log({"step": 3})
+        self.assertTrue(logger.flush(timeout=5))
+        logger.close()
+
+        self.assertEqual(
+            sink.records,
+            [
+                {"step": 0},
+                {
+                    "step": 1,
+                    "dropped_wandb_events": 3,
+                    "dropped_wandb_rewards_count": 3,
+                    "dropped_wandb_rewards_mean": 2.0,
+                },
+                # The summary is reported once.
+                {"step": 3},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()